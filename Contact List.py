@@ -1,9 +1,31 @@
 import tkinter as tk
-from tkinter import ttk, messagebox
-import json
-import os
+from tkinter import ttk, messagebox, filedialog
+import queue
+import threading
 from datetime import datetime
 
+from contact_dedupe import apply_merges, find_duplicates, plan_merges
+from contact_store import ContactStore, IMPORT_BATCH_SIZE, batched, iter_contacts_file
+
+# Extra rows materialized below the visible window of the contact list
+VIEW_OVERSCAN = 5
+
+# How long typing has to pause before the contacts are searched
+SEARCH_DEBOUNCE_MS = 150
+
+# How often the Tk thread checks for the next parsed import batch
+IMPORT_POLL_MS = 50
+
+# How often the Tk thread checks for results from the search, export and
+# duplicate workers
+WORKER_POLL_MS = 30
+
+# How often the Tk thread checks on saves queued for the writer thread
+WRITE_POLL_MS = 200
+
+# Duplicate groups listed in the duplicates dialog ("Merge All" covers all)
+MAX_DUPLICATE_GROUPS_SHOWN = 500
+
 class ContactDialog:
     def __init__(self, parent, title, contact=None, view_mode=False):
         self.top = tk.Toplevel(parent)
@@ -97,29 +119,179 @@ class ContactDialog:
         if not self.name_var.get().strip() or not self.phone_var.get().strip():
             messagebox.showwarning("Warning", "Name and phone number are required!")
             return
-            
+        
         self.result = True
         self.top.destroy()
     
     def cancel(self):
         self.result = False
         self.top.destroy()
-        
+    
     def get_address(self):
         return self.address_textbox.get("1.0", tk.END).strip()
 
 
+class DuplicatesDialog:
+    def __init__(self, parent, store, groups, worker_results):
+        self.top = tk.Toplevel(parent)
+        self.top.title("Duplicate Contacts")
+        self.top.geometry("700x450")
+        self.top.configure(bg='#f5f5f5')
+        self.top.grab_set()  # Make dialog modal
+        
+        self.store = store
+        self.groups = groups
+        self.merged = 0
+        # The main window's queue of (callback, args) for the Tk thread
+        self.worker_results = worker_results
+        
+        self.setup_ui()
+    
+    def setup_ui(self):
+        main_frame = tk.Frame(self.top, bg='#f5f5f5', padx=20, pady=20)
+        main_frame.pack(fill='both', expand=True)
+        
+        shown = min(len(self.groups), MAX_DUPLICATE_GROUPS_SHOWN)
+        tk.Label(main_frame, text=f"Showing {shown} of {len(self.groups)} groups of likely duplicates",
+                 font=('Arial', 12), bg='#f5f5f5').pack(anchor='w', pady=(0, 10))
+        
+        # One parent row per group with its contacts underneath
+        tree_frame = tk.Frame(main_frame)
+        tree_frame.pack(fill='both', expand=True)
+        
+        self.tree = ttk.Treeview(tree_frame, columns=('phone', 'email'), height=12)
+        self.tree.heading('#0', text='Name')
+        self.tree.heading('phone', text='Phone')
+        self.tree.heading('email', text='Email')
+        self.tree.column('#0', width=250, anchor='w')
+        self.tree.column('phone', width=150, anchor='w')
+        self.tree.column('email', width=220, anchor='w')
+        
+        scrollbar = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL, command=self.tree.yview)
+        self.tree.configure(yscrollcommand=scrollbar.set)
+        self.tree.pack(side='left', fill='both', expand=True)
+        scrollbar.pack(side='right', fill='y')
+        
+        for index, group in enumerate(self.groups[:MAX_DUPLICATE_GROUPS_SHOWN]):
+            parent = self.tree.insert('', tk.END, iid=f"group-{index}", open=True,
+                                      text=f"Group {index + 1} ({len(group)} contacts)")
+            for contact_id in group:
+                contact = self.store.get(contact_id)
+                self.tree.insert(parent, tk.END, text=contact['name'],
+                                 values=(contact['phone'], contact.get('email') or ''))
+        
+        # Button frame
+        button_frame = tk.Frame(main_frame, bg='#f5f5f5')
+        button_frame.pack(pady=(15, 0))
+        
+        self.merge_button = tk.Button(button_frame, text="Merge Selected", command=self.merge_selected,
+                                      bg='#27ae60', fg='white', font=('Arial', 12))
+        self.merge_button.pack(side='left', padx=10)
+        
+        self.merge_all_button = tk.Button(button_frame, text="Merge All", command=self.merge_all,
+                                          bg='#f39c12', fg='white', font=('Arial', 12))
+        self.merge_all_button.pack(side='left', padx=10)
+        
+        close_button = tk.Button(button_frame, text="Close", command=self.top.destroy,
+                                 bg='#95a5a6', fg='white', font=('Arial', 12))
+        close_button.pack(side='left', padx=10)
+        
+        self.top.transient(self.top.master)
+        self.top.bind('<Escape>', lambda e: self.top.destroy())
+    
+    def merge_selected(self):
+        # A selected contact row stands for its whole group
+        group_iids = {self.tree.parent(iid) or iid for iid in self.tree.selection()}
+        if not group_iids:
+            messagebox.showwarning("Warning", "Please select a group to merge!", parent=self.top)
+            return
+        
+        group_iids = sorted(group_iids)
+        self.start_merge([self.groups[int(iid.split('-')[1])] for iid in group_iids], group_iids)
+    
+    def merge_all(self):
+        if messagebox.askyesno("Confirm Merge", f"Merge all {len(self.groups)} groups into their oldest contact?",
+                               parent=self.top):
+            self.start_merge(self.groups, None)
+    
+    def start_merge(self, groups, group_iids):
+        # Each group keeps its oldest contact, filled in from the others.
+        # The full records are read on a worker thread; the dialog is modal,
+        # so nothing changes them before the merge is applied here.
+        self.merge_button.config(state=tk.DISABLED)
+        self.merge_all_button.config(state=tk.DISABLED)
+        self.top.config(cursor='watch')
+        threading.Thread(target=self.merge_worker, args=(groups, group_iids), daemon=True).start()
+    
+    def merge_worker(self, groups, group_iids):
+        try:
+            merges = plan_merges(self.store, groups)
+            self.worker_results.put((self.finish_merge, (merges, group_iids, None)))
+        except Exception as e:
+            self.worker_results.put((self.finish_merge, ([], group_iids, e)))
+    
+    def finish_merge(self, merges, group_iids, error):
+        self.top.config(cursor='')
+        self.merge_button.config(state=tk.NORMAL)
+        self.merge_all_button.config(state=tk.NORMAL)
+        if error is None:
+            try:
+                self.merged += apply_merges(self.store, merges)
+            except Exception as e:
+                error = e
+        if error is not None:
+            messagebox.showerror("Error", f"Failed to merge contacts: {str(error)}", parent=self.top)
+            return
+        
+        if group_iids is None:
+            self.top.destroy()
+        else:
+            for iid in group_iids:
+                self.tree.delete(iid)
+
+
 class ContactManager:
-    def __init__(self, root):
+    def __init__(self, root, storage=None):
         self.root = root
         self.root.title("Contact Manager")
         self.root.geometry("900x600")
         self.root.configure(bg='#f5f5f5')
         self.root.resizable(True, True)
         
-        # Initialize contacts list
-        self.contacts = []
-        self.filtered_contacts = []
+        # All contact logic lives in the store (SQLite storage by default);
+        # this class only shows it
+        self.store = ContactStore(storage)
+        
+        # Contacts currently listed, and the query that produced them so
+        # the next keystroke can refine it
+        self.filtered_contacts = self.store.all_contacts
+        self.last_search_term = None
+        
+        # Searches run on a worker thread. Each one is tagged with a
+        # generation number so that newer keystrokes make older ones stale.
+        self.search_after_id = None
+        self.search_generation = 0
+        self.search_queue = queue.Queue()
+        threading.Thread(target=self.search_worker, daemon=True).start()
+        
+        # Workers hand (callback, args) back through this queue rather than
+        # calling Tkinter themselves; poll_worker_results runs them
+        self.worker_results = queue.Queue()
+        
+        # Queue of parsed batches while an import is running
+        self.import_queue = None
+        self.import_count = 0
+        self.import_skipped = 0
+        
+        # Virtualized view state: index of the first filtered contact shown
+        # and how many rows fit in the treeview
+        self.view_offset = 0
+        self.visible_rows = 15
+        self.selected_ids = set()
+        
+        # Changes are saved by a writer thread once contacts are loaded
+        self.writes = None
+        self.write_poll_pending = False
         
         # Load previous contacts if available
         self.load_contacts()
@@ -133,6 +305,11 @@ class ContactManager:
         
         # Update contact list
         self.update_contact_list()
+        
+        # Save queued changes before the window closes
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        
+        self.root.after(WORKER_POLL_MS, self.poll_worker_results)
     
     def setup_ui(self):
         # Header frame
@@ -149,6 +326,10 @@ class ContactManager:
                               bg='#3498db', fg='white', font=('Arial', 10))
         sample_btn.pack(side='right', padx=10)
         
+        duplicates_btn = tk.Button(header_frame, text="Find Duplicates", command=self.find_duplicates,
+                                   bg='#3498db', fg='white', font=('Arial', 10))
+        duplicates_btn.pack(side='right', padx=10)
+        
         # Search frame
         search_frame = tk.Frame(self.root, bg='#f5f5f5')
         search_frame.pack(fill='x', padx=20, pady=10)
@@ -182,6 +363,14 @@ class ContactManager:
                                  bg='#e74c3c', fg='white', font=('Arial', 12))
         delete_button.pack(side='left', padx=5)
         
+        export_button = tk.Button(buttons_frame, text="Export...", command=self.export_contacts,
+                                 bg='#8e44ad', fg='white', font=('Arial', 12))
+        export_button.pack(side='right', padx=5)
+        
+        import_button = tk.Button(buttons_frame, text="Import...", command=self.import_contacts,
+                                 bg='#8e44ad', fg='white', font=('Arial', 12))
+        import_button.pack(side='right', padx=5)
+        
         # Contacts frame
         contacts_frame = tk.LabelFrame(self.root, text="Contacts", font=('Arial', 14, 'bold'),
                                       bg='#f5f5f5', padx=10, pady=10)
@@ -204,16 +393,26 @@ class ContactManager:
         self.tree.column('phone', width=150, anchor='w')
         self.tree.column('email', width=250, anchor='w')
         
-        # Add scrollbar
-        scrollbar = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL, command=self.tree.yview)
-        self.tree.configure(yscrollcommand=scrollbar.set)
+        # Add scrollbar. The treeview only holds the rows in view, so the
+        # scrollbar is driven by our own offset instead of the tree's yview
+        self.scrollbar = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL, command=self.on_scroll)
         
         self.tree.pack(side='left', fill='both', expand=True)
-        scrollbar.pack(side='right', fill='y')
+        self.scrollbar.pack(side='right', fill='y')
         
         # Bind double click to view contact
         self.tree.bind('<Double-1>', lambda e: self.view_contact())
         
+        # Scrolling and keyboard navigation move the view window
+        self.tree.bind('<Configure>', self.on_tree_resize)
+        self.tree.bind('<MouseWheel>', self.on_mouse_wheel)
+        self.tree.bind('<Button-4>', lambda e: self.scroll_rows(-3))
+        self.tree.bind('<Button-5>', lambda e: self.scroll_rows(3))
+        self.tree.bind('<Up>', lambda e: self.move_selection(-1))
+        self.tree.bind('<Down>', lambda e: self.move_selection(1))
+        self.tree.bind('<Prior>', lambda e: self.move_selection(-self.visible_rows))
+        self.tree.bind('<Next>', lambda e: self.move_selection(self.visible_rows))
+        
         # Status bar
         self.status_var = tk.StringVar()
         self.update_status_bar()
@@ -251,10 +450,15 @@ class ContactManager:
             }
         ]
         
-        self.contacts = sample_contacts
-        self.filtered_contacts = self.contacts
+        try:
+            self.store.replace_all(sample_contacts)
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to save contacts: {str(e)}")
+            return
+        
+        self.filtered_contacts = self.store.all_contacts
+        self.cancel_search()
         self.update_contact_list()
-        self.save_contacts()
         messagebox.showinfo("Sample Data", "Sample contacts added successfully!")
     
     def add_contact(self):
@@ -263,27 +467,19 @@ class ContactManager:
         self.root.wait_window(dialog.top)
         
         if dialog.result:
-            # Find the next available ID
-            next_id = max([c['id'] for c in self.contacts], default=0) + 1
-            
-            contact = {
-                'id': next_id,
-                'name': dialog.name_var.get().strip(),
-                'phone': dialog.phone_var.get().strip(),
-                'email': dialog.email_var.get().strip(),
-                'address': dialog.get_address(),
-                'date_added': datetime.now().strftime("%Y-%m-%d %H:%M")
-            }
-            
-            # Validate required fields
-            if not contact['name'] or not contact['phone']:
-                messagebox.showwarning("Warning", "Name and phone number are required!")
+            try:
+                self.store.add(dialog.name_var.get(), dialog.phone_var.get(),
+                               dialog.email_var.get(), dialog.get_address())
+            except ValueError as e:
+                messagebox.showwarning("Warning", str(e))
                 return
-                
-            self.contacts.append(contact)
-            self.filtered_contacts = self.contacts
+            except Exception as e:
+                messagebox.showerror("Error", f"Failed to save contact: {str(e)}")
+                return
+            
+            self.filtered_contacts = self.store.all_contacts
+            self.cancel_search()
             self.update_contact_list()
-            self.save_contacts()
             messagebox.showinfo("Success", "Contact added successfully!")
     
     def view_contact(self):
@@ -291,12 +487,15 @@ class ContactManager:
         if not selected:
             messagebox.showwarning("Warning", "Please select a contact to view!")
             return
-            
+        
         try:
             contact_id = int(selected[0])
-            contact = next((c for c in self.contacts if c['id'] == contact_id), None)
+            contact = self.store.get(contact_id)
             
             if contact:
+                # The list only holds summary fields; read the full record
+                contact = self.load_full_contact(contact)
+                
                 # Create a view dialog
                 dialog = ContactDialog(self.root, "View Contact: " + contact['name'], contact, view_mode=True)
                 self.root.wait_window(dialog.top)
@@ -310,29 +509,30 @@ class ContactManager:
         if not selected:
             messagebox.showwarning("Warning", "Please select a contact to edit!")
             return
-            
+        
         try:
             contact_id = int(selected[0])
-            contact = next((c for c in self.contacts if c['id'] == contact_id), None)
+            contact = self.store.get(contact_id)
             
             if contact:
                 # Create an edit dialog
-                dialog = ContactDialog(self.root, "Edit Contact: " + contact['name'], contact)
+                dialog = ContactDialog(self.root, "Edit Contact: " + contact['name'],
+                                       self.load_full_contact(contact))
                 self.root.wait_window(dialog.top)
                 
                 if dialog.result:
-                    contact['name'] = dialog.name_var.get().strip()
-                    contact['phone'] = dialog.phone_var.get().strip()
-                    contact['email'] = dialog.email_var.get().strip()
-                    contact['address'] = dialog.get_address()
-                    
-                    # Validate required fields
-                    if not contact['name'] or not contact['phone']:
-                        messagebox.showwarning("Warning", "Name and phone number are required!")
+                    try:
+                        self.store.update(contact_id, name=dialog.name_var.get(), phone=dialog.phone_var.get(),
+                                          email=dialog.email_var.get(), address=dialog.get_address())
+                    except ValueError as e:
+                        messagebox.showwarning("Warning", str(e))
+                        return
+                    except Exception as e:
+                        messagebox.showerror("Error", f"Failed to save contact: {str(e)}")
                         return
-                        
+                    
+                    self.cancel_search()
                     self.update_contact_list()
-                    self.save_contacts()
                     messagebox.showinfo("Success", "Contact updated successfully!")
             else:
                 messagebox.showerror("Error", "Contact not found!")
@@ -344,60 +544,342 @@ class ContactManager:
         if not selected:
             messagebox.showwarning("Warning", "Please select a contact to delete!")
             return
-            
+        
         try:
-            contact_id = int(selected[0])
-            contact = next((c for c in self.contacts if c['id'] == contact_id), None)
+            contacts = [self.store.get(int(iid)) for iid in selected]
+            contacts = [c for c in contacts if c is not None]
             
-            if contact:
-                if messagebox.askyesno("Confirm Delete", f"Are you sure you want to delete {contact['name']}?"):
-                    self.contacts = [c for c in self.contacts if c['id'] != contact_id]
-                    self.filtered_contacts = self.contacts
+            if contacts:
+                if len(contacts) == 1:
+                    prompt = f"Are you sure you want to delete {contacts[0]['name']}?"
+                else:
+                    prompt = f"Are you sure you want to delete {len(contacts)} contacts?"
+                
+                if messagebox.askyesno("Confirm Delete", prompt):
+                    try:
+                        self.store.delete_many([c['id'] for c in contacts])
+                    except Exception as e:
+                        messagebox.showerror("Error", f"Failed to delete contacts: {str(e)}")
+                        return
+                    
+                    self.filtered_contacts = self.store.all_contacts
+                    self.cancel_search()
                     self.update_contact_list()
-                    self.save_contacts()
-                    messagebox.showinfo("Success", "Contact deleted successfully!")
+                    messagebox.showinfo("Success", f"Deleted {len(contacts)} contact(s) successfully!")
             else:
                 messagebox.showerror("Error", "Contact not found!")
         except ValueError:
             messagebox.showerror("Error", "Invalid contact selection!")
     
+    def import_contacts(self):
+        if self.import_queue is not None:
+            messagebox.showwarning("Warning", "An import is already running!")
+            return
+        
+        path = filedialog.askopenfilename(title="Import Contacts", filetypes=[
+            ("Contact files", "*.csv *.vcf *.vcard"), ("CSV files", "*.csv"),
+            ("vCard files", "*.vcf *.vcard"), ("All files", "*.*")])
+        if not path:
+            return
+        
+        # Parsing runs on a worker thread. The bounded queue holds at most a
+        # few batches, so memory stays flat however large the file is.
+        self.import_queue = queue.Queue(maxsize=4)
+        self.import_count = 0
+        self.import_skipped = 0
+        threading.Thread(target=self.import_worker, args=(path, self.import_queue), daemon=True).start()
+        self.status_var.set("Importing contacts...")
+        self.root.after(IMPORT_POLL_MS, self.poll_import)
+    
+    def import_worker(self, path, batches):
+        def hand_over(item):
+            # Give up once the Tk side has abandoned this import
+            while self.import_queue is batches:
+                try:
+                    batches.put(item, timeout=0.5)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+        
+        try:
+            for batch in batched(iter_contacts_file(path), IMPORT_BATCH_SIZE):
+                if not hand_over(batch):
+                    return
+            hand_over(None)
+        except Exception as e:
+            hand_over(e)
+    
+    def poll_import(self):
+        # Apply at most one batch per tick so the UI stays responsive
+        try:
+            item = self.import_queue.get_nowait()
+        except queue.Empty:
+            self.root.after(IMPORT_POLL_MS, self.poll_import)
+            return
+        
+        if isinstance(item, list):
+            # One storage transaction per batch; rows without a name or
+            # phone number are skipped, the same rule the dialog applies
+            try:
+                added = self.store.add_many(item, skip_invalid=True)
+            except Exception as e:
+                item = e
+            else:
+                self.import_count += len(added)
+                self.import_skipped += len(item) - len(added)
+                self.update_contact_list()
+                self.status_var.set(f"Importing... {self.import_count} contacts")
+                self.root.after(1, self.poll_import)
+                return
+        
+        # Finished or failed
+        self.import_queue = None
+        self.filtered_contacts = self.store.all_contacts
+        self.cancel_search()
+        self.update_contact_list()
+        
+        if item is None:
+            message = f"Imported {self.import_count} contacts successfully!"
+            if self.import_skipped:
+                message += f"\n{self.import_skipped} rows without a name or phone number were skipped."
+            messagebox.showinfo("Import", message)
+        else:
+            messagebox.showerror("Error", f"Import stopped after {self.import_count} contacts: {str(item)}")
+    
+    def export_contacts(self):
+        file_type = tk.StringVar()
+        path = filedialog.asksaveasfilename(title="Export Contacts", defaultextension='.csv',
+                                            typevariable=file_type, filetypes=[
+            ("CSV files", "*.csv"), ("vCard 3.0", "*.vcf"), ("vCard 4.0", "*.vcf")])
+        if not path:
+            return
+        
+        vcard_version = '4.0' if file_type.get() == "vCard 4.0" else '3.0'
+        self.status_var.set("Exporting contacts...")
+        threading.Thread(target=self.export_worker, args=(path, vcard_version), daemon=True).start()
+    
+    def export_worker(self, path, vcard_version):
+        # Contacts are streamed from storage straight into the file
+        progress = lambda count: self.worker_results.put(
+            (self.status_var.set, (f"Exporting... {count} contacts",)))
+        try:
+            count = self.store.export_file(path, vcard_version, progress)
+            self.worker_results.put((self.finish_export, (count, None)))
+        except Exception as e:
+            self.worker_results.put((self.finish_export, (0, e)))
+    
+    def finish_export(self, count, error):
+        self.update_status_bar()
+        if error is None:
+            messagebox.showinfo("Export", f"Exported {count} contacts successfully!")
+        else:
+            messagebox.showerror("Error", f"Failed to export contacts: {str(error)}")
+    
+    def find_duplicates(self):
+        # Detection runs on a worker thread over a snapshot of the contacts
+        self.status_var.set("Looking for duplicate contacts...")
+        contacts = list(self.store.all_contacts)
+        threading.Thread(target=self.duplicates_worker, args=(contacts,), daemon=True).start()
+    
+    def duplicates_worker(self, contacts):
+        try:
+            groups = find_duplicates(contacts)
+            self.worker_results.put((self.show_duplicates, (groups, None)))
+        except Exception as e:
+            self.worker_results.put((self.show_duplicates, ([], e)))
+    
+    def show_duplicates(self, groups, error):
+        self.update_status_bar()
+        if error is not None:
+            messagebox.showerror("Error", f"Failed to look for duplicates: {str(error)}")
+            return
+        
+        # Drop contacts deleted while the search was running
+        groups = [[i for i in group if self.store.get(i) is not None] for group in groups]
+        groups = [group for group in groups if len(group) > 1]
+        if not groups:
+            messagebox.showinfo("Duplicates", "No duplicate contacts found!")
+            return
+        
+        dialog = DuplicatesDialog(self.root, self.store, groups, self.worker_results)
+        self.root.wait_window(dialog.top)
+        
+        if dialog.merged:
+            self.filtered_contacts = self.store.all_contacts
+            self.cancel_search()
+            self.update_contact_list()
+            messagebox.showinfo("Success", f"Merged {dialog.merged} duplicate group(s) successfully!")
+    
     def filter_contacts(self, *args):
+        # Debounce: only search once typing pauses
+        if self.search_after_id is not None:
+            self.root.after_cancel(self.search_after_id)
+        self.search_after_id = self.root.after(SEARCH_DEBOUNCE_MS, self.start_search)
+    
+    def start_search(self):
+        self.search_after_id = None
+        self.search_generation += 1
         search_term = self.search_var.get().lower()
         
         if not search_term:
-            self.filtered_contacts = self.contacts
-        else:
-            self.filtered_contacts = [
-                c for c in self.contacts 
-                if search_term in c['name'].lower() 
-                or search_term in c['phone'].lower()
-                or (c['email'] and search_term in c['email'].lower())
-            ]
+            self.apply_search_results(self.search_generation, search_term, self.store.all_contacts)
+            return
+        
+        # If the new term contains the previous one, its matches can only
+        # come from the current results
+        candidates = None
+        if self.last_search_term and self.last_search_term in search_term:
+            candidates = self.filtered_contacts
+        
+        self.status_var.set("Searching...")
+        self.search_queue.put((self.search_generation, search_term, candidates))
+    
+    def search_worker(self):
+        while True:
+            generation, search_term, candidates = self.search_queue.get()
+            cancelled = lambda generation=generation: generation != self.search_generation
+            if cancelled():
+                continue
+            
+            results = self.store.search(search_term, candidates=candidates, cancelled=cancelled)
+            if results is None:
+                continue
+            
+            # Hand the results back to the Tk thread
+            self.worker_results.put((self.apply_search_results, (generation, search_term, results)))
+    
+    def poll_worker_results(self):
+        # Scheduled again first: a callback may open a modal dialog, whose
+        # own worker results still have to come through here
+        self.root.after(WORKER_POLL_MS, self.poll_worker_results)
+        while True:
+            try:
+                callback, args = self.worker_results.get_nowait()
+            except queue.Empty:
+                return
+            callback(*args)
+    
+    def apply_search_results(self, generation, search_term, results):
+        if generation != self.search_generation:
+            return
         
+        self.filtered_contacts = results
+        self.last_search_term = search_term
+        self.view_offset = 0
         self.update_contact_list()
     
+    def cancel_search(self):
+        # Drop any pending or running search, since its results would be stale
+        if self.search_after_id is not None:
+            self.root.after_cancel(self.search_after_id)
+            self.search_after_id = None
+        self.search_generation += 1
+        self.last_search_term = None
+    
     def clear_search(self):
         self.search_var.set("")
-        self.filtered_contacts = self.contacts
+        self.cancel_search()
+        self.filtered_contacts = self.store.all_contacts
+        self.view_offset = 0
         self.update_contact_list()
     
     def update_contact_list(self):
-        # Clear the treeview
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-        
-        # Add contacts to treeview
-        for contact in self.filtered_contacts:
+        # Only the rows in view (plus a small overscan) are materialized in the
+        # treeview, so redraw cost depends on the viewport, not the contact count
+        total = len(self.filtered_contacts)
+        self.view_offset = max(0, min(self.view_offset, total - self.visible_rows))
+        
+        # Every change is followed by a redraw, so start checking on its save
+        self.watch_writes()
+        window = self.filtered_contacts[self.view_offset:self.view_offset + self.visible_rows + VIEW_OVERSCAN]
+        
+        # Remember the selection so it survives scrolling out of view and back
+        rendered = set(self.tree.get_children())
+        self.selected_ids = (self.selected_ids - rendered) | set(self.tree.selection())
+        
+        # Replace the rows in the window
+        if rendered:
+            self.tree.delete(*rendered)
+        for contact in window:
             self.tree.insert('', tk.END, values=(
                 contact['name'], 
                 contact['phone'], 
                 contact.get('email', '')  # Use get to handle missing email field
             ), iid=contact['id'])
         
+        self.tree.selection_set([iid for iid in self.selected_ids if self.tree.exists(iid)])
+        self.tree.yview_moveto(0)
+        
+        # Map the window onto the scrollbar
+        if total:
+            self.scrollbar.set(self.view_offset / total, min(1.0, (self.view_offset + self.visible_rows) / total))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+        
         self.update_status_bar()
     
+    def on_scroll(self, *args):
+        # Scrollbar commands: ('moveto', fraction) or ('scroll', n, 'units'|'pages')
+        if args[0] == 'moveto':
+            self.view_offset = int(float(args[1]) * len(self.filtered_contacts))
+        elif args[0] == 'scroll':
+            step = int(args[1])
+            if args[2] == 'pages':
+                step *= self.visible_rows
+            self.view_offset += step
+        self.update_contact_list()
+    
+    def scroll_rows(self, step):
+        self.view_offset += step
+        self.update_contact_list()
+        return 'break'
+    
+    def on_mouse_wheel(self, event):
+        return self.scroll_rows(-3 if event.delta > 0 else 3)
+    
+    def on_tree_resize(self, event):
+        # Work out how many rows fit from the geometry of the first row
+        row_top, row_height = 25, 20
+        children = self.tree.get_children()
+        if children:
+            bbox = self.tree.bbox(children[0])
+            if bbox:
+                row_top, row_height = bbox[1], bbox[3]
+        
+        visible_rows = max(1, (event.height - row_top) // max(row_height, 1))
+        if visible_rows != self.visible_rows:
+            self.visible_rows = visible_rows
+            self.update_contact_list()
+    
+    def move_selection(self, step):
+        total = len(self.filtered_contacts)
+        if not total:
+            return 'break'
+        
+        # Position of the focused row within the whole filtered list
+        children = self.tree.get_children()
+        focus = self.tree.focus()
+        position = self.view_offset + (children.index(focus) if focus in children else 0)
+        target = max(0, min(position + step, total - 1))
+        
+        # Scroll just enough to bring the target row into view
+        if target < self.view_offset:
+            self.view_offset = target
+        elif target >= self.view_offset + self.visible_rows:
+            self.view_offset = target - self.visible_rows + 1
+        
+        self.selected_ids = set()
+        self.tree.selection_set(())
+        self.update_contact_list()
+        
+        iid = str(self.filtered_contacts[target]['id'])
+        self.tree.selection_set(iid)
+        self.tree.focus(iid)
+        return 'break'
+    
     def update_status_bar(self):
-        total_contacts = len(self.contacts)
+        total_contacts = len(self.store)
         filtered_contacts = len(self.filtered_contacts)
         
         if total_contacts == filtered_contacts:
@@ -406,46 +888,73 @@ class ContactManager:
             self.status_var.set(f"Showing {filtered_contacts} of {total_contacts} contacts")
     
     def sort_by_column(self, column, reverse):
-        # Get all values from the treeview
-        items = [(self.tree.set(item, column), item) for item in self.tree.get_children('')]
+        self.filtered_contacts = self.store.sort(self.filtered_contacts, column, reverse)
         
-        # Sort the items
-        items.sort(reverse=reverse)
-        
-        # Rearrange items in sorted positions
-        for index, (values, item) in enumerate(items):
-            self.tree.move(item, '', index)
+        # The treeview only holds the visible window, so this redraws one
+        # screen of rows
+        self.view_offset = 0
+        self.update_contact_list()
         
         # Reverse sort next time
         self.tree.heading(column, command=lambda: self.sort_by_column(column, not reverse))
     
-    def save_contacts(self):
+    def load_full_contact(self, contact):
         try:
-            with open('contacts.json', 'w') as f:
-                json.dump(self.contacts, f, indent=2)
+            return self.store.get_full(contact['id'])
         except Exception as e:
-            messagebox.showerror("Error", f"Failed to save contacts: {str(e)}")
+            messagebox.showerror("Error", f"Failed to load contact: {str(e)}")
+            return contact
     
     def load_contacts(self):
-        if os.path.exists('contacts.json'):
+        try:
+            self.store.load()
+            print(f"Loaded {len(self.store)} contacts")  # Debug print
+            if self.store.migration_skipped:
+                messagebox.showwarning(
+                    "Warning", f"{self.store.migration_skipped} rows of contacts.json were missing an id, "
+                               "name or phone number and were not imported. They are kept in "
+                               "contacts.json.migrated.")
+            # From here on changes return at once and are saved in the
+            # background
+            self.writes = self.store.write_in_background()
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to load contacts: {str(e)}")
+    
+    def watch_writes(self):
+        if self.writes is not None and not self.write_poll_pending:
+            self.write_poll_pending = True
+            self.root.after(WRITE_POLL_MS, self.poll_writes)
+    
+    def poll_writes(self):
+        # Every outcome is on the queue by the time the writer is idle
+        self.write_poll_pending = False
+        idle = self.writes.idle()
+        self.report_write_errors()
+        if not idle:
+            self.watch_writes()
+    
+    def report_write_errors(self):
+        error = None
+        while True:
             try:
-                with open('contacts.json', 'r') as f:
-                    self.contacts = json.load(f)
-                self.filtered_contacts = self.contacts
-                print(f"Loaded {len(self.contacts)} contacts")  # Debug print
-            except Exception as e:
-                messagebox.showerror("Error", f"Failed to load contacts: {str(e)}")
-                self.contacts = []
-                self.filtered_contacts = []
-        else:
-            self.contacts = []
-            self.filtered_contacts = []
-            print("No contacts file found")  # Debug print
+                error = self.writes.written.get_nowait() or error
+            except queue.Empty:
+                break
+        if error is not None:
+            messagebox.showerror("Error", f"Failed to save contacts: {str(error)}")
+    
+    def on_close(self):
+        # Waits for queued changes to be written
+        if self.writes is not None:
+            self.writes.close()
+            self.report_write_errors()
+        self.root.destroy()
 
 def main():
     root = tk.Tk()
     app = ContactManager(root)
     root.mainloop()
+    app.store.close()
 
 if __name__ == "__main__":
     main()
@@ -1,26 +1,69 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, scrolledtext
-import random
-import string
+import math
+
+from passphrase import generate_passphrase, open_default_wordlist, passphrase_guesses
+from password_engine import generate_many
+from password_strength import StrengthMeter, strength_of_guesses
+
+# Label and colour for each score StrengthMeter gives, from 0 to 4
+STRENGTH_LEVELS = [
+    ("Weak", "#e74c3c"),
+    ("Weak", "#e74c3c"),
+    ("Medium", "#f39c12"),
+    ("Strong", "#2ecc71"),
+    ("Very Strong", "#27ae60"),
+]
+
+# Names the meter gives character types, as shown in the feedback line
+TYPE_NAMES = {
+    'upper': "uppercase letters",
+    'lower': "lowercase letters",
+    'digits': "digits",
+    'special': "special characters",
+}
+
+# Quiet time after a keystroke before the strength is rescored, so fast
+# typing or pasting a long passphrase queues at most one rescoring
+STRENGTH_DEBOUNCE_MS = 150
+
+# Label, slider range and starting value of the length control in each mode
+LENGTH_SETTINGS = {
+    'characters': ("Password Length:", 6, 30, 12),
+    'passphrase': ("Number of Words:", 3, 12, 6),
+}
 
 class PasswordGenerator:
     def __init__(self, root):
         self.root = root
         self.root.title("Password Generator")
-        self.root.geometry("500x500")
+        self.root.geometry("500x580")
         self.root.resizable(False, False)
         self.root.configure(bg='#f0f0f0')
         
         # Variables
+        self.mode = tk.StringVar(value='characters')
         self.password_length = tk.IntVar(value=12)
         self.include_uppercase = tk.BooleanVar(value=True)
         self.include_lowercase = tk.BooleanVar(value=True)
         self.include_digits = tk.BooleanVar(value=True)
         self.include_special = tk.BooleanVar(value=True)
         
+        # Keeps the scoring of the text in the password field, so a
+        # keystroke only rescores the characters that changed
+        self.meter = StrengthMeter()
+        self.strength_refresh = None
+        
+        # Passphrase wordlist, opened the first time one is generated, and
+        # the last generated password with the number of guesses it takes
+        self.wordlist = None
+        self.generated = None
+        # Slider value each mode had when the other was chosen
+        self.mode_lengths = {mode: settings[3] for mode, settings in LENGTH_SETTINGS.items()}
+        
         # Create UI
         self.create_widgets()
-        
+    
     def create_widgets(self):
         # Title
         title_label = tk.Label(
@@ -32,19 +75,35 @@ class PasswordGenerator:
         )
         title_label.pack(pady=15)
         
+        # Mode selection frame
+        mode_frame = tk.Frame(self.root, bg='#f0f0f0')
+        mode_frame.pack(padx=20, fill="x")
+        
+        for mode, text in [('characters', "Random Characters"), ('passphrase', "Passphrase (words)")]:
+            tk.Radiobutton(
+                mode_frame,
+                text=text,
+                variable=self.mode,
+                value=mode,
+                command=self.change_mode,
+                font=('Arial', 10),
+                bg='#f0f0f0',
+                activebackground='#f0f0f0'
+            ).pack(side=tk.LEFT, padx=(0, 15))
+        
         # Length selection frame
         length_frame = tk.Frame(self.root, bg='#f0f0f0')
         length_frame.pack(pady=10, padx=20, fill="x")
         
-        length_label = tk.Label(
+        self.length_label = tk.Label(
             length_frame, 
             text="Password Length:", 
             font=('Arial', 12),
             bg='#f0f0f0'
         )
-        length_label.pack(side=tk.LEFT)
+        self.length_label.pack(side=tk.LEFT)
         
-        length_scale = tk.Scale(
+        self.length_scale = tk.Scale(
             length_frame,
             from_=6,
             to=30,
@@ -53,7 +112,7 @@ class PasswordGenerator:
             bg='#f0f0f0',
             highlightthickness=0
         )
-        length_scale.pack(side=tk.RIGHT, fill="x", expand=True)
+        self.length_scale.pack(side=tk.RIGHT, fill="x", expand=True)
         
         # Complexity options frame
         options_frame = tk.LabelFrame(
@@ -116,10 +175,10 @@ class PasswordGenerator:
         )
         generate_btn.pack(pady=15)
         
-        # Generated password display
+        # Password field: generated passwords land here and can be edited
         result_frame = tk.LabelFrame(
             self.root, 
-            text="Generated Password",
+            text="Password (generate one or type your own)",
             font=('Arial', 12, 'bold'),
             bg='#f0f0f0',
             padx=10,
@@ -138,7 +197,7 @@ class PasswordGenerator:
             pady=10
         )
         self.password_display.pack(fill="both", expand=True)
-        self.password_display.config(state=tk.DISABLED)
+        self.password_display.bind('<<Modified>>', self.on_password_edited)
         
         # Copy button
         copy_btn = tk.Button(
@@ -163,6 +222,16 @@ class PasswordGenerator:
         )
         self.strength_label.pack(pady=5)
         
+        # What makes the password weak, if anything
+        self.feedback_label = tk.Label(
+            self.root,
+            text="",
+            font=('Arial', 9),
+            bg='#f0f0f0',
+            fg='#7f8c8d'
+        )
+        self.feedback_label.pack()
+    
     def generate_password(self):
         # Check if at least one character set is selected
         if not (self.include_uppercase.get() or self.include_lowercase.get() or 
@@ -171,74 +240,90 @@ class PasswordGenerator:
             return
         
         # Define character sets
-        char_sets = []
+        classes = []
         if self.include_uppercase.get():
-            char_sets.append(string.ascii_uppercase)
+            classes.append('upper')
         if self.include_lowercase.get():
-            char_sets.append(string.ascii_lowercase)
+            classes.append('lower')
         if self.include_digits.get():
-            char_sets.append(string.digits)
+            classes.append('digits')
         if self.include_special.get():
-            char_sets.append("!@#$%^&*")
-        
-        # Ensure we have at least one character from each selected set
-        password = []
-        for char_set in char_sets:
-            password.append(random.choice(char_set))
-        
-        # Fill the rest of the password with random characters from all selected sets
-        all_chars = ''.join(char_sets)
-        for _ in range(self.password_length.get() - len(password)):
-            password.append(random.choice(all_chars))
+            classes.append('special')
         
-        # Shuffle the password
-        random.shuffle(password)
-        password = ''.join(password)
+        # At least one character from each selected set, or words from
+        # the wordlist, drawn from the operating system's secure random source
+        try:
+            if self.mode.get() == 'passphrase':
+                if self.wordlist is None:
+                    self.wordlist = open_default_wordlist()
+                words = self.password_length.get()
+                password = generate_passphrase(self.wordlist, words, classes)
+                self.generated = (password, passphrase_guesses(len(self.wordlist), words, classes))
+            else:
+                password = generate_many(1, self.password_length.get(), classes)[0]
+                self.generated = None
+        except (OSError, ValueError) as e:
+            messagebox.showerror("Error", str(e))
+            return
         
         # Display the password
-        self.password_display.config(state=tk.NORMAL)
         self.password_display.delete(1.0, tk.END)
         self.password_display.insert(tk.END, password)
-        self.password_display.config(state=tk.DISABLED)
         
         # Update strength indicator
         self.update_strength_indicator(password)
     
+    def change_mode(self):
+        # Each mode keeps its own length, so switching back restores it
+        old_mode = 'passphrase' if self.mode.get() == 'characters' else 'characters'
+        self.mode_lengths[old_mode] = self.password_length.get()
+        text, low, high, _ = LENGTH_SETTINGS[self.mode.get()]
+        self.length_label.config(text=text)
+        self.length_scale.config(from_=low, to=high)
+        self.password_length.set(self.mode_lengths[self.mode.get()])
+    
+    def on_password_edited(self, event=None):
+        # <<Modified>> only fires again once the flag is cleared
+        self.password_display.edit_modified(False)
+        if self.strength_refresh is not None:
+            self.root.after_cancel(self.strength_refresh)
+        self.strength_refresh = self.root.after(STRENGTH_DEBOUNCE_MS, self.refresh_strength)
+    
+    def refresh_strength(self):
+        self.strength_refresh = None
+        self.update_strength_indicator(self.password_display.get(1.0, 'end-1c'))
+    
     def update_strength_indicator(self, password):
-        # Simple password strength calculation
-        strength = 0
-        length = len(password)
+        if not password:
+            self.meter.set_password('')
+            self.strength_label.config(text="Password Strength: Not Generated", fg='#7f8c8d')
+            self.feedback_label.config(text="")
+            return
         
-        # Length factor
-        if length >= 12:
-            strength += 2
-        elif length >= 8:
-            strength += 1
-            
-        # Character diversity factor
-        has_upper = any(c in string.ascii_uppercase for c in password)
-        has_lower = any(c in string.ascii_lowercase for c in password)
-        has_digit = any(c in string.digits for c in password)
-        has_special = any(c in "!@#$%^&*" for c in password)
+        # Estimate the guesses an attacker needs from the words, keyboard
+        # walks, sequences and repeats the password is made of
+        self.meter.set_password(password)
+        result = self.meter.result()
         
-        diversity = sum([has_upper, has_lower, has_digit, has_special])
-        strength += diversity
+        # A generated passphrase is only as strong as the number of ways
+        # the generator could have picked it, whatever the meter thinks
+        known = self.generated is not None and self.generated[0] == password
+        if known and self.generated[1] < result['guesses']:
+            result.update(strength_of_guesses(self.generated[1]))
+        label, color = STRENGTH_LEVELS[result['score']]
+        crack_time = result['crack_times_display']['offline_slow_hash']
         
-        # Set strength text and color
-        if strength >= 5:
-            text = "Password Strength: Very Strong"
-            color = "#27ae60"
-        elif strength >= 4:
-            text = "Password Strength: Strong"
-            color = "#2ecc71"
-        elif strength >= 3:
-            text = "Password Strength: Medium"
-            color = "#f39c12"
-        else:
-            text = "Password Strength: Weak"
-            color = "#e74c3c"
-            
+        text = f"Password Strength: {label} (cracked offline in {crack_time})"
         self.strength_label.config(text=text, fg=color)
+        
+        feedback = result['warning']
+        missing = [TYPE_NAMES[name] for name in self.meter.missing_types()]
+        if not feedback and result['score'] < 3 and missing:
+            feedback = "Try adding " + ", ".join(missing)
+        if known:
+            bits = math.log2(self.generated[1])
+            feedback = f"{bits:.0f} bits of entropy from a {len(self.wordlist):,}-word list"
+        self.feedback_label.config(text=feedback)
     
     def copy_to_clipboard(self):
         password = self.password_display.get(1.0, tk.END).strip()
@@ -1,8 +1,193 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, simpledialog
-import json
-import os
+import queue
+import threading
+from bisect import bisect_left
 from datetime import datetime
+from todo_store import DATE_FORMAT, RANK_WINDOW, RECURRENCE_RULES, TodoStore, parse_due
+
+# Pause in typing before the search box runs its query
+SEARCH_DEBOUNCE_MS = 150
+
+# Tasks read from the database at a time. The next page is read once the
+# list is scrolled past LOAD_MORE_AT of the way down.
+PAGE_SIZE = 200
+LOAD_MORE_AT = 0.9
+
+# Above this many rows to insert or move, one set_children call is cheaper
+# than placing them one at a time
+MAX_SINGLE_MOVES = 32
+
+# How often the Tk thread checks on saves queued for the writer thread
+WRITE_POLL_MS = 50
+
+# Reminder choices in the schedule dialog, in minutes before the due date
+REMIND_CHOICES = {
+    "No reminder": None,
+    "At due time": 0,
+    "15 minutes before": 15,
+    "1 hour before": 60,
+    "1 day before": 24 * 60,
+}
+
+# Longest wait for the next deadline timer. Waking up hourly keeps it on
+# time after the clock changes or the computer sleeps.
+MAX_TIMER_MS = 60 * 60 * 1000
+
+def longest_increasing_run(positions):
+    """Indexes of a longest increasing subsequence of positions"""
+    tails = []      # positions ending the best run of each length
+    tail_index = []
+    previous = [-1] * len(positions)
+    for i, position in enumerate(positions):
+        length = bisect_left(tails, position)
+        if length == len(tails):
+            tails.append(position)
+            tail_index.append(i)
+        else:
+            tails[length] = position
+            tail_index[length] = i
+        previous[i] = tail_index[length - 1] if length else -1
+    
+    run = []
+    i = tail_index[-1] if tail_index else -1
+    while i >= 0:
+        run.append(i)
+        i = previous[i]
+    run.reverse()
+    return run
+
+class TreeviewReconciler:
+    """Brings a flat Treeview in line with a list of rows.
+    
+    Only the rows that were added, removed, changed or moved are touched,
+    so changing one task costs a single Tk call however long the list is.
+    """
+    
+    def __init__(self, tree):
+        self.tree = tree
+        self.values = {}  # iid -> values shown
+        self.order = []   # iids in display order
+    
+    def reconcile(self, rows):
+        """Show rows, a list of (iid, values) in display order"""
+        new_values = dict(rows)
+        new_order = [iid for iid, values in rows]
+        
+        removed = [iid for iid in self.order if iid not in new_values]
+        if removed:
+            self.tree.delete(*removed)
+        
+        for iid, values in rows:
+            old = self.values.get(iid)
+            if old is not None and old != values:
+                self.tree.item(iid, values=values)
+        
+        # Rows that stay put: the longest run of kept rows that is already
+        # in the new order. Every other row is inserted or moved.
+        kept = [iid for iid in self.order if iid in new_values]
+        if kept == [iid for iid in new_order if iid in self.values]:
+            staying = set(kept)
+        else:
+            position = {iid: i for i, iid in enumerate(new_order)}
+            positions = [position[iid] for iid in kept]
+            staying = {kept[i] for i in longest_increasing_run(positions)}
+        
+        placed = [iid for iid in new_order if iid not in staying]
+        if placed and placed == new_order[-len(placed):] and not any(iid in self.values for iid in placed):
+            # Only new rows at the end, as when another page is loaded
+            for iid in placed:
+                self.tree.insert('', tk.END, iid=iid, values=new_values[iid])
+        elif len(placed) > MAX_SINGLE_MOVES:
+            for iid in placed:
+                if iid not in self.values:
+                    self.tree.insert('', tk.END, iid=iid, values=new_values[iid])
+            self.tree.set_children('', *new_order)
+        elif placed:
+            moving = [iid for iid in placed if iid in self.values]
+            if moving:
+                self.tree.detach(*moving)
+            # Put each row straight after the row before it in the new
+            # order, which is already in place by then
+            previous = None
+            for iid in new_order:
+                if iid not in staying:
+                    index = self.tree.index(previous) + 1 if previous is not None else 0
+                    if iid in self.values:
+                        self.tree.move(iid, '', index)
+                    else:
+                        self.tree.insert('', index, iid=iid, values=new_values[iid])
+                previous = iid
+        
+        self.values = new_values
+        self.order = new_order
+
+class ScheduleDialog:
+    """Asks for a due date, a reminder and how often a task repeats"""
+    
+    def __init__(self, parent, task):
+        self.top = tk.Toplevel(parent)
+        self.top.title("Schedule Task")
+        self.top.configure(bg='#f5f5f5')
+        self.top.resizable(False, False)
+        self.top.transient(parent)
+        self.top.grab_set()  # Make dialog modal
+        
+        self.result = None
+        
+        # A reminder set some other way is kept as a choice of its own
+        self.remind_choices = dict(REMIND_CHOICES)
+        remind_label = next((label for label, minutes in self.remind_choices.items()
+                             if minutes == task['remind_minutes']), None)
+        if remind_label is None:
+            remind_label = f"{task['remind_minutes']} minutes before"
+            self.remind_choices[remind_label] = task['remind_minutes']
+        
+        tk.Label(self.top, text="Due (YYYY-MM-DD HH:MM):", font=('Arial', 10),
+                 bg='#f5f5f5').grid(row=0, column=0, sticky='w', padx=10, pady=5)
+        self.due_var = tk.StringVar(value=task['due'])
+        due_entry = tk.Entry(self.top, textvariable=self.due_var, font=('Arial', 10), width=20)
+        due_entry.grid(row=0, column=1, padx=10, pady=5)
+        due_entry.focus_set()
+        
+        tk.Label(self.top, text="Remind me:", font=('Arial', 10),
+                 bg='#f5f5f5').grid(row=1, column=0, sticky='w', padx=10, pady=5)
+        self.remind_var = tk.StringVar(value=remind_label)
+        ttk.Combobox(self.top, textvariable=self.remind_var, values=list(self.remind_choices),
+                     width=18, state="readonly").grid(row=1, column=1, padx=10, pady=5)
+        
+        tk.Label(self.top, text="Repeat:", font=('Arial', 10),
+                 bg='#f5f5f5').grid(row=2, column=0, sticky='w', padx=10, pady=5)
+        self.repeat_var = tk.StringVar(value=task['recurrence'].capitalize() or "Never")
+        repeat_choices = ["Never"] + [rule.capitalize() for rule in RECURRENCE_RULES]
+        ttk.Combobox(self.top, textvariable=self.repeat_var, values=repeat_choices,
+                     width=18, state="readonly").grid(row=2, column=1, padx=10, pady=5)
+        
+        buttons_frame = tk.Frame(self.top, bg='#f5f5f5')
+        buttons_frame.grid(row=3, column=0, columnspan=2, pady=10)
+        tk.Button(buttons_frame, text="Save", command=self.save, bg='#4CAF50', fg='white',
+                  font=('Arial', 10), width=10).pack(side='left', padx=5)
+        tk.Button(buttons_frame, text="Cancel", command=self.top.destroy, bg='#9E9E9E', fg='white',
+                  font=('Arial', 10), width=10).pack(side='left', padx=5)
+        self.top.bind('<Return>', lambda e: self.save())
+    
+    def save(self):
+        try:
+            due = parse_due(self.due_var.get())
+        except ValueError:
+            messagebox.showwarning("Warning", "Please enter the due date as YYYY-MM-DD HH:MM!", parent=self.top)
+            return
+        recurrence = '' if self.repeat_var.get() == "Never" else self.repeat_var.get().lower()
+        if recurrence and not due:
+            messagebox.showwarning("Warning", "Please enter a due date for a repeating task!", parent=self.top)
+            return
+        
+        self.result = {
+            'due': due,
+            'remind_minutes': self.remind_choices[self.remind_var.get()] if due else None,
+            'recurrence': recurrence
+        }
+        self.top.destroy()
 
 class TodoApp:
     def __init__(self, root):
@@ -12,8 +197,34 @@ class TodoApp:
         self.root.configure(bg='#f5f5f5')
         self.root.resizable(True, True)
         
-        # Initialize tasks list
-        self.tasks = []
+        # All task logic lives in the store (tasks.db); this class only
+        # shows it. These hold the tasks loaded into the list, by id and as
+        # treeview rows, whether there are more, and whether a search only
+        # ranked the newest RANK_WINDOW matches.
+        self.store = None
+        self.tasks = {}
+        self.rows = []
+        self.has_more = False
+        self.search_limited = False
+        self.load_more_pending = False
+        
+        # Set while tasks.json is being imported in the background
+        self.migrating = False
+        self.migrated_count = 0
+        
+        # Changes are saved by the store's writer thread; the list is read
+        # again once they are written
+        self.write_poll_pending = False
+        
+        # The one timer, set for the earliest due date or reminder
+        self.deadline_after_id = None
+        
+        # Column the list is sorted by (in SQL), kept when tasks change
+        self.sort_column = None
+        self.sort_reverse = False
+        
+        # Pending root.after call for the search box
+        self.search_after_id = None
         
         # Load previous tasks if available
         self.load_tasks()
@@ -22,7 +233,12 @@ class TodoApp:
         self.setup_ui()
         
         # Populate tasks
-        self.update_task_list()
+        self.update_task_list(reset=True)
+        if not self.migrating:
+            self.load_deadlines()
+        
+        # Save queued changes before the window closes
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
     
     def setup_ui(self):
         # Header frame
@@ -61,7 +277,15 @@ class TodoApp:
         filter_combo = ttk.Combobox(filter_frame, textvariable=self.filter_var, 
                                    values=["All", "Completed", "Pending"], width=12, state="readonly")
         filter_combo.pack(side='left', padx=10)
-        filter_combo.bind('<<ComboboxSelected>>', lambda e: self.update_task_list())
+        filter_combo.bind('<<ComboboxSelected>>', lambda e: self.update_task_list(reset=True))
+        
+        tk.Label(filter_frame, text="Search:", font=('Arial', 10), bg='#f5f5f5').pack(side='left', padx=(20, 0))
+        
+        self.search_var = tk.StringVar()
+        self.search_var.trace('w', self.search_tasks)
+        search_entry = tk.Entry(filter_frame, textvariable=self.search_var, font=('Arial', 10), width=30)
+        search_entry.pack(side='left', padx=10)
+        search_entry.bind('<Escape>', lambda e: self.search_var.set(""))
         
         # Tasks frame
         tasks_frame = tk.Frame(self.root, bg='#f5f5f5')
@@ -71,28 +295,36 @@ class TodoApp:
         tree_frame = tk.Frame(tasks_frame)
         tree_frame.pack(fill='both', expand=True)
         
-        columns = ('status', 'task', 'date')
-        self.tree = ttk.Treeview(tree_frame, columns=columns, show='headings', height=15)
+        columns = ('status', 'task', 'tags', 'due', 'date')
+        # Shift/Ctrl-click selects several tasks for the buttons below
+        self.tree = ttk.Treeview(tree_frame, columns=columns, show='headings', height=15, selectmode='extended')
         
         # Define headings
         self.tree.heading('status', text='Status', command=lambda: self.sort_by_column('status', False))
         self.tree.heading('task', text='Task', command=lambda: self.sort_by_column('task', False))
+        self.tree.heading('tags', text='Tags', command=lambda: self.sort_by_column('tags', False))
+        self.tree.heading('due', text='Due', command=lambda: self.sort_by_column('due', False))
         self.tree.heading('date', text='Date Added', command=lambda: self.sort_by_column('date', False))
         
         # Define columns
         self.tree.column('status', width=100, anchor='center')
-        self.tree.column('task', width=400, anchor='w')
+        self.tree.column('task', width=260, anchor='w')
+        self.tree.column('tags', width=100, anchor='w')
+        self.tree.column('due', width=170, anchor='center')
         self.tree.column('date', width=150, anchor='center')
         
         # Add scrollbar
-        scrollbar = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL, command=self.tree.yview)
-        self.tree.configure(yscrollcommand=scrollbar.set)
+        self.scrollbar = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL, command=self.tree.yview)
+        self.tree.configure(yscrollcommand=self.on_tree_scroll)
         
         self.tree.pack(side='left', fill='both', expand=True)
-        scrollbar.pack(side='right', fill='y')
+        self.scrollbar.pack(side='right', fill='y')
+        
+        self.reconciler = TreeviewReconciler(self.tree)
         
         # Bind double click to edit task
         self.tree.bind('<Double-1>', self.edit_task)
+        self.tree.bind('<Control-a>', lambda e: self.tree.selection_set(self.tree.get_children()))
         
         # Buttons frame
         buttons_frame = tk.Frame(self.root, bg='#f5f5f5')
@@ -110,138 +342,408 @@ class TodoApp:
                                  bg='#F44336', fg='white', font=('Arial', 10))
         delete_button.pack(side='left', padx=5)
         
+        tags_button = tk.Button(buttons_frame, text="Set Tags", command=self.retag_tasks,
+                               bg='#009688', fg='white', font=('Arial', 10))
+        tags_button.pack(side='left', padx=5)
+        
+        schedule_button = tk.Button(buttons_frame, text="Schedule", command=self.schedule_tasks,
+                                   bg='#673AB7', fg='white', font=('Arial', 10))
+        schedule_button.pack(side='left', padx=5)
+        
         clear_button = tk.Button(buttons_frame, text="Clear Completed", command=self.clear_completed,
                                 bg='#9E9E9E', fg='white', font=('Arial', 10))
         clear_button.pack(side='right', padx=5)
         
         # Status bar
         self.status_var = tk.StringVar()
-        self.status_var.set(f"Total Tasks: {len(self.tasks)} | Completed: {len([t for t in self.tasks if t['completed']])}")
+        self.update_status_bar()
         
         status_bar = tk.Label(self.root, textvariable=self.status_var, bd=1, relief=tk.SUNKEN, 
                              anchor=tk.W, bg='#E0E0E0', font=('Arial', 10))
         status_bar.pack(side=tk.BOTTOM, fill=tk.X)
     
+    def still_importing(self):
+        if self.migrating:
+            messagebox.showinfo("Info", "Please wait until your tasks from tasks.json have been imported.")
+        return self.migrating
+    
     def add_task(self):
+        if self.still_importing():
+            return
         task_text = self.task_entry.get().strip()
         if task_text:
-            task = {
-                'id': len(self.tasks) + 1,
-                'text': task_text,
-                'completed': False,
-                'date_added': datetime.now().strftime("%Y-%m-%d %H:%M")
-            }
-            self.tasks.append(task)
+            try:
+                task = self.store.add(task_text)
+            except Exception as e:
+                messagebox.showerror("Error", f"Failed to save task: {str(e)}")
+                return
+            # Shows up in the list once it is written
+            self.show_changes([task])
             self.task_entry.delete(0, tk.END)
-            self.update_task_list()
-            self.save_tasks()
         else:
             messagebox.showwarning("Warning", "Please enter a task!")
     
-    def update_task_list(self):
-        # Clear the treeview
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-        
-        # Filter tasks
-        filter_value = self.filter_var.get()
-        if filter_value == "Completed":
-            display_tasks = [t for t in self.tasks if t['completed']]
-        elif filter_value == "Pending":
-            display_tasks = [t for t in self.tasks if not t['completed']]
-        else:
-            display_tasks = self.tasks
-        
-        # Add tasks to treeview
-        for task in display_tasks:
-            status = "✓" if task['completed'] else "○"
-            self.tree.insert('', tk.END, values=(status, task['text'], task['date_added']), iid=task['id'])
-        
-        # Update status bar
-        total_tasks = len(self.tasks)
-        completed_tasks = len([t for t in self.tasks if t['completed']])
-        self.status_var.set(f"Total Tasks: {total_tasks} | Completed: {completed_tasks} | Pending: {total_tasks - completed_tasks}")
+    def status_filter(self):
+        return {"Completed": True, "Pending": False}.get(self.filter_var.get())
+    
+    def task_row(self, task):
+        status = "✓" if task['completed'] else "○"
+        due = task['due']
+        if due and task['recurrence']:
+            due += " ↻"
+        if due and not task['completed'] and task['due'] <= datetime.now().strftime(DATE_FORMAT):
+            due += " (overdue)"
+        return (str(task['id']), (status, task['text'], task['tags'], due, task['date_added']))
+    
+    def update_task_list(self, reset=False):
+        # Filter and sort tasks in SQL, using the index on completed, or
+        # show the best search hits while there is a search. Only the first
+        # page is read; after a change as many tasks as were loaded are
+        # read again, so the list stays where it was scrolled to.
+        search_text = self.search_var.get().strip()
+        limit = PAGE_SIZE if reset else max(PAGE_SIZE, len(self.tasks))
+        try:
+            if search_text:
+                display_tasks, self.search_limited = self.store.search(
+                    search_text, self.status_filter(), self.sort_column, self.sort_reverse)
+                self.has_more = False
+            else:
+                display_tasks = self.store.query(self.status_filter(), self.sort_column, self.sort_reverse,
+                                                 limit=limit)
+                self.has_more = len(display_tasks) == limit
+                self.search_limited = False
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to load tasks: {str(e)}")
+            return
+        self.tasks = {task['id']: task for task in display_tasks}
+        
+        # Update only the rows that differ from what is shown
+        self.rows = [self.task_row(task) for task in display_tasks]
+        self.reconciler.reconcile(self.rows)
+        if reset:
+            self.tree.yview_moveto(0)
+        self.update_status_bar()
+    
+    def on_tree_scroll(self, first, last):
+        self.scrollbar.set(first, last)
+        if self.has_more and not self.load_more_pending and float(last) >= LOAD_MORE_AT:
+            self.load_more_pending = True
+            self.root.after_idle(self.load_more_tasks)
+    
+    def load_more_tasks(self):
+        # Read the page after the last loaded task and add it to the end
+        self.load_more_pending = False
+        if not self.has_more or not self.rows:
+            return
+        
+        last_task = self.tasks[int(self.rows[-1][0])]
+        try:
+            page = self.store.query(self.status_filter(), self.sort_column, self.sort_reverse,
+                                    limit=PAGE_SIZE, after=last_task)
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to load tasks: {str(e)}")
+            return
+        
+        self.has_more = len(page) == PAGE_SIZE
+        for task in page:
+            self.tasks[task['id']] = task
+            self.rows.append(self.task_row(task))
+        self.reconciler.reconcile(self.rows)
+    
+    def update_status_bar(self):
+        # Totals are kept up to date by the database
+        status = (f"Total Tasks: {self.store.count()} | Completed: {self.store.count(True)} | "
+                  f"Pending: {self.store.count(False)}")
+        if self.migrating:
+            status += f" | Importing tasks.json: {self.migrated_count} tasks so far..."
+        if self.search_limited:
+            status += f" | Results limited to newest {RANK_WINDOW} matches"
+        if self.store.path == ':memory:':
+            status += " | Not saved: tasks.db could not be opened"
+        self.status_var.set(status)
+    
+    def selected_ids(self):
+        return [int(iid) for iid in self.tree.selection()]
     
     def mark_complete(self):
-        selected = self.tree.selection()
-        if selected:
-            task_id = int(selected[0])
-            for task in self.tasks:
-                if task['id'] == task_id:
-                    task['completed'] = not task['completed']
-                    break
-            self.update_task_list()
-            self.save_tasks()
+        if self.still_importing():
+            return
+        task_ids = self.selected_ids()
+        if task_ids:
+            # Completes the selected tasks, or marks them pending again if
+            # they are all completed already
+            completed = not all(self.tasks[i]['completed'] for i in task_ids if i in self.tasks)
+            try:
+                # Also adds the next occurrence of completed recurring tasks
+                tasks = self.store.set_completed([self.tasks[i] for i in task_ids if i in self.tasks], completed)
+            except Exception as e:
+                messagebox.showerror("Error", f"Failed to save tasks: {str(e)}")
+                return
+            self.show_changes(tasks)
         else:
             messagebox.showwarning("Warning", "Please select a task to mark as complete!")
     
     def edit_task(self, event=None):
+        if self.still_importing():
+            return
         selected = self.tree.selection()
         if selected:
-            task_id = int(selected[0])
-            for task in self.tasks:
-                if task['id'] == task_id:
-                    new_text = simpledialog.askstring("Edit Task", "Modify your task:", initialvalue=task['text'])
-                    if new_text and new_text.strip():
-                        task['text'] = new_text.strip()
-                        self.update_task_list()
-                        self.save_tasks()
-                    break
+            task = self.tasks.get(int(selected[0]))
+            if task is not None:
+                new_text = simpledialog.askstring("Edit Task", "Modify your task:", initialvalue=task['text'])
+                if new_text and new_text.strip():
+                    try:
+                        tasks = self.store.update_many([task], text=new_text.strip())
+                    except Exception as e:
+                        messagebox.showerror("Error", f"Failed to save task: {str(e)}")
+                        return
+                    self.show_changes(tasks)
         else:
             messagebox.showwarning("Warning", "Please select a task to edit!")
     
     def delete_task(self):
-        selected = self.tree.selection()
-        if selected:
-            if messagebox.askyesno("Confirm Delete", "Are you sure you want to delete this task?"):
-                task_id = int(selected[0])
-                self.tasks = [t for t in self.tasks if t['id'] != task_id]
-                self.update_task_list()
-                self.save_tasks()
+        if self.still_importing():
+            return
+        task_ids = self.selected_ids()
+        if task_ids:
+            message = ("Are you sure you want to delete this task?" if len(task_ids) == 1
+                       else f"Are you sure you want to delete these {len(task_ids)} tasks?")
+            if messagebox.askyesno("Confirm Delete", message):
+                try:
+                    self.store.delete_many(task_ids)
+                except Exception as e:
+                    messagebox.showerror("Error", f"Failed to delete tasks: {str(e)}")
+                    return
+                self.show_changes(deleted=task_ids)
         else:
             messagebox.showwarning("Warning", "Please select a task to delete!")
     
+    def retag_tasks(self):
+        if self.still_importing():
+            return
+        task_ids = self.selected_ids()
+        if not task_ids:
+            messagebox.showwarning("Warning", "Please select a task to tag!")
+            return
+        
+        current = self.tasks[task_ids[0]]['tags'] if task_ids[0] in self.tasks else ''
+        tags = simpledialog.askstring("Set Tags", f"Tags for {len(task_ids)} task(s), separated by commas:",
+                                      initialvalue=current)
+        if tags is not None:
+            try:
+                tasks = self.store.update_many([self.tasks[i] for i in task_ids if i in self.tasks], tags=tags)
+            except Exception as e:
+                messagebox.showerror("Error", f"Failed to save tasks: {str(e)}")
+                return
+            self.show_changes(tasks)
+    
+    def schedule_tasks(self):
+        if self.still_importing():
+            return
+        task_ids = [i for i in self.selected_ids() if i in self.tasks]
+        if not task_ids:
+            messagebox.showwarning("Warning", "Please select a task to schedule!")
+            return
+        
+        dialog = ScheduleDialog(self.root, self.tasks[task_ids[0]])
+        self.root.wait_window(dialog.top)
+        if dialog.result is not None:
+            try:
+                tasks = self.store.update_many([self.tasks[i] for i in task_ids], **dialog.result)
+            except Exception as e:
+                messagebox.showerror("Error", f"Failed to save tasks: {str(e)}")
+                return
+            self.show_changes(tasks)
+    
     def clear_completed(self):
-        if any(task['completed'] for task in self.tasks):
+        if self.still_importing():
+            return
+        # Tasks just marked complete may still be on their way to the database
+        try:
+            self.store.flush()
+            completed = self.store.count(True)
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to load tasks: {str(e)}")
+            return
+        if completed:
             if messagebox.askyesno("Confirm Clear", "Are you sure you want to clear all completed tasks?"):
-                self.tasks = [t for t in self.tasks if not t['completed']]
-                self.update_task_list()
-                self.save_tasks()
+                try:
+                    self.store.delete_completed()
+                except Exception as e:
+                    messagebox.showerror("Error", f"Failed to delete tasks: {str(e)}")
+                    return
+                self.show_changes(deleted=[i for i, task in self.tasks.items() if task['completed']])
         else:
             messagebox.showinfo("Info", "There are no completed tasks to clear!")
     
+    def search_tasks(self, *args):
+        # Debounce: only search once typing pauses
+        if self.search_after_id is not None:
+            self.root.after_cancel(self.search_after_id)
+        self.search_after_id = self.root.after(SEARCH_DEBOUNCE_MS, self.run_search)
+    
+    def run_search(self):
+        self.search_after_id = None
+        self.update_task_list(reset=True)
+    
     def sort_by_column(self, column, reverse):
-        # Get all values from the treeview
-        items = [(self.tree.set(item, column), item) for item in self.tree.get_children('')]
-        
-        # Sort the items
-        items.sort(reverse=reverse)
-        
-        # Rearrange items in sorted positions
-        for index, (values, item) in enumerate(items):
-            self.tree.move(item, '', index)
+        self.sort_column = column
+        self.sort_reverse = reverse
+        self.update_task_list(reset=True)
         
         # Reverse sort next time
         self.tree.heading(column, command=lambda: self.sort_by_column(column, not reverse))
     
-    def save_tasks(self):
-        with open('tasks.json', 'w') as f:
-            json.dump(self.tasks, f)
+    def show_changes(self, tasks=(), deleted=()):
+        # Changes are queued for the store's writer thread, which saves a
+        # burst of them in one transaction. Until the list is read again
+        # after the write, the loaded rows are updated in place; filters
+        # and sorting catch up then.
+        self.schedule_deadline()
+        deleted = set(deleted)
+        for task in tasks:
+            if task['id'] in self.tasks:
+                self.tasks[task['id']] = task
+        for task_id in deleted:
+            self.tasks.pop(task_id, None)
+        self.rows = [self.task_row(self.tasks[int(iid)]) for iid, values in self.rows if int(iid) in self.tasks]
+        self.reconciler.reconcile(self.rows)
+        self.watch_writes()
+    
+    def load_deadlines(self):
+        try:
+            self.store.load_deadlines()
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to load reminders: {str(e)}")
+            return
+        self.schedule_deadline()
+    
+    def schedule_deadline(self):
+        # A single timer, for the earliest deadline only
+        if self.deadline_after_id is not None:
+            self.root.after_cancel(self.deadline_after_id)
+            self.deadline_after_id = None
+        
+        when = self.store.next_deadline()
+        if when is not None:
+            wait = (datetime.strptime(when, DATE_FORMAT) - datetime.now()).total_seconds()
+            self.deadline_after_id = self.root.after(min(max(0, int(wait * 1000)), MAX_TIMER_MS),
+                                                     self.on_deadline)
+    
+    def on_deadline(self):
+        self.deadline_after_id = None
+        now = datetime.now().strftime(DATE_FORMAT)
+        fired = self.store.pop_deadlines(now)
+        self.schedule_deadline()
+        
+        if any(kind == 'due' for kind, task_id in fired):
+            # Marks the tasks that just became overdue
+            self.update_task_list()
+        
+        reminders = [task_id for kind, task_id in fired if kind == 'remind']
+        if reminders:
+            lines = []
+            for task_id in reminders:
+                task = self.tasks.get(task_id) or self.store.get(task_id)
+                if task is not None:
+                    lines.append(f"{task['text']} (due {task['due']})")
+            if lines:
+                messagebox.showinfo("Reminder", "\n".join(lines))
+    
+    def watch_writes(self):
+        if self.store.writes is None:
+            # Written already, so filters and sorting can catch up now
+            self.update_task_list()
+            return
+        if not self.write_poll_pending:
+            self.write_poll_pending = True
+            self.root.after(WRITE_POLL_MS, self.poll_writes)
+    
+    def poll_writes(self):
+        # Every outcome is on the queue by the time the writer is idle
+        self.write_poll_pending = False
+        idle = self.store.writes.idle()
+        outcomes = self.take_write_outcomes()
+        if outcomes:
+            self.update_task_list()
+        if not idle:
+            self.watch_writes()
+    
+    def take_write_outcomes(self):
+        # Shows the last error of the writes finished since the last call
+        outcomes = []
+        if self.store.writes is None:
+            return outcomes
+        while True:
+            try:
+                outcomes.append(self.store.writes.written.get_nowait())
+            except queue.Empty:
+                break
+        errors = [error for error in outcomes if error is not None]
+        if errors:
+            messagebox.showerror("Error", f"Failed to save tasks: {str(errors[-1])}")
+        return outcomes
+    
+    def on_close(self):
+        # Waits for queued changes to be written
+        self.store.flush()
+        self.take_write_outcomes()
+        self.root.destroy()
     
     def load_tasks(self):
-        if os.path.exists('tasks.json'):
+        # Opens tasks.db. The tasks themselves are read a page at a time by
+        # update_task_list.
+        try:
+            self.store = TodoStore('tasks.db', write_behind=True)
+            self.migrating = self.store.needs_migration('tasks.json')
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to load tasks: {str(e)}\n\n"
+                                 "Tasks you add or change in this session will not be saved.")
+            # Keep the app usable for this session, and say so in the
+            # status bar for as long as it runs
+            self.store = TodoStore(':memory:', write_behind=True)
+            self.migrating = False
+        
+        if self.migrating:
+            # Import tasks.json on a worker thread so the window opens right
+            # away; the list fills in as batches are written
+            threading.Thread(target=self.migrate_worker, args=(self.store.path,), daemon=True).start()
+    
+    def migrate_worker(self, path):
+        # SQLite connections belong to one thread, so the worker opens its own
+        try:
+            store = TodoStore(path)
             try:
-                with open('tasks.json', 'r') as f:
-                    self.tasks = json.load(f)
-            except:
-                self.tasks = []
+                _, skipped = store.migrate_from_json('tasks.json', progress=lambda count: self.root.after(
+                    0, self.show_migration_progress, count))
+            finally:
+                store.close()
+            self.root.after(0, self.finish_migration, None, skipped)
+        except Exception as e:
+            self.root.after(0, self.finish_migration, e, 0)
+    
+    def show_migration_progress(self, count):
+        self.migrated_count = count
+        if len(self.tasks) < PAGE_SIZE:
+            self.update_task_list()
         else:
-            self.tasks = []
+            self.update_status_bar()
+    
+    def finish_migration(self, error, skipped):
+        self.migrating = False
+        if error is not None:
+            messagebox.showerror("Error", f"Failed to import tasks.json: {str(error)}")
+        elif skipped:
+            messagebox.showwarning("Warning", f"{skipped} rows of tasks.json were missing an id or text and "
+                                              "were not imported. They are kept in tasks.json.migrated.")
+        self.update_task_list()
+        self.load_deadlines()
 
 def main():
     root = tk.Tk()
     app = TodoApp(root)
     root.mainloop()
+    app.store.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,336 @@
+import argparse
+import gc
+import multiprocessing
+import random
+import re
+import time
+from collections import defaultdict
+from functools import lru_cache
+
+# Pairs scoring at least this much are treated as the same person
+DUPLICATE_THRESHOLD = 0.8
+
+# Blocks larger than this are not compared all-against-all; each contact
+# is only compared with its next few neighbours. A very common name makes
+# a large name block, sorted by name and local number so a re-entered
+# number lands next to the original. A shared switchboard number or role
+# address makes a large phone or email block, sorted by name instead,
+# since there the name is all that tells two people apart.
+MAX_BLOCK_SIZE = 200
+NEIGHBOUR_WINDOW = 4
+
+# Below this many contacts to compare, scoring in-process beats the cost of
+# starting worker processes
+MULTIPROCESS_MIN_CONTACTS = 50000
+
+SOUNDEX_CODES = {}
+for letters, code in (('bfpv', '1'), ('cgjkqsxz', '2'), ('dt', '3'), ('l', '4'), ('mn', '5'), ('r', '6')):
+    for letter in letters:
+        SOUNDEX_CODES[letter] = code
+
+
+def normalize_phone(phone):
+    """Digits of a phone number, ignoring the country prefix"""
+    digits = re.sub(r'\D', '', phone or '')
+    if len(digits) < 7:
+        return ''
+    # +1 555 123 4567 and (555) 123-4567 should match
+    return digits[-10:]
+
+
+def normalize_email(email):
+    email = (email or '').strip().casefold()
+    local, at, domain = email.partition('@')
+    if not at:
+        return ''
+    # Drop "+tag" suffixes, which deliver to the same mailbox
+    return local.split('+', 1)[0] + '@' + domain
+
+
+@lru_cache(maxsize=100000)
+def name_keys(name):
+    """Sorted words of a name and a phonetic key that ignores word order"""
+    tokens = tuple(sorted(re.findall(r'\w+', name.casefold())))
+    return tokens, ' '.join(sorted(soundex(t) for t in tokens))
+
+
+@lru_cache(maxsize=100000)
+def soundex(word):
+    word = ''.join(c for c in word if c.isalpha())
+    if not word:
+        return ''
+    
+    code = word[0].upper()
+    previous = SOUNDEX_CODES.get(word[0], '')
+    for c in word[1:]:
+        digit = SOUNDEX_CODES.get(c, '')
+        if digit and digit != previous:
+            code += digit
+            if len(code) == 4:
+                break
+        # h and w do not separate letters with the same code
+        if c not in 'hw':
+            previous = digit
+    return code.ljust(4, '0')
+
+
+def prepare(contact):
+    """Normalized fields for blocking and scoring.
+    
+    Returns (id, name words, phonetic name key, phone, email, local number).
+    """
+    tokens, name_key = name_keys(contact.get('name') or '')
+    phone = normalize_phone(contact.get('phone'))
+    return (contact['id'], tokens, name_key, phone, normalize_email(contact.get('email')), phone[-7:])
+
+
+def score(a, b):
+    """Similarity of two prepared contacts between 0 and 1.4"""
+    total = 0.0
+    if a[3] and a[3] == b[3]:
+        total += 0.5
+    elif a[5] and a[5] == b[5]:
+        # Same local number with a different or missing area code
+        total += 0.4
+    if a[4] and a[4] == b[4]:
+        total += 0.5
+    
+    # Share of the shorter name's words found in the other name, with
+    # names that sound the same counting as close
+    if a[1] and b[1]:
+        similarity = len(set(a[1]) & set(b[1])) / min(len(a[1]), len(b[1]))
+        if a[2] == b[2]:
+            similarity = max(similarity, 0.8)
+        total += 0.4 * similarity
+    return total
+
+
+def build_blocks(records):
+    """Group records that share a phone number, email or phonetic name key.
+    
+    Returns (key, records) pairs, where key is ('phone', number),
+    ('email', address) or ('name', phonetic key).
+    """
+    # Most keys belong to a single contact, so only start a block list once
+    # a second contact shows up with the same key
+    first = {}
+    blocks = {}
+    for record in records:
+        for key in (('phone', record[3]), ('email', record[4]), ('name', record[2])):
+            if not key[1]:
+                continue
+            other = first.setdefault(key, record)
+            if other is not record:
+                block = blocks.get(key)
+                if block is None:
+                    blocks[key] = [other, record]
+                else:
+                    block.append(record)
+    return list(blocks.items())
+
+
+def score_blocks(blocks):
+    """Return (score, id_a, id_b) for every likely duplicate pair in the blocks"""
+    matches = []
+    for (kind, _), block in blocks:
+        if len(block) <= MAX_BLOCK_SIZE:
+            for i, a in enumerate(block):
+                for b in block[i + 1:]:
+                    s = score(a, b)
+                    if s >= DUPLICATE_THRESHOLD:
+                        matches.append((s, a[0], b[0]))
+        elif kind == 'name':
+            # Sorted neighbourhood: compare each contact with the next few
+            # in name and local number order instead of the whole block.
+            # Pairs sharing a phone or email are compared in those blocks,
+            # so only a shared local number can add a match here.
+            block = sorted(block, key=lambda r: (r[1], r[5]))
+            for i, a in enumerate(block):
+                for b in block[i + 1:i + 1 + NEIGHBOUR_WINDOW]:
+                    if a[5] and a[5] == b[5]:
+                        s = score(a, b)
+                        if s >= DUPLICATE_THRESHOLD:
+                            matches.append((s, a[0], b[0]))
+        else:
+            # Everyone here shares the phone or email, so sort by how the
+            # name sounds and then its words. Copies of one person end up in
+            # a row, and comparing neighbours chains the whole row together.
+            block = sorted(block, key=lambda r: (r[2], r[1]))
+            for i, a in enumerate(block):
+                for b in block[i + 1:i + 1 + NEIGHBOUR_WINDOW]:
+                    s = score(a, b)
+                    if s >= DUPLICATE_THRESHOLD:
+                        matches.append((s, a[0], b[0]))
+    return matches
+
+
+def split_work(blocks, parts):
+    # Deal blocks out by their number of comparisons so workers get
+    # roughly the same amount of work
+    chunks = [[] for _ in range(parts)]
+    loads = [0] * parts
+    for key, block in sorted(blocks, key=lambda item: len(item[1]), reverse=True):
+        n = min(len(block), MAX_BLOCK_SIZE)
+        i = loads.index(min(loads))
+        chunks[i].append((key, block))
+        loads[i] += n * n
+    return [chunk for chunk in chunks if chunk]
+
+
+def group_pairs(pairs):
+    """Union the matching pairs into groups of contact ids"""
+    parent = {}
+    
+    def find(x):
+        root = x
+        while parent.get(root, root) != root:
+            root = parent[root]
+        while x != root:
+            parent[x], x = root, parent[x]
+        return root
+    
+    for a, b in pairs:
+        parent.setdefault(a, a)
+        parent.setdefault(b, b)
+        root_a, root_b = find(a), find(b)
+        if root_a != root_b:
+            parent[max(root_a, root_b)] = min(root_a, root_b)
+    
+    groups = defaultdict(list)
+    for contact_id in parent:
+        groups[find(contact_id)].append(contact_id)
+    return sorted((sorted(group) for group in groups.values()), key=lambda g: (-len(g), g[0]))
+
+
+def find_duplicates(contacts, processes=None):
+    """Return groups of contact ids that look like the same person.
+    
+    Contacts are only compared within blocks that share a normalized
+    phone number, email address or phonetic name key. Large inputs are
+    scored on a process pool.
+    """
+    # Building millions of small tuples and lists would otherwise set off
+    # repeated full garbage collections over all of them
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        records = [prepare(contact) for contact in contacts]
+        blocks = build_blocks(records)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    
+    processes = processes or multiprocessing.cpu_count()
+    if processes > 1 and len(records) >= MULTIPROCESS_MIN_CONTACTS:
+        # spawn rather than fork: the GUI calls this from a worker thread
+        context = multiprocessing.get_context('spawn')
+        with context.Pool(processes) as pool:
+            results = pool.map(score_blocks, split_work(blocks, processes * 4))
+        matches = [match for result in results for match in result]
+    else:
+        matches = score_blocks(blocks)
+    
+    return group_pairs((a, b) for s, a, b in matches)
+
+
+def merge_contacts(contacts):
+    """Combine full contact records into the fields of the first one.
+    
+    The first contact's values win; its empty fields are filled from the
+    others in order.
+    """
+    merged = {}
+    for field in ('name', 'phone', 'email', 'address'):
+        merged[field] = next((c.get(field) for c in contacts if c.get(field)), '')
+    return merged
+
+
+def plan_merges(store, groups):
+    """Work out how to merge duplicate groups, changing nothing yet.
+    
+    Returns (oldest id, merged fields, other ids) for each group with at
+    least two contacts left. The full records are read in one go, so this
+    can run on a background thread.
+    """
+    groups = [sorted(group) for group in groups]
+    full = store.get_full_many(contact_id for group in groups for contact_id in group)
+    merges = []
+    for group in groups:
+        contacts = [full[contact_id] for contact_id in group if contact_id in full]
+        if len(contacts) >= 2:
+            merges.append((contacts[0]['id'], merge_contacts(contacts), [c['id'] for c in contacts[1:]]))
+    return merges
+
+
+def apply_merges(store, merges):
+    """Write planned merges with one update_many and one delete_many.
+    
+    Groups whose oldest contact was deleted since they were planned are
+    left alone. Returns how many groups were merged.
+    """
+    merges = [merge for merge in merges if store.get(merge[0]) is not None]
+    store.update_many([(keep, fields) for keep, fields, _ in merges])
+    store.delete_many([contact_id for _, _, others in merges for contact_id in others])
+    return len(merges)
+
+
+def merge_groups(store, groups):
+    """Merge each duplicate group into its oldest contact, delete the rest and return the count"""
+    return apply_merges(store, plan_merges(store, groups))
+
+
+def run_dedupe_benchmark(size, duplicate_rate=0.1):
+    rng = random.Random(7)
+    first_names = ['John', 'Jon', 'Jane', 'Bob', 'Robert', 'Alice', 'Maria', 'Mariah', 'Ahmed', 'Wei', 'Priya',
+                   'Olga', 'Carlos', 'Fatima', 'Liam', 'Noah', 'Emma', 'Sofia', 'Yuki', 'Kofi', 'Anna', 'Ivan']
+    last_names = ['Smith', 'Smyth', 'Johnson', 'Garcia', 'Chen', 'Patel', 'Kowalski', 'Okafor', 'Nguyen',
+                  'Muller', 'Rossi', 'Tanaka', 'Silva', 'Haddad', 'Novak', 'Jensen', 'Murphy', 'Cohen', 'Kim']
+    contacts = []
+    for contact_id in range(1, size + 1):
+        if contacts and rng.random() < duplicate_rate:
+            # A re-imported copy with a differently formatted phone number
+            original = rng.choice(contacts)
+            contacts.append(dict(original, id=contact_id, phone='+1 ' + original['phone']))
+            continue
+        first, last = rng.choice(first_names), rng.choice(last_names)
+        contacts.append({
+            'id': contact_id,
+            'name': f"{first} {last}",
+            'phone': f"({rng.randrange(200, 1000)}) {rng.randrange(1000):03d}-{rng.randrange(10000):04d}",
+            'email': f"{first.lower()}.{last.lower()}{rng.randrange(100000)}@example.com",
+        })
+    
+    start = time.perf_counter()
+    groups = find_duplicates(contacts)
+    elapsed = time.perf_counter() - start
+    print(f"{size} contacts: {len(groups)} duplicate groups "
+          f"({sum(len(g) for g in groups)} contacts) in {elapsed:.2f} s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find duplicate contacts")
+    commands = parser.add_subparsers(dest='command', required=True)
+    
+    find_parser = commands.add_parser('find', help="list duplicate groups in the contact database")
+    find_parser.add_argument('--db', help="SQLite database to use (default: contacts.db)")
+    find_parser.add_argument('--merge', action='store_true', help="merge every group into its oldest contact")
+    
+    benchmark_parser = commands.add_parser('benchmark', help="time duplicate detection on generated contacts")
+    benchmark_parser.add_argument('size', nargs='?', type=int, default=500000)
+    
+    args = parser.parse_args()
+    if args.command == 'benchmark':
+        run_dedupe_benchmark(args.size)
+        return
+    
+    from contact_store import ContactStore, SQLiteContactStorage
+    store = ContactStore(SQLiteContactStorage(args.db) if args.db else None)
+    store.load()
+    groups = find_duplicates(list(store.all_contacts))
+    for group in groups:
+        print(', '.join(f"{store.get(i)['id']}: {store.get(i)['name']}" for i in group))
+    if args.merge:
+        print(f"Merged {merge_groups(store, groups)} groups")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,921 @@
+import argparse
+import csv
+import os
+import random
+import re
+import sqlite3
+import sys
+import time
+from array import array
+from datetime import datetime
+
+from persistence import Journal, WriteBehindQueue
+
+# Contacts per storage transaction when importing
+IMPORT_BATCH_SIZE = 1000
+
+# Ids per query when reading many contacts, below SQLite's limit on
+# parameters in one statement
+READ_BATCH_SIZE = 500
+
+# Header names accepted for each contact field in imported CSV files
+CSV_FIELD_ALIASES = {
+    'name': ('name', 'full name', 'display name'),
+    'phone': ('phone', 'phone number', 'mobile', 'telephone', 'tel'),
+    'email': ('email', 'e-mail', 'email address'),
+    'address': ('address', 'street address', 'home address'),
+    'date_added': ('date_added', 'date added'),
+}
+CSV_EXPORT_FIELDS = ('name', 'phone', 'email', 'address', 'date_added')
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def parse_date_added(value):
+    try:
+        return datetime.strptime(value or '', "%Y-%m-%d %H:%M")
+    except ValueError:
+        return datetime.min
+
+
+def contact_sort_key(column):
+    """Key function that sorts contacts by a column the way a person expects"""
+    if column == 'phone':
+        # Compare phone numbers by their digits only
+        return lambda c: re.sub(r'\D', '', c.get('phone') or '')
+    if column == 'date_added':
+        return lambda c: parse_date_added(c.get('date_added'))
+    return lambda c: (c.get(column) or '').casefold()
+
+
+class ContactSearchIndex:
+    """Trigram index over contact name, phone and email for substring search"""
+    
+    def __init__(self):
+        # contact id -> (lowercased searchable text, contact)
+        self.entries = {}
+        # trigram -> array of contact ids whose text contains it
+        self.postings = {}
+        # Posting entries left behind by edits and deletes
+        self.stale = 0
+        self.size = 0
+    
+    @staticmethod
+    def searchable_text(contact):
+        # The fields are joined with a character that never appears in a query,
+        # so a match can never span two fields
+        return '\0'.join((contact.get('name') or '', contact.get('phone') or '',
+                           contact.get('email') or '')).lower()
+    
+    def build(self, contacts):
+        self.entries = {}
+        self.postings = {}
+        self.stale = 0
+        self.size = 0
+        for contact in contacts:
+            self.add(contact)
+    
+    def add(self, contact):
+        text = self.searchable_text(contact)
+        self.entries[contact['id']] = (text, contact)
+        self._post(contact['id'], trigrams(text))
+    
+    def update(self, contact):
+        old = self.entries.get(contact['id'])
+        if old is None:
+            self.add(contact)
+            return
+        
+        text = self.searchable_text(contact)
+        self.entries[contact['id']] = (text, contact)
+        if text != old[0]:
+            # Only post the new trigrams; the ones that disappeared stay behind
+            # and are filtered out when a query verifies its candidates
+            old_grams = trigrams(old[0])
+            new_grams = trigrams(text)
+            self._post(contact['id'], new_grams - old_grams)
+            self.stale += len(old_grams - new_grams)
+            self._compact_if_needed()
+    
+    def remove(self, contact_id):
+        old = self.entries.pop(contact_id, None)
+        if old is not None:
+            self.stale += len(trigrams(old[0]))
+            self._compact_if_needed()
+    
+    def search(self, query, candidates=None, cancelled=None):
+        """Return the contacts whose name, phone or email contain query.
+        
+        candidates may be a previous result that is known to contain every
+        match, e.g. the results for a shorter prefix of the same query.
+        cancelled is polled while searching; once it returns True the search
+        stops and None is returned.
+        """
+        query = query.lower()
+        entries = self.entries
+        
+        if len(query) >= 3:
+            # Every match contains all of the query's trigrams, so the shortest
+            # posting list is enough to find them
+            posting = min((self.postings.get(gram, ()) for gram in trigrams(query)), key=len)
+            if candidates is None or len(posting) < len(candidates):
+                candidates = [entries[i][1] for i in sorted(set(posting)) if i in entries]
+        elif candidates is None:
+            # list() copies the entries in one step, so the index can be
+            # updated while a background search is running
+            candidates = [contact for text, contact in list(entries.values())]
+        
+        results = []
+        for start in range(0, len(candidates), 4096):
+            if cancelled is not None and cancelled():
+                return None
+            for contact in candidates[start:start + 4096]:
+                entry = entries.get(contact['id'])
+                if entry is not None and query in entry[0]:
+                    results.append(contact)
+        return results
+    
+    def _post(self, contact_id, grams):
+        postings = self.postings
+        for gram in grams:
+            posting = postings.get(gram)
+            if posting is None:
+                if '\0' in gram:
+                    continue
+                posting = postings[gram] = array('i')
+            posting.append(contact_id)
+        self.size += len(grams)
+    
+    def _compact_if_needed(self):
+        # Rebuild once more than half of the posting entries are stale
+        if self.stale > 1000 and self.stale * 2 > self.size:
+            self.build([contact for text, contact in self.entries.values()])
+
+
+def iter_csv_contacts(path):
+    """Yield contacts from a CSV file one row at a time"""
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        reader = csv.reader(f)
+        header = [h.strip().lower() for h in next(reader, [])]
+        
+        # Map each contact field to the first column that matches an alias
+        columns = {}
+        for field, aliases in CSV_FIELD_ALIASES.items():
+            for alias in aliases:
+                if alias in header:
+                    columns[field] = header.index(alias)
+                    break
+        
+        for row in reader:
+            yield {field: row[i].strip() if i < len(row) else '' for field, i in columns.items()}
+
+
+def write_csv_contacts(f, contacts, progress=None):
+    writer = csv.writer(f)
+    writer.writerow(CSV_EXPORT_FIELDS)
+    count = 0
+    for contact in contacts:
+        writer.writerow([contact.get(field) or '' for field in CSV_EXPORT_FIELDS])
+        count += 1
+        if progress and count % IMPORT_BATCH_SIZE == 0:
+            progress(count)
+    return count
+
+
+def vcard_unescape(value):
+    return re.sub(r'\\([\\,;nN])', lambda m: '\n' if m.group(1) in 'nN' else m.group(1), value)
+
+
+def vcard_escape(value):
+    return (value.replace('\\', '\\\\').replace(',', '\\,').replace(';', '\\;')
+            .replace('\r\n', '\\n').replace('\n', '\\n'))
+
+
+def unfold_vcard_lines(f):
+    # Lines starting with a space or tab continue the previous line
+    current = None
+    for line in f:
+        line = line.rstrip('\r\n')
+        if line[:1] in (' ', '\t') and current is not None:
+            current += line[1:]
+            continue
+        if current is not None:
+            yield current
+        current = line
+    if current is not None:
+        yield current
+
+
+def contact_from_vcard(card):
+    name = vcard_unescape(card.get('FN', '')).strip()
+    if not name and 'N' in card:
+        # N is family;given;additional;prefix;suffix
+        parts = [vcard_unescape(p) for p in re.split(r'(?<!\\);', card['N'])]
+        name = ' '.join(p for p in parts[1:2] + parts[:1] if p).strip()
+    
+    phone = card.get('TEL', '')
+    if phone.lower().startswith('tel:'):
+        phone = phone[4:]
+    
+    # ADR is po box;extended;street;locality;region;postal code;country
+    address_parts = [vcard_unescape(p).strip() for p in re.split(r'(?<!\\);', card.get('ADR', ''))]
+    
+    return {
+        'name': name,
+        'phone': vcard_unescape(phone).strip(),
+        'email': vcard_unescape(card.get('EMAIL', '')).strip(),
+        'address': ', '.join(p for p in address_parts if p),
+    }
+
+
+def iter_vcard_contacts(path):
+    """Yield contacts from a vCard 3.0 or 4.0 file one card at a time"""
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        card = None
+        for line in unfold_vcard_lines(f):
+            name, colon, value = line.partition(':')
+            if not colon:
+                continue
+            
+            # Drop parameters (TEL;TYPE=cell) and groups (item1.EMAIL)
+            prop = name.split(';')[0].split('.')[-1].upper()
+            if prop == 'BEGIN' and value.strip().upper() == 'VCARD':
+                card = {}
+            elif prop == 'END' and card is not None:
+                yield contact_from_vcard(card)
+                card = None
+            elif card is not None:
+                # Keep the first value of repeated properties
+                card.setdefault(prop, value)
+
+
+def write_vcard_contacts(f, contacts, version='3.0', progress=None):
+    def write_line(line):
+        # Fold lines longer than 75 characters
+        while len(line) > 75:
+            f.write(line[:75] + '\r\n')
+            line = ' ' + line[75:]
+        f.write(line + '\r\n')
+    
+    tel = 'TEL;VALUE=text' if version == '4.0' else 'TEL;TYPE=VOICE'
+    count = 0
+    for contact in contacts:
+        name = contact.get('name') or ''
+        given, _, family = name.rpartition(' ')
+        write_line('BEGIN:VCARD')
+        write_line(f'VERSION:{version}')
+        write_line(f'FN:{vcard_escape(name)}')
+        write_line(f'N:{vcard_escape(family)};{vcard_escape(given)};;;')
+        write_line(f'{tel}:{vcard_escape(contact.get("phone") or "")}')
+        if contact.get('email'):
+            write_line(f'EMAIL:{vcard_escape(contact["email"])}')
+        if contact.get('address'):
+            write_line(f'ADR:;;{vcard_escape(contact["address"])};;;;')
+        write_line('END:VCARD')
+        count += 1
+        if progress and count % IMPORT_BATCH_SIZE == 0:
+            progress(count)
+    return count
+
+
+def iter_contacts_file(path):
+    if path.lower().endswith(('.vcf', '.vcard')):
+        return iter_vcard_contacts(path)
+    return iter_csv_contacts(path)
+
+
+def write_contacts_file(path, contacts, vcard_version='3.0', progress=None):
+    """Stream contacts to a CSV or vCard file and return how many were written"""
+    if path.lower().endswith(('.vcf', '.vcard')):
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            return write_vcard_contacts(f, contacts, vcard_version, progress)
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        return write_csv_contacts(f, contacts, progress)
+
+
+class JSONContactStorage:
+    """Keeps contacts in a JSON snapshot plus an append-only change journal"""
+    
+    def __init__(self, path='contacts.json'):
+        self.path = path
+        self.journal = Journal(path)
+    
+    def load(self):
+        return list(self.journal.load().values())
+    
+    def get(self, contact_id):
+        return self.journal.records.get(contact_id)
+    
+    def get_many(self, contact_ids):
+        records = self.journal.records
+        return {i: records[i] for i in contact_ids if i in records}
+    
+    def upsert(self, contact):
+        self.upsert_many([contact])
+    
+    def upsert_many(self, contacts):
+        # Contacts loaded for the list may lack fields the stored one has
+        self.journal.put_many([dict(self.journal.records.get(c['id'], {}), **c) for c in contacts])
+    
+    def iter_all(self):
+        return iter(list(self.journal.records.values()))
+    
+    def delete(self, contact_id):
+        self.delete_many([contact_id])
+    
+    def delete_many(self, contact_ids):
+        self.journal.delete_many(contact_ids)
+    
+    def replace_all(self, contacts):
+        self.journal.replace_all(contacts)
+    
+    def next_id(self):
+        return max(self.journal.records, default=0) + 1
+    
+    def close(self):
+        self.journal.close()
+
+
+class SQLiteContactStorage:
+    """Keeps contacts in a SQLite database with one row per contact"""
+    
+    # Columns loaded at startup. Addresses stay in the database until a
+    # contact is opened.
+    LIST_COLUMNS = ('id', 'name', 'phone', 'email', 'date_added')
+    COLUMNS = LIST_COLUMNS + ('address',)
+    
+    def __init__(self, path='contacts.db'):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        with self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS contacts (
+                    id INTEGER PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    phone TEXT NOT NULL,
+                    email TEXT,
+                    address TEXT,
+                    date_added TEXT
+                )""")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS contacts_name ON contacts (name COLLATE NOCASE)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS contacts_phone ON contacts (phone)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS contacts_email ON contacts (email COLLATE NOCASE)")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER)")
+    
+    def load(self):
+        # Rows are streamed from the cursor one at a time
+        cursor = self.conn.execute(f"SELECT {', '.join(self.LIST_COLUMNS)} FROM contacts ORDER BY id")
+        for row in cursor:
+            yield dict(zip(self.LIST_COLUMNS, row))
+    
+    def get(self, contact_id):
+        row = self.conn.execute(f"SELECT {', '.join(self.COLUMNS)} FROM contacts WHERE id = ?",
+                                (contact_id,)).fetchone()
+        return dict(zip(self.COLUMNS, row)) if row else None
+    
+    def get_many(self, contact_ids):
+        """Read full contacts by id through a separate connection, as {id: contact}.
+        
+        This is safe to call from a background thread.
+        """
+        contacts = {}
+        conn = sqlite3.connect(self.path)
+        try:
+            for batch in batched(contact_ids, READ_BATCH_SIZE):
+                rows = conn.execute(f"SELECT {', '.join(self.COLUMNS)} FROM contacts "
+                                    f"WHERE id IN ({', '.join('?' * len(batch))})", batch)
+                for row in rows:
+                    contacts[row[0]] = dict(zip(self.COLUMNS, row))
+        finally:
+            conn.close()
+        return contacts
+    
+    def upsert(self, contact):
+        self.upsert_many([contact])
+    
+    def upsert_many(self, contacts):
+        with self.conn:
+            for contact in contacts:
+                self._upsert(contact)
+    
+    def iter_all(self):
+        """Stream every full contact through a separate connection.
+        
+        This is safe to call from a background thread.
+        """
+        conn = sqlite3.connect(self.path)
+        try:
+            for row in conn.execute(f"SELECT {', '.join(self.COLUMNS)} FROM contacts ORDER BY id"):
+                yield dict(zip(self.COLUMNS, row))
+        finally:
+            conn.close()
+    
+    def delete(self, contact_id):
+        self.delete_many([contact_id])
+    
+    def delete_many(self, contact_ids):
+        with self.conn:
+            self.conn.executemany("DELETE FROM contacts WHERE id = ?", [(i,) for i in contact_ids])
+    
+    def replace_all(self, contacts):
+        with self.conn:
+            self.conn.execute("DELETE FROM contacts")
+            for contact in contacts:
+                self._upsert(contact)
+    
+    def next_id(self):
+        # The highest id ever handed out is kept in meta, so ids of deleted
+        # contacts are never reused
+        stored = self.conn.execute("SELECT value FROM meta WHERE key = 'next_id'").fetchone()
+        highest = self.conn.execute("SELECT MAX(id) FROM contacts").fetchone()[0]
+        return max(stored[0] if stored else 1, (highest or 0) + 1)
+    
+    def is_empty(self):
+        return self.conn.execute("SELECT 1 FROM contacts LIMIT 1").fetchone() is None
+    
+    def close(self):
+        self.conn.close()
+    
+    def migrate_from_json(self, json_path='contacts.json'):
+        """Import an old contacts.json once and keep it as a .migrated backup.
+        
+        Returns (imported, skipped). Rows that can't be stored are skipped
+        rather than stopping the migration, and stay in the backup.
+        """
+        old = JSONContactStorage(json_path)
+        if not os.path.exists(json_path) and not os.path.exists(old.journal.journal_path):
+            return 0, 0
+        if not self.is_empty():
+            return 0, 0
+        
+        # Replays the journal the JSON storage may have left next to it
+        contacts = old.load()
+        old.close()
+        valid = [contact for contact in contacts if self._is_storable(contact)]
+        with self.conn:
+            for contact in valid:
+                self._upsert(contact)
+        for path in (json_path, old.journal.journal_path):
+            if os.path.exists(path):
+                os.replace(path, path + '.migrated')
+        return len(valid), len(contacts) - len(valid) + old.journal.skipped
+    
+    def _is_storable(self, contact):
+        # An integer id, a name and a phone number, and text or nothing in
+        # the other columns
+        if type(contact.get('id')) is not int:
+            return False
+        if any(not isinstance(contact.get(c) or '', str) for c in self.COLUMNS if c != 'id'):
+            return False
+        return bool((contact.get('name') or '').strip() and (contact.get('phone') or '').strip())
+    
+    def _upsert(self, contact):
+        # Contacts loaded for the list have no address; leave the stored
+        # one alone unless the contact carries its own
+        columns = [c for c in self.COLUMNS if c in contact]
+        updates = ', '.join(f"{c} = excluded.{c}" for c in columns if c != 'id')
+        self.conn.execute(
+            f"INSERT INTO contacts ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+            f"ON CONFLICT (id) DO UPDATE SET {updates}",
+            [contact[c] for c in columns])
+        self.conn.execute(
+            "INSERT INTO meta (key, value) VALUES ('next_id', ?) "
+            "ON CONFLICT (key) DO UPDATE SET value = MAX(value, excluded.value)",
+            (contact['id'] + 1,))
+
+
+class WriteBehindContactStorage:
+    """Contact storage whose writes are queued and saved on a worker thread.
+    
+    Reads wait for the queued writes first, so they see every change.
+    """
+    
+    def __init__(self, storage):
+        self.storage = storage
+        self.path = storage.path
+        if isinstance(storage, SQLiteContactStorage):
+            # The worker writes through its own connection
+            self.writes = WriteBehindQueue(lambda: SQLiteContactStorage(storage.path))
+        else:
+            # The journal storage is safe to write from another thread
+            self.writes = WriteBehindQueue(lambda: storage)
+    
+    def load(self):
+        self.writes.flush()
+        return self.storage.load()
+    
+    def get(self, contact_id):
+        self.writes.flush()
+        return self.storage.get(contact_id)
+    
+    def get_many(self, contact_ids):
+        self.writes.flush()
+        return self.storage.get_many(contact_ids)
+    
+    def upsert(self, contact):
+        self.upsert_many([contact])
+    
+    def upsert_many(self, contacts):
+        self.writes.upsert_many(contacts)
+    
+    def iter_all(self):
+        self.writes.flush()
+        return self.storage.iter_all()
+    
+    def delete(self, contact_id):
+        self.delete_many([contact_id])
+    
+    def delete_many(self, contact_ids):
+        self.writes.delete_many(contact_ids)
+    
+    def replace_all(self, contacts):
+        self.writes.replace_all(contacts)
+    
+    def next_id(self):
+        self.writes.flush()
+        return self.storage.next_id()
+    
+    def close(self):
+        self.writes.close()
+        self.storage.close()
+
+
+class ContactListView:
+    """Read-only sequence over the contacts of an id -> contact dict.
+    
+    Positions are looked up in a list of the ids in dict order, so the
+    virtualized list costs the same to redraw at the end as at the start.
+    The store calls appended() after adding contacts and reset() after
+    removing any; the list is then rebuilt on the next lookup.
+    """
+    
+    def __init__(self, contacts):
+        self.contacts = contacts
+        self.ids = None
+    
+    def appended(self, contact_ids):
+        if self.ids is not None:
+            self.ids.extend(contact_ids)
+    
+    def reset(self):
+        self.ids = None
+    
+    def __len__(self):
+        return len(self.contacts)
+    
+    def __iter__(self):
+        return iter(self.contacts.values())
+    
+    def __getitem__(self, index):
+        if self.ids is None:
+            self.ids = list(self.contacts)
+        if isinstance(index, slice):
+            return [self.contacts[contact_id] for contact_id in self.ids[index]]
+        
+        if not -len(self.ids) <= index < len(self.ids):
+            raise IndexError("contact index out of range")
+        return self.contacts[self.ids[index]]
+
+
+def open_contact_storage():
+    """Open the default SQLite storage, importing contacts.json the first time.
+    
+    Returns the storage and how many contacts.json rows were skipped.
+    """
+    storage = SQLiteContactStorage('contacts.db')
+    migrated, skipped = storage.migrate_from_json('contacts.json')
+    if migrated or skipped:
+        print(f"Migrated {migrated} contacts from contacts.json, skipped {skipped}")  # Debug print
+    return storage, skipped
+
+
+def batched(records, size):
+    """Yield lists of up to size records"""
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class ContactStore:
+    """Contact validation, id allocation, search, sorting and persistence.
+    
+    Nothing here depends on Tkinter, so the store can be used from scripts
+    and benchmarks. Call load() before using it. Every change is written to
+    storage first, so a failed write leaves the store unchanged, unless
+    write_in_background() has been called.
+    """
+    
+    def __init__(self, storage=None):
+        self.storage = storage
+        
+        # Contacts keyed by id (in insertion order), the same contacts as a
+        # sequence, and the next id to hand out
+        self.contacts = {}
+        self.all_contacts = ContactListView(self.contacts)
+        self.next_id = 1
+        # Rows of contacts.json the first load couldn't migrate
+        self.migration_skipped = 0
+        
+        self.search_index = ContactSearchIndex()
+        
+        # Sorted contacts and the rank of each contact id, per column.
+        # Cleared on any change.
+        self.sort_cache = {}
+    
+    def __len__(self):
+        return len(self.contacts)
+    
+    def load(self):
+        if self.storage is None:
+            self.storage, self.migration_skipped = open_contact_storage()
+        self._set_contacts(self.storage.load())
+        self.next_id = self.storage.next_id()
+    
+    def close(self):
+        if self.storage is not None:
+            self.storage.close()
+    
+    def write_in_background(self):
+        """Queue changes for a worker thread to save and return its queue.
+        
+        Changes no longer wait for the write, so a failed write is only
+        reported on the queue's written queue.
+        """
+        if not isinstance(self.storage, WriteBehindContactStorage):
+            self.storage = WriteBehindContactStorage(self.storage)
+        return self.storage.writes
+    
+    def get(self, contact_id):
+        return self.contacts.get(contact_id)
+    
+    def get_full(self, contact_id):
+        """Return the contact with every stored field, including the address"""
+        return self.storage.get(contact_id) or self.contacts.get(contact_id)
+    
+    def get_full_many(self, contact_ids):
+        """Return {id: contact} with every stored field, read from storage in one go.
+        
+        Like export_file, this can run on a background thread.
+        """
+        contact_ids = list(contact_ids)
+        contacts = self.storage.get_many(contact_ids)
+        for contact_id in contact_ids:
+            if contact_id not in contacts and contact_id in self.contacts:
+                contacts[contact_id] = self.contacts[contact_id]
+        return contacts
+    
+    @staticmethod
+    def validate(record):
+        """Return the cleaned-up fields of record, or raise ValueError"""
+        fields = {key: (record.get(key) or '').strip()
+                  for key in ('name', 'phone', 'email', 'address') if key in record}
+        if not fields.get('name') or not fields.get('phone'):
+            raise ValueError("Name and phone number are required!")
+        return fields
+    
+    def add(self, name, phone, email='', address=''):
+        return self.add_many([{'name': name, 'phone': phone, 'email': email, 'address': address}])[0]
+    
+    def add_many(self, records, skip_invalid=False):
+        """Add records in one storage transaction and return the new contacts.
+        
+        Invalid records raise ValueError, or are left out if skip_invalid
+        is set.
+        """
+        contacts = []
+        next_id = self.next_id
+        for record in records:
+            try:
+                fields = self.validate(record)
+            except ValueError:
+                if skip_invalid:
+                    continue
+                raise
+            
+            contacts.append({
+                'id': next_id,
+                'name': fields['name'],
+                'phone': fields['phone'],
+                'email': fields.get('email', ''),
+                'address': fields.get('address', ''),
+                'date_added': record.get('date_added') or datetime.now().strftime("%Y-%m-%d %H:%M")
+            })
+            next_id += 1
+        
+        self.storage.upsert_many(contacts)
+        self.next_id = next_id
+        for contact in contacts:
+            self.contacts[contact['id']] = contact
+            self.search_index.add(contact)
+        self.all_contacts.appended(contact['id'] for contact in contacts)
+        self.sort_cache.clear()
+        return contacts
+    
+    def update(self, contact_id, **fields):
+        return self.update_many([(contact_id, fields)])[0]
+    
+    def update_many(self, changes):
+        """Apply (contact_id, fields) pairs in one storage transaction"""
+        updates = []
+        for contact_id, fields in changes:
+            contact = self.contacts.get(contact_id)
+            if contact is None:
+                raise KeyError(f"No contact with id {contact_id}")
+            updates.append((contact, self.validate(dict(contact, **fields))))
+        
+        self.storage.upsert_many([dict(contact, **fields) for contact, fields in updates])
+        for contact, fields in updates:
+            contact.update(fields)
+            self.search_index.update(contact)
+        self.sort_cache.clear()
+        return [contact for contact, fields in updates]
+    
+    def delete_many(self, contact_ids):
+        """Delete contacts by id in one storage transaction and return the count"""
+        contact_ids = [contact_id for contact_id in contact_ids if contact_id in self.contacts]
+        self.storage.delete_many(contact_ids)
+        for contact_id in contact_ids:
+            del self.contacts[contact_id]
+            self.search_index.remove(contact_id)
+        if contact_ids:
+            self.all_contacts.reset()
+        self.sort_cache.clear()
+        return len(contact_ids)
+    
+    def delete_where(self, predicate):
+        """Delete every contact for which predicate(contact) is true"""
+        return self.delete_many([c['id'] for c in self.all_contacts if predicate(c)])
+    
+    def replace_all(self, contacts):
+        """Replace every contact, keeping the ids the given contacts carry"""
+        contacts = list(contacts)
+        self.storage.replace_all(contacts)
+        self._set_contacts(contacts)
+        self.next_id = max([self.next_id] + [c['id'] + 1 for c in contacts])
+    
+    def search(self, query, limit=None, offset=0, candidates=None, cancelled=None):
+        """Return the contacts whose name, phone or email contain query.
+        
+        An empty query returns all_contacts. candidates and cancelled are
+        passed on to ContactSearchIndex.search; a cancelled search returns
+        None.
+        """
+        if query:
+            results = self.search_index.search(query, candidates, cancelled)
+            if results is None:
+                return None
+        else:
+            results = self.all_contacts
+        
+        if offset or limit is not None:
+            return results[offset:None if limit is None else offset + limit]
+        return results
+    
+    def sort(self, contacts, column, reverse=False):
+        """Return contacts (all_contacts or a search result) sorted by column"""
+        # Rank every contact once per column with a typed key; later sorts
+        # in either direction just compare the cached ranks
+        if column not in self.sort_cache:
+            ordered = sorted(self.all_contacts, key=contact_sort_key(column))
+            self.sort_cache[column] = (ordered, {c['id']: i for i, c in enumerate(ordered)})
+        ordered, rank = self.sort_cache[column]
+        
+        if contacts is self.all_contacts:
+            return ordered[::-1] if reverse else ordered
+        return sorted(contacts, key=lambda c: rank[c['id']], reverse=reverse)
+    
+    def import_file(self, path, progress=None):
+        """Import a CSV or vCard file in batches and return (imported, skipped)"""
+        imported = skipped = 0
+        for batch in batched(iter_contacts_file(path), IMPORT_BATCH_SIZE):
+            added = self.add_many(batch, skip_invalid=True)
+            imported += len(added)
+            skipped += len(batch) - len(added)
+            if progress:
+                progress(imported)
+        return imported, skipped
+    
+    def export_file(self, path, vcard_version='3.0', progress=None):
+        """Write every contact to a CSV or vCard file and return the count.
+        
+        Contacts are streamed from storage, so this can run on a
+        background thread.
+        """
+        return write_contacts_file(path, self.storage.iter_all(), vcard_version, progress)
+    
+    def _set_contacts(self, contacts):
+        # Refill the dict in place so all_contacts keeps viewing it
+        self.contacts.clear()
+        self.contacts.update((c['id'], c) for c in contacts)
+        self.all_contacts.reset()
+        self.search_index.build(self.all_contacts)
+        self.sort_cache.clear()
+
+
+def run_search_benchmark(sizes):
+    """Compare per-keystroke search latency of the trigram index and a linear scan"""
+    rng = random.Random(42)
+    first_names = ['John', 'Jane', 'Bob', 'Alice', 'Maria', 'Ahmed', 'Wei', 'Priya', 'Olga', 'Carlos',
+                   'Fatima', 'Liam', 'Noah', 'Emma', 'Sofia', 'Yuki', 'Kofi', 'Anna', 'Ivan', 'Leila']
+    last_names = ['Smith', 'Johnson', 'Garcia', 'Chen', 'Patel', 'Kowalski', 'Okafor', 'Nguyen', 'Muller',
+                  'Rossi', 'Tanaka', 'Silva', 'Haddad', 'Novak', 'Jensen', 'Murphy', 'Cohen', 'Kim']
+    query = 'johnson'
+    
+    for size in sizes:
+        contacts = []
+        for contact_id in range(1, size + 1):
+            first, last = rng.choice(first_names), rng.choice(last_names)
+            contacts.append({
+                'id': contact_id,
+                'name': f"{first} {last}",
+                'phone': f"555-{rng.randrange(10000):04d}-{rng.randrange(10000):04d}",
+                'email': f"{first.lower()}.{last.lower()}{rng.randrange(1000)}@example.com",
+            })
+        
+        start = time.perf_counter()
+        index = ContactSearchIndex()
+        index.build(contacts)
+        build_time = time.perf_counter() - start
+        
+        # Type the query one character at a time, the way the search box does
+        scan_times, index_times = [], []
+        results = None
+        for length in range(1, len(query) + 1):
+            term = query[:length]
+            
+            start = time.perf_counter()
+            expected = [
+                c for c in contacts
+                if term in c['name'].lower()
+                or term in c['phone'].lower()
+                or (c['email'] and term in c['email'].lower())
+            ]
+            scan_times.append(time.perf_counter() - start)
+            
+            start = time.perf_counter()
+            results = index.search(term, results)
+            index_times.append(time.perf_counter() - start)
+            
+            assert len(results) == len(expected)
+        
+        # Queries shorter than a trigram still have to check every contact
+        scan_ms = 1000 * sum(scan_times) / len(scan_times)
+        index_ms = 1000 * sum(index_times) / len(index_times)
+        scan_long_ms = 1000 * sum(scan_times[2:]) / len(scan_times[2:])
+        index_long_ms = 1000 * sum(index_times[2:]) / len(index_times[2:])
+        print(f"{size:>9} contacts | build {build_time:6.2f} s | "
+              f"all keys: scan {scan_ms:8.2f} ms, index {index_ms:8.2f} ms | "
+              f"3+ chars: scan {scan_long_ms:8.2f} ms, index {index_long_ms:8.3f} ms")
+        contacts = index = results = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage contacts without the GUI")
+    parser.add_argument('--db', help="SQLite database to use (default: contacts.db)")
+    commands = parser.add_subparsers(dest='command', required=True)
+    
+    import_parser = commands.add_parser('import', help="import contacts from a CSV or vCard file")
+    import_parser.add_argument('path')
+    
+    export_parser = commands.add_parser('export', help="export contacts to a CSV or vCard file")
+    export_parser.add_argument('path')
+    export_parser.add_argument('--vcard-version', choices=('3.0', '4.0'), default='3.0')
+    
+    search_parser = commands.add_parser('search', help="print contacts matching a query")
+    search_parser.add_argument('query')
+    search_parser.add_argument('--limit', type=int, default=20)
+    search_parser.add_argument('--offset', type=int, default=0)
+    
+    benchmark_parser = commands.add_parser('benchmark', help="time the search index against a linear scan")
+    benchmark_parser.add_argument('sizes', nargs='*', type=int, default=[10000, 100000, 1000000])
+    
+    args = parser.parse_args()
+    if args.command == 'benchmark':
+        run_search_benchmark(args.sizes)
+        return
+    
+    store = ContactStore(SQLiteContactStorage(args.db) if args.db else None)
+    store.load()
+    progress = lambda count: print(f"\r{count} contacts", end='', file=sys.stderr)
+    
+    if args.command == 'import':
+        imported, skipped = store.import_file(args.path, progress)
+        print(f"\rImported {imported} contacts, skipped {skipped}", file=sys.stderr)
+    elif args.command == 'export':
+        count = store.export_file(args.path, args.vcard_version, progress)
+        print(f"\rExported {count} contacts", file=sys.stderr)
+    elif args.command == 'search':
+        for contact in store.search(args.query, args.limit, args.offset):
+            print(f"{contact['id']}\t{contact['name']}\t{contact['phone']}\t{contact.get('email') or ''}")
+
+if __name__ == "__main__":
+    main()
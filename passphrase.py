@@ -0,0 +1,238 @@
+import argparse
+import math
+import mmap
+import os
+import struct
+import sys
+import time
+
+from password_engine import CHARACTER_CLASSES, class_alphabets
+
+# Compiled wordlist layout: magic, version and word count, then count + 1
+# little-endian offsets into the UTF-8 word bytes that follow them. Word i
+# is data[offsets[i]:offsets[i + 1]], so a lookup reads two offsets.
+WORDLIST_MAGIC = b'PWWL'
+WORDLIST_VERSION = 1
+WORDLIST_HEADER = struct.Struct('<4sII')
+WORDLIST_OFFSETS = struct.Struct('<II')
+
+# Where the GUI looks for a compiled wordlist, and the text list it
+# compiles one from when there is none yet
+DEFAULT_WORDLIST = 'wordlist.bin'
+SYSTEM_WORDLIST_SOURCE = '/usr/share/dict/words'
+
+# Words kept when compiling, so a passphrase stays easy to type
+MIN_WORD_LENGTH = 3
+MAX_WORD_LENGTH = 10
+
+# Separator used when special characters are turned off
+PLAIN_SEPARATOR = ' '
+
+
+class Wordlist:
+    """A compiled wordlist, memory-mapped so opening it reads nothing up front"""
+    
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < WORDLIST_HEADER.size:
+                raise ValueError(f"{path} is not a compiled wordlist")
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, count = WORDLIST_HEADER.unpack_from(self.map)
+        if magic != WORDLIST_MAGIC or version != WORDLIST_VERSION:
+            self.map.close()
+            raise ValueError(f"{path} is not a compiled wordlist")
+        self.count = count
+        self.data_start = WORDLIST_HEADER.size + 4 * (count + 1)
+        # A cut-off or corrupt file would otherwise fail in struct on the
+        # first lookup past its end
+        if size < self.data_start or self.data_start + self._offset(count) != size:
+            self.map.close()
+            raise ValueError(f"{path} is damaged; compile it again")
+    
+    def __len__(self):
+        return self.count
+    
+    def __getitem__(self, i):
+        if not 0 <= i < self.count:
+            raise IndexError("wordlist index out of range")
+        start, end = WORDLIST_OFFSETS.unpack_from(self.map, WORDLIST_HEADER.size + 4 * i)
+        return self.map[self.data_start + start:self.data_start + end].decode('utf-8')
+    
+    def _offset(self, i):
+        return struct.unpack_from('<I', self.map, WORDLIST_HEADER.size + 4 * i)[0]
+    
+    def close(self):
+        self.map.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_words(source, min_length=MIN_WORD_LENGTH, max_length=MAX_WORD_LENGTH):
+    """Words of a text list, one per line, lowercased and without duplicates.
+    
+    Only the last field of a line is used, so diceware lists with their
+    dice numbers ("11111 abacus") work as they are.
+    """
+    words = {}
+    with open(source, 'r', encoding='utf-8') as f:
+        for line in f:
+            fields = line.split()
+            if not fields:
+                continue
+            word = fields[-1].lower()
+            if word.isalpha() and min_length <= len(word) <= max_length:
+                words[word] = None
+    return list(words)
+
+
+def compile_wordlist(source, output, min_length=MIN_WORD_LENGTH, max_length=MAX_WORD_LENGTH):
+    """Compile the text wordlist source into output and return the word count"""
+    words = [w.encode('utf-8') for w in read_words(source, min_length, max_length)]
+    if not words:
+        raise ValueError(f"No usable words in {source}")
+    
+    offsets = [0]
+    for word in words:
+        offsets.append(offsets[-1] + len(word))
+    temp_path = output + '.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(WORDLIST_HEADER.pack(WORDLIST_MAGIC, WORDLIST_VERSION, len(words)))
+        f.write(struct.pack(f'<{len(offsets)}I', *offsets))
+        f.write(b''.join(words))
+    os.replace(temp_path, output)
+    return len(words)
+
+
+def open_default_wordlist():
+    """The GUI's wordlist, compiled from the system word list the first time"""
+    if not os.path.exists(DEFAULT_WORDLIST):
+        if not os.path.exists(SYSTEM_WORDLIST_SOURCE):
+            raise ValueError(f"No wordlist found. Compile one with: "
+                             f"python passphrase.py compile words.txt {DEFAULT_WORDLIST}")
+        compile_wordlist(SYSTEM_WORDLIST_SOURCE, DEFAULT_WORDLIST)
+    return Wordlist(DEFAULT_WORDLIST)
+
+
+def random_indexes(n, count):
+    """count numbers drawn uniformly from range(n) with os.urandom.
+    
+    Each number comes from four random bytes. Values from the largest
+    multiple of n below 2**32 up are thrown away, so taking the rest
+    modulo n favours no index.
+    """
+    limit = 2 ** 32 - 2 ** 32 % n
+    indexes = []
+    while len(indexes) < count:
+        needed = count - len(indexes) + 2
+        values = struct.unpack(f'<{needed}I', os.urandom(4 * needed))
+        indexes += [v % n for v in values if v < limit]
+    return indexes[:count]
+
+
+def generate_passphrase(wordlist, words=6, classes=tuple(CHARACTER_CLASSES)):
+    """Return a passphrase of words picked from wordlist.
+    
+    The complexity options shape it: uppercase capitalizes the words (or
+    upper-cases them without lowercase), digits add one digit after a
+    random word and special characters pick the separator.
+    """
+    class_alphabets(classes)
+    if words < 1:
+        raise ValueError("A passphrase needs at least one word!")
+    if 'upper' not in classes and 'lower' not in classes:
+        raise ValueError("A passphrase needs uppercase or lowercase letters!")
+    chosen = [wordlist[i] for i in random_indexes(len(wordlist), words)]
+    if 'upper' in classes:
+        chosen = [w.capitalize() if 'lower' in classes else w.upper() for w in chosen]
+    if 'digits' in classes:
+        position, digit = random_indexes(words, 1)[0], random_indexes(10, 1)[0]
+        chosen[position] += str(digit)
+    separator = PLAIN_SEPARATOR
+    if 'special' in classes:
+        specials = CHARACTER_CLASSES['special']
+        separator = specials[random_indexes(len(specials), 1)[0]]
+    return separator.join(chosen)
+
+
+def passphrase_guesses(wordlist_size, words, classes):
+    """How many passphrases generate_passphrase can make with these settings"""
+    guesses = float(wordlist_size) ** words
+    if 'digits' in classes:
+        guesses *= words * 10
+    if 'special' in classes:
+        guesses *= len(CHARACTER_CLASSES['special'])
+    return guesses
+
+
+def run_passphrase_benchmark(wordlist_path, n):
+    source = wordlist_path + '.txt'
+    with Wordlist(wordlist_path) as wordlist:
+        with open(source, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(wordlist[i] for i in range(len(wordlist))))
+    
+    start = time.perf_counter()
+    read_words(source)
+    parse_time = time.perf_counter() - start
+    os.remove(source)
+    
+    start = time.perf_counter()
+    wordlist = Wordlist(wordlist_path)
+    open_time = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    for _ in range(n):
+        generate_passphrase(wordlist)
+    rate = n / (time.perf_counter() - start)
+    bits = math.log2(passphrase_guesses(len(wordlist), 6, tuple(CHARACTER_CLASSES)))
+    
+    print(f"{len(wordlist):,} words:")
+    print(f"  parse text list: {parse_time * 1000:.1f} ms")
+    print(f"  open compiled:   {open_time * 1000:.3f} ms")
+    print(f"  {rate:,.0f} six-word passphrases/s, {bits:.0f} bits each")
+    wordlist.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile wordlists and generate passphrases")
+    commands = parser.add_subparsers(dest='command', required=True)
+    
+    compile_parser = commands.add_parser('compile', help="compile a text wordlist, one word per line")
+    compile_parser.add_argument('source')
+    compile_parser.add_argument('output', nargs='?', default=DEFAULT_WORDLIST)
+    compile_parser.add_argument('--min-length', type=int, default=MIN_WORD_LENGTH)
+    compile_parser.add_argument('--max-length', type=int, default=MAX_WORD_LENGTH)
+    
+    generate_parser = commands.add_parser('generate', help="print passphrases, one per line")
+    generate_parser.add_argument('count', nargs='?', type=int, default=1)
+    generate_parser.add_argument('--wordlist', default=DEFAULT_WORDLIST)
+    generate_parser.add_argument('--words', type=int, default=6)
+    generate_parser.add_argument('--classes', default=','.join(CHARACTER_CLASSES),
+                                 help=f"comma-separated character types (default: {','.join(CHARACTER_CLASSES)})")
+    
+    benchmark_parser = commands.add_parser('benchmark', help="compare opening a compiled list with parsing text")
+    benchmark_parser.add_argument('--wordlist', default=DEFAULT_WORDLIST)
+    benchmark_parser.add_argument('n', nargs='?', type=int, default=100000)
+    
+    args = parser.parse_args()
+    try:
+        if args.command == 'compile':
+            count = compile_wordlist(args.source, args.output, args.min_length, args.max_length)
+            print(f"Compiled {count:,} words into {args.output}", file=sys.stderr)
+        elif args.command == 'benchmark':
+            run_passphrase_benchmark(args.wordlist, args.n)
+        else:
+            classes = tuple(c.strip() for c in args.classes.split(',') if c.strip())
+            with Wordlist(args.wordlist) as wordlist:
+                for _ in range(args.count):
+                    print(generate_passphrase(wordlist, args.words, classes))
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+
+if __name__ == "__main__":
+    main()
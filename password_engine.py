@@ -0,0 +1,226 @@
+import argparse
+import math
+import multiprocessing
+import os
+import random
+import string
+import sys
+import time
+from collections import deque
+from functools import lru_cache
+from itertools import combinations
+
+# Character classes the generator can draw from, in the order of the
+# checkboxes in the GUI
+CHARACTER_CLASSES = {
+    'upper': string.ascii_uppercase,
+    'lower': string.ascii_lowercase,
+    'digits': string.digits,
+    'special': "!@#$%^&*",
+}
+
+# Passwords checked and kept per round of generate_many, so a huge batch
+# does not hold all of its random bytes at once
+GENERATE_CHUNK = 10000
+
+# Chunks each worker process may have finished or in progress before the
+# writer catches up; keeps memory flat however many passwords are made
+CHUNKS_IN_FLIGHT_PER_PROCESS = 2
+
+# Buffer of the output file, so passwords go out in large writes
+OUTPUT_BUFFER_SIZE = 1 << 20
+
+
+@lru_cache(maxsize=None)
+def sampling_table(alphabet):
+    """bytes.translate arguments that map random bytes onto alphabet without bias.
+    
+    Byte b becomes alphabet[b % len(alphabet)]. Bytes from the largest
+    multiple of len(alphabet) up are deleted instead (rejection sampling),
+    so every character is equally likely. Returns (table, deleted bytes,
+    share of bytes kept).
+    """
+    limit = 256 - 256 % len(alphabet)
+    table = bytes(ord(alphabet[b % len(alphabet)]) for b in range(256))
+    return table, bytes(range(limit, 256)), limit / 256
+
+
+def random_chars(alphabet, count):
+    """count characters drawn uniformly from alphabet with os.urandom"""
+    table, rejected, kept = sampling_table(alphabet)
+    chars = b''
+    while len(chars) < count:
+        # One urandom call and one translate for the whole batch; a few
+        # spare bytes make a second round rare
+        needed = count - len(chars)
+        chars += os.urandom(int(needed / kept) + 16).translate(table, rejected)
+    return chars[:count].decode('ascii')
+
+
+def class_alphabets(classes):
+    """The character sets of the named classes, or raise ValueError.
+    
+    A class named twice is only used once, so it does not skew the alphabet.
+    """
+    if not classes:
+        raise ValueError("Please select at least one character type!")
+    unknown = [c for c in classes if c not in CHARACTER_CLASSES]
+    if unknown:
+        raise ValueError(f"Unknown character type: {unknown[0]}")
+    return [CHARACTER_CLASSES[c] for c in dict.fromkeys(classes)]
+
+
+def acceptance_rate(alphabets, length):
+    """Chance that length characters drawn from all alphabets include each one"""
+    # Inclusion-exclusion over the classes that could be missing
+    total = sum(len(a) for a in alphabets)
+    rate = 0.0
+    for size in range(len(alphabets) + 1):
+        for missing in combinations(alphabets, size):
+            rate += (-1) ** size * ((total - sum(len(a) for a in missing)) / total) ** length
+    return rate
+
+
+def generate_many(n, length=12, classes=tuple(CHARACTER_CLASSES)):
+    """Return n passwords of length characters from the named classes.
+    
+    Every password has at least one character of each class, like the ones
+    generate_password builds. Candidates are drawn uniformly from all the
+    classes and the ones missing a class are thrown away, which keeps
+    every valid password equally likely without a shuffle.
+    """
+    alphabets = class_alphabets(classes)
+    if length < len(alphabets):
+        raise ValueError(f"A password needs at least {len(alphabets)} characters to include each type")
+    alphabet = ''.join(alphabets)
+    class_sets = [frozenset(a) for a in alphabets]
+    rate = acceptance_rate(alphabets, length)
+    
+    passwords = []
+    while len(passwords) < n:
+        wanted = min(n - len(passwords), GENERATE_CHUNK)
+        chars = random_chars(alphabet, math.ceil(wanted / rate * 1.05 + 4) * length)
+        candidates = [chars[i:i + length] for i in range(0, len(chars), length)]
+        for class_set in class_sets:
+            candidates = [p for p in candidates if not class_set.isdisjoint(p)]
+        passwords += candidates[:wanted]
+    return passwords
+
+
+def generate_block(n, length, classes):
+    """n passwords as newline-terminated ASCII bytes, ready to write"""
+    return ('\n'.join(generate_many(n, length, classes)) + '\n').encode('ascii')
+
+
+def write_passwords(f, n, length=12, classes=tuple(CHARACTER_CLASSES), processes=None):
+    """Write n passwords, one per line, to a binary file and return n.
+    
+    Chunks of GENERATE_CHUNK passwords are made on a process pool. Each
+    worker draws from os.urandom itself, so the workers never share or
+    repeat a random stream. Only a few chunks per process are held at a
+    time, and each is written in one call.
+    """
+    if n < 0:
+        raise ValueError("The number of passwords cannot be negative")
+    alphabets = class_alphabets(classes)
+    if length < len(alphabets):
+        raise ValueError(f"A password needs at least {len(alphabets)} characters to include each type")
+    chunks = [GENERATE_CHUNK] * (n // GENERATE_CHUNK) + ([n % GENERATE_CHUNK] if n % GENERATE_CHUNK else [])
+    processes = processes or multiprocessing.cpu_count()
+    if processes == 1 or len(chunks) == 1:
+        for size in chunks:
+            f.write(generate_block(size, length, classes))
+        return n
+    
+    with multiprocessing.Pool(processes) as pool:
+        pending = deque()
+        for size in chunks:
+            if len(pending) >= processes * CHUNKS_IN_FLIGHT_PER_PROCESS:
+                f.write(pending.popleft().get())
+            pending.append(pool.apply_async(generate_block, (size, length, classes)))
+        while pending:
+            f.write(pending.popleft().get())
+    return n
+
+
+def generate_with_random(length, classes):
+    """The GUI's original one-at-a-time generator, kept for the benchmark"""
+    char_sets = class_alphabets(classes)
+    password = [random.choice(char_set) for char_set in char_sets]
+    all_chars = ''.join(char_sets)
+    for _ in range(length - len(password)):
+        password.append(random.choice(all_chars))
+    random.shuffle(password)
+    return ''.join(password)
+
+
+def run_generate_benchmark(n, length=12):
+    classes = tuple(CHARACTER_CLASSES)
+    
+    start = time.perf_counter()
+    for _ in range(n):
+        generate_with_random(length, classes)
+    loop_rate = n / (time.perf_counter() - start)
+    
+    start = time.perf_counter()
+    generate_many(n, length, classes)
+    batch_rate = n / (time.perf_counter() - start)
+    
+    print(f"{n} passwords of {length} characters:")
+    print(f"  random.choice loop: {loop_rate:,.0f} passwords/s")
+    print(f"  generate_many:      {batch_rate:,.0f} passwords/s ({batch_rate / loop_rate:.1f}x)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate passwords without the GUI")
+    commands = parser.add_subparsers(dest='command', required=True)
+    
+    generate_parser = commands.add_parser('generate', help="write passwords, one per line")
+    generate_parser.add_argument('count', type=int)
+    generate_parser.add_argument('--length', type=int, default=12)
+    generate_parser.add_argument('--classes', default=','.join(CHARACTER_CLASSES),
+                                 help=f"comma-separated character types (default: {','.join(CHARACTER_CLASSES)})")
+    generate_parser.add_argument('-o', '--output', help="file to write (default: standard output)")
+    generate_parser.add_argument('--processes', type=int, help="worker processes (default: one per CPU)")
+    
+    benchmark_parser = commands.add_parser('benchmark', help="compare generate_many with the one-at-a-time loop")
+    benchmark_parser.add_argument('n', nargs='?', type=int, default=200000)
+    benchmark_parser.add_argument('--length', type=int, default=12)
+    
+    args = parser.parse_args()
+    if args.command == 'benchmark':
+        run_generate_benchmark(args.n, args.length)
+        return
+    
+    classes = tuple(dict.fromkeys(c.strip() for c in args.classes.split(',') if c.strip()))
+    try:
+        class_alphabets(classes)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.count < 0:
+        parser.error("count cannot be negative")
+    if args.length < 1:
+        parser.error("--length must be at least 1")
+    if args.processes is not None and args.processes < 1:
+        parser.error("--processes must be at least 1")
+    
+    start = time.perf_counter()
+    try:
+        if args.output:
+            with open(args.output, 'wb', buffering=OUTPUT_BUFFER_SIZE) as f:
+                write_passwords(f, args.count, args.length, classes, args.processes)
+        else:
+            write_passwords(sys.stdout.buffer, args.count, args.length, classes, args.processes)
+            sys.stdout.flush()
+    except ValueError as e:
+        parser.error(str(e))
+    except BrokenPipeError:
+        # The reader stopped early, e.g. piped into head
+        sys.stderr.close()
+        return
+    elapsed = time.perf_counter() - start
+    print(f"Generated {args.count} passwords in {elapsed:.2f} s "
+          f"({args.count / max(elapsed, 1e-9):,.0f} passwords/s)", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
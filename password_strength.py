@@ -0,0 +1,741 @@
+import argparse
+import math
+import sys
+import time
+from array import array
+from bisect import bisect_left
+from collections import namedtuple
+from datetime import date
+from functools import lru_cache
+
+# Ranked word lists, most common first. A word's rank is roughly how many
+# guesses an attacker working down the list needs to reach it. They are only
+# split and indexed the first time a password is scored.
+FREQUENCY_LISTS = {
+    'passwords': """
+        123456 password 12345678 qwerty 123456789 12345 1234 111111 1234567 dragon
+        123123 baseball abc123 football monkey letmein 696969 shadow master 666666
+        qwertyuiop 123321 mustang 1234567890 michael 654321 superman 1qaz2wsx 7777777 121212
+        000000 qazwsx 123qwe killer trustno1 jordan jennifer zxcvbnm asdfgh hunter
+        buster soccer harley batman andrew tigger sunshine iloveyou 2000 charlie
+        robert thomas hockey ranger daniel starwars klaster 112233 george computer
+        michelle jessica pepper 1111 zxcvbn 555555 11111111 131313 freedom 777777
+        pass maggie 159753 aaaaaa ginger princess joshua cheese amanda summer
+        love ashley nicole chelsea biteme matthew access yankees 987654321 dallas
+        austin thunder taylor matrix william corvette hello martin heather secret merlin
+        diamond 1234qwer gfhjkm hammer silver 222222 88888888 anthony justin test
+        bailey q1w2e3r4t5 patrick internet scooter orange 11111 golfer cookie richard
+        samantha bigdog guitar jackson whatever mickey chicken sparky snoopy maverick
+        phoenix camaro peanut morgan welcome falcon cowboy ferrari samsung andrea
+        smokey steelers joseph mercedes dakota arsenal eagles melissa boomer booboo
+        spider nascar monster tigers yellow xxxxxx 123123123 gateway marina diablo
+        bulldog qwer1234 compaq purple hardcore banana junior hannah 123654 porsche
+        lakers iceman money cowboys 987654 london tennis 999999 ncc1701 coffee
+        scooby 0000 miller boston q1w2e3r4 fuckoff brandon yamaha chester mother
+        forever johnny edward 333333 oliver redsox player nikita knight fender
+        barney midnight please brandy chicago badboy iwantu slayer rangers charles
+        angel flower bigdaddy rabbit wizard bigdick jasper enter rachel chris
+        admin passw0rd password1 qwerty123 1q2w3e4r abcd1234 changeme letmein1 zaq12wsx
+    """,
+    'english_words': """
+        you the to it not that and of what is in me this know my for your have
+        on be we do but just all no with he get so was can are like if about
+        right here out up there go what's now one don't well how yeah want at
+        think they got oh come can't her going good him see she let time look
+        really back tell from why them who then take would say could make his
+        were our never little man need there's okay very thing an something
+        love way give too two sure mean think hey maybe much people over first
+        where into down did off any help night life more only home even thank
+        call better some their still before wait work because through day nothing
+        always around should other new great had away baby stop again things
+        last feel than long talk told guess god yes listen place old those
+        house fine hear every leave doing after world money father made heart
+        these mother friend family while please happy mind room next live real
+        kind big found year hello name school lot same might stay car boy
+        another everything hand show fuck says course shit believe hell trying
+        girl keep thought dead high both head best hold today once enough left
+        dad game door free kill gonna late open start till start water ever
+        stuff change light face black white dark blue green red summer winter
+        spring autumn music power magic star moon sun fire rain snow river ocean
+        flower tree garden king queen prince princess angel devil heaven dragon
+        tiger lion eagle wolf horse monkey bear shark snake spider rabbit cat
+        dog bird fish apple orange banana cherry lemon chocolate cookie cheese
+        coffee pizza sugar honey sweet happy lucky crazy secret hunter killer
+        master super hero shadow ghost silver golden diamond crystal thunder
+        storm freedom peace hope dream faith trust friend lover forever victory
+        welcome hello welcome computer internet football baseball soccer hockey
+        basketball tennis golf guitar piano movie dance party beach island
+        mountain forest desert city country london paris america canada summer
+    """,
+    'names': """
+        james john robert michael william david richard charles joseph thomas
+        christopher daniel paul mark donald george kenneth steven edward brian
+        ronald anthony kevin jason matthew gary timothy jose larry jeffrey frank
+        scott eric stephen andrew raymond gregory joshua jerry dennis walter
+        patrick peter harold douglas henry carl arthur ryan roger mary patricia
+        linda barbara elizabeth jennifer maria susan margaret dorothy lisa nancy
+        karen betty helen sandra donna carol ruth sharon michelle laura sarah
+        kimberly deborah jessica shirley cynthia angela melissa brenda amy anna
+        rebecca virginia kathleen pamela martha debra amanda stephanie carolyn
+        christine marie janet catherine frances ann joyce diane alice julie heather
+        aditi priya rahul amit anjali neha rohan vikram pooja arjun
+    """,
+    'surnames': """
+        smith johnson williams jones brown davis miller wilson moore taylor
+        anderson thomas jackson white harris martin thompson garcia martinez
+        robinson clark rodriguez lewis lee walker hall allen young hernandez king
+        wright lopez hill scott green adams baker gonzalez nelson carter mitchell
+        perez roberts turner phillips campbell parker evans edwards collins
+        stewart sanchez morris rogers reed cook morgan bell murphy bailey rivera
+        cooper richardson cox howard ward torres peterson gray ramirez watson
+        brooks kelly sanders price bennett wood barnes ross henderson coleman
+        jenkins perry powell long patterson hughes flores washington butler
+        simmons foster gonzales bryant alexander russell griffin diaz hayes
+        sharma patel singh kumar gupta
+    """,
+}
+
+# Keyboards as typed: each token is a key, unshifted character first. On a
+# slanted layout every row sits a little to the right of the one above it.
+KEYBOARD_LAYOUTS = {
+    'qwerty': (r'''
+`~ 1! 2@ 3# 4$ 5% 6^ 7& 8* 9( 0) -_ =+
+    qQ wW eE rR tT yY uU iI oO pP [{ ]} \|
+     aA sS dD fF gG hH jJ kK lL ;: '"
+      zZ xX cC vV bB nN mM ,< .> /?
+''', True),
+    'keypad': ('''
+  / * -
+7 8 9 +
+4 5 6
+1 2 3
+  0 .
+''', False),
+}
+
+# Symbols read as the letter they look like; one reading per symbol keeps
+# the l33t check to a single extra pass over the password
+L33T_SUBSTITUTIONS = {
+    '4': 'a', '@': 'a', '8': 'b', '(': 'c', '{': 'c', '[': 'c', '<': 'c',
+    '3': 'e', '6': 'g', '9': 'g', '1': 'i', '!': 'i', '|': 'i', '0': 'o',
+    '$': 's', '5': 's', '7': 't', '+': 't', '%': 'x', '2': 'z',
+}
+L33T_TABLE = str.maketrans(L33T_SUBSTITUTIONS)
+
+# Kinds of character a password is counted by, as named in the generator's
+# complexity options
+CHARACTER_TYPES = ('upper', 'lower', 'digits', 'special', 'other')
+
+# Guesses per character of a part of the password no pattern explains
+BRUTEFORCE_CARDINALITY = 10
+
+# Fewest guesses a pattern inside a longer password can take; an attacker
+# still has to find where it sits and what surrounds it
+MIN_SUBMATCH_GUESSES_SINGLE_CHAR = 10
+MIN_SUBMATCH_GUESSES_MULTI_CHAR = 50
+
+# Guesses charged for every pattern beyond the first, so one long pattern
+# beats many short ones that happen to cover the same characters
+MIN_GUESSES_BEFORE_GROWING_SEQUENCE = 10000
+
+# Years closer than this to the current one count as this far away
+MIN_YEAR_SPACE = 20
+
+# Only this many characters are scored, which bounds the time per password
+MAX_SCORED_LENGTH = 50
+
+# Coverings kept per position, cheapest first. Without a cap a long
+# repetitive password keeps one for nearly every pattern count, and each
+# character then costs time in proportion to all of them.
+MAX_COVERINGS_KEPT = 6
+
+# How far into a run of repeated characters a repeat may begin. A run can
+# start a character or two early when the text before the first copy
+# happens to end like the base does ("e" + "lovelove").
+MAX_REPEAT_OFFSET = 2
+
+# Guesses below each threshold give scores 0 to 3; anything above is 4
+SCORE_THRESHOLDS = (1e3 + 5, 1e6 + 5, 1e8 + 5, 1e10 + 5)
+
+# Attack scenarios and the guesses per second each one manages
+CRACK_SCENARIOS = {
+    'online_throttled': 100 / 3600,
+    'online_unthrottled': 10,
+    'offline_slow_hash': 1e4,
+    'offline_fast_hash': 1e10,
+}
+
+# factorial(l) and the growing-sequence charge for a sequence of l patterns
+FACTORIALS = [float(math.factorial(l)) for l in range(MAX_SCORED_LENGTH + 2)]
+SEQUENCE_CHARGES = [float(MIN_GUESSES_BEFORE_GROWING_SEQUENCE) ** (l - 1) if l < 78 else math.inf
+                    for l in range(MAX_SCORED_LENGTH + 2)]
+
+FrequencyIndex = namedtuple('FrequencyIndex', 'names words ranks lists reversed_words reversed_ranks reversed_lists')
+KeyboardGraph = namedtuple('KeyboardGraph', 'neighbors shifted starting_positions average_degree')
+
+
+def add_frequency_list(name, words):
+    """Register another ranked word list, most common word first"""
+    FREQUENCY_LISTS[name] = list(words)
+    frequency_index.cache_clear()
+
+
+@lru_cache(maxsize=None)
+def frequency_index():
+    """All frequency lists merged into sorted arrays, built on first use.
+    
+    Each word keeps its best rank and the list it came from. The words are
+    kept sorted twice: forwards, and by their reversed spelling, so a match
+    can be found by reading the password backwards from where it ends.
+    """
+    names = list(FREQUENCY_LISTS)
+    best = {}
+    for list_id, name in enumerate(names):
+        words = FREQUENCY_LISTS[name]
+        if isinstance(words, str):
+            words = words.split()
+        for rank, word in enumerate(words, 1):
+            word = word.lower()
+            if word not in best or rank < best[word][0]:
+                best[word] = (rank, list_id)
+    
+    words = sorted(best)
+    reversed_words = sorted(word[::-1] for word in best)
+    return FrequencyIndex(
+        names,
+        words,
+        array('I', (best[w][0] for w in words)),
+        array('B', (best[w][1] for w in words)),
+        reversed_words,
+        array('I', (best[w[::-1]][0] for w in reversed_words)),
+        array('B', (best[w[::-1]][1] for w in reversed_words)),
+    )
+
+
+@lru_cache(maxsize=None)
+def keyboard_graphs():
+    """Adjacency of every key on KEYBOARD_LAYOUTS, built on first use.
+    
+    neighbors[a][b] is the direction from key a to key b when they touch.
+    Directions are numbered around the key, so a change of number is a
+    turn in the pattern being typed.
+    """
+    graphs = {}
+    for name, (layout, slanted) in KEYBOARD_LAYOUTS.items():
+        tokens = layout.split()
+        x_unit = len(tokens[0]) + 1
+        positions = {}
+        for y, line in enumerate(layout.split('\n')):
+            slant = y - 1 if slanted else 0
+            for token in line.split():
+                x = (line.index(token) - slant) // x_unit
+                positions[(x, y)] = token
+        
+        if slanted:
+            around = [(-1, 0), (0, -1), (1, -1), (1, 0), (0, 1), (-1, 1)]
+        else:
+            around = [(-1, 0), (-1, -1), (0, -1), (1, -1), (1, 0), (1, 1), (0, 1), (-1, 1)]
+        neighbors = {}
+        degrees = 0
+        for (x, y), token in positions.items():
+            adjacent = {}
+            for direction, (dx, dy) in enumerate(around):
+                other = positions.get((x + dx, y + dy))
+                if other:
+                    for char in other:
+                        adjacent[char] = direction
+                    degrees += len(token)
+            for char in token:
+                neighbors[char] = adjacent
+        shifted = frozenset(token[1] for token in tokens if len(token) > 1)
+        graphs[name] = KeyboardGraph(neighbors, shifted, len(tokens), degrees / len(neighbors))
+    return graphs
+
+
+def walk_back(words, text, k):
+    """Yield (start, index) for every words[index] equal to text[start:k+1] read backwards.
+    
+    The candidate grows by one character per step, so the binary search
+    only ever moves forward and stops as soon as no word begins with it.
+    """
+    lo, hi = 0, len(words)
+    key = ''
+    for start in range(k, -1, -1):
+        key += text[start]
+        lo = bisect_left(words, key, lo, hi)
+        if lo == hi or not words[lo].startswith(key):
+            return
+        if words[lo] == key:
+            yield start, lo
+
+
+def n_choose_sum(n, most):
+    """Ways to pick between 1 and most of n positions"""
+    return sum(math.comb(n, i) for i in range(1, most + 1))
+
+
+def uppercase_variations(token):
+    """Guesses needed to find where a word's capital letters are"""
+    if token.lower() == token:
+        return 1
+    if token.upper() == token:
+        return 2
+    if token[1:].lower() == token[1:] or token[:-1].lower() == token[:-1]:
+        # Only the first or only the last letter is capital
+        return 2
+    upper = sum(1 for c in token if c.isupper())
+    lower = sum(1 for c in token if c.islower())
+    return n_choose_sum(upper + lower, min(upper, lower))
+
+
+def l33t_variations(token):
+    """Guesses needed to find which letters of a lowercase token were swapped for symbols"""
+    variations = 1
+    for symbol in set(token).intersection(L33T_SUBSTITUTIONS):
+        subbed = token.count(symbol)
+        unsubbed = token.count(L33T_SUBSTITUTIONS[symbol])
+        if not unsubbed:
+            variations *= 2
+        else:
+            variations *= n_choose_sum(subbed + unsubbed, min(subbed, unsubbed))
+    return variations
+
+
+def spatial_guesses(graph, length, turns, shifted):
+    """Guesses for a keyboard pattern of length keys with the given turns and shifted keys"""
+    guesses = 0
+    for i in range(2, length + 1):
+        for j in range(1, min(turns, i - 1) + 1):
+            guesses += math.comb(i - 1, j - 1) * graph.starting_positions * graph.average_degree ** j
+    if shifted:
+        unshifted = length - shifted
+        if not unshifted:
+            guesses *= 2
+        else:
+            guesses *= n_choose_sum(length, min(shifted, unshifted))
+    return guesses
+
+
+def sequence_guesses(token, ascending):
+    """Guesses for a run like abcd or 9753"""
+    if token[0] in 'aAzZ019':
+        base = 4
+    elif token[0].isdigit():
+        base = 10
+    else:
+        base = 26
+    if not ascending:
+        base *= 2
+    return base * len(token)
+
+
+@lru_cache(maxsize=1024)
+def repeated_base_guesses(base):
+    """Guesses for the part a repeat is made of, scored as a password of its own"""
+    return StrengthMeter(base).result()['guesses']
+
+
+class StrengthMeter:
+    """Estimates how many guesses a password takes, zxcvbn style.
+    
+    Characters are added one at a time. For each one the detectors find
+    every pattern ending there: dictionary words (plain, reversed or in
+    l33t), keyboard walks, sequences, repeats and years. A table of the
+    cheapest ways to cover the password so far is then extended by one
+    position, so scoring costs about the same per character however the
+    password is built up.
+    
+    Every piece of state is kept per position, so pop() takes the last
+    character back off by dropping one entry from each list. That makes
+    rescoring after a keystroke cost only the characters that changed.
+    """
+    
+    def __init__(self, password=''):
+        self.password = ''
+        self.lower = ''
+        self.leet = ''
+        # How many characters of each type the password has
+        self.class_counts = dict.fromkeys(CHARACTER_TYPES, 0)
+        # Detector state after each position: keyboard walks as
+        # {graph: (start, turns, direction, shifted)}, sequences as
+        # (start, delta) and repeats as run lengths by period
+        self.walks = []
+        self.sequences = []
+        self.runs = []
+        # Cheapest coverings of password[:k+1] as {patterns: (guesses, product, last match)},
+        # the best place for brute force to begin after a covering of each
+        # pattern count as {patterns: (weight, start, product)}, and the
+        # cheapest single pattern covering everything up to k
+        self.best = []
+        self.openings = []
+        self.whole = []
+        for char in password[:MAX_SCORED_LENGTH]:
+            self.append(char)
+    
+    def append(self, char):
+        """Score one more character; ignored past MAX_SCORED_LENGTH"""
+        k = len(self.password)
+        if k >= MAX_SCORED_LENGTH:
+            return
+        self.password += char
+        self.lower += char.lower()
+        self.leet += char.lower().translate(L33T_TABLE)
+        self.class_counts[character_type(char)] += 1
+        
+        best = {}
+        whole = None
+        for start, guesses, pattern, details in self._patterns_ending_at(k):
+            if start == 0 and (whole is None or guesses < whole[2]):
+                whole = (start, k, max(guesses, 1), pattern, details)
+            if k == start:
+                guesses = max(guesses, MIN_SUBMATCH_GUESSES_SINGLE_CHAR)
+            else:
+                guesses = max(guesses, MIN_SUBMATCH_GUESSES_MULTI_CHAR)
+            match = (start, k, guesses, pattern, details)
+            if start == 0:
+                self._update(best, match, 1, guesses)
+            else:
+                for patterns, (_, product, _) in self.best[start - 1].items():
+                    self._update(best, match, patterns + 1, guesses * product)
+        
+        # Brute force can follow any pattern but never another brute force.
+        # Two characters on, its guesses grow by the same factor whatever
+        # its start, so for each pattern count the opening with the lowest
+        # weight stays the best one and earlier starts need no rescanning.
+        match = self._bruteforce(0, k)
+        self._update(best, match, 1, match[2])
+        previous = self.openings[k - 1] if k else {}
+        for patterns, (_, start, product) in previous.items():
+            match = self._bruteforce(start, k)
+            self._update(best, match, patterns + 1, match[2] * product)
+        openings = dict(previous)
+        if k:
+            match = self._bruteforce(k, k)
+            for patterns, (_, product, last) in self.best[k - 1].items():
+                if last[3] == 'bruteforce':
+                    continue
+                self._update(best, match, patterns + 1, match[2] * product)
+                weight = product / float(BRUTEFORCE_CARDINALITY) ** k
+                if patterns not in openings or weight < openings[patterns][0]:
+                    openings[patterns] = (weight, k, product)
+        
+        self.best.append(self._cheapest(best, lambda patterns, entry: entry[0]))
+        self.openings.append(self._cheapest(openings, lambda patterns, entry: FACTORIALS[patterns + 1] * entry[0]))
+        self.whole.append(whole)
+    
+    def pop(self):
+        """Take the last character back off and return it"""
+        if not self.password:
+            raise IndexError("pop from an empty password")
+        char = self.password[-1]
+        self.password = self.password[:-1]
+        self.lower = self.lower[:-1]
+        self.leet = self.leet[:-1]
+        self.class_counts[character_type(char)] -= 1
+        for state in (self.walks, self.sequences, self.runs, self.best, self.openings, self.whole):
+            state.pop()
+        return char
+    
+    def set_password(self, password):
+        """Rescore for password, keeping the work done for the prefix it shares with the last one"""
+        password = password[:MAX_SCORED_LENGTH]
+        shared = 0
+        for old, new in zip(self.password, password):
+            if old != new:
+                break
+            shared += 1
+        while len(self.password) > shared:
+            self.pop()
+        for char in password[shared:]:
+            self.append(char)
+    
+    def missing_types(self):
+        """The character types the password has none of"""
+        return [name for name in CHARACTER_TYPES if name != 'other' and not self.class_counts[name]]
+    
+    def result(self):
+        """The estimate for the characters added so far, as a dict"""
+        if not self.password:
+            guesses, sequence = 1.0, []
+        else:
+            patterns, (guesses, _, match) = min(self.best[-1].items(), key=lambda item: item[1][0])
+            sequence = []
+            k = len(self.password) - 1
+            while k >= 0:
+                match = self.best[k][patterns][2]
+                sequence.append(match)
+                k = match[0] - 1
+                patterns -= 1
+            sequence.reverse()
+            
+            whole = self.whole[-1]
+            if whole and whole[2] + 1 < guesses:
+                guesses, sequence = whole[2] + 1, [whole]
+        
+        result = strength_of_guesses(guesses)
+        sequence = [self._describe(match) for match in sequence]
+        result.update(password=self.password, sequence=sequence, warning=warning(sequence, result['score']))
+        return result
+    
+    def _update(self, best, match, patterns, product):
+        guesses = FACTORIALS[patterns] * product + SEQUENCE_CHARGES[patterns]
+        for other_patterns, (other_guesses, _, _) in best.items():
+            if other_patterns <= patterns and other_guesses <= guesses:
+                return
+        best[patterns] = (guesses, product, match)
+    
+    def _cheapest(self, entries, cost):
+        """The MAX_COVERINGS_KEPT entries of {patterns: entry} with the lowest cost"""
+        if len(entries) <= MAX_COVERINGS_KEPT:
+            return entries
+        return dict(sorted(entries.items(), key=lambda item: cost(*item))[:MAX_COVERINGS_KEPT])
+    
+    def _bruteforce(self, start, k):
+        length = k - start + 1
+        guesses = float(BRUTEFORCE_CARDINALITY) ** length
+        if length == 1:
+            guesses = max(guesses, MIN_SUBMATCH_GUESSES_SINGLE_CHAR + 1)
+        else:
+            guesses = max(guesses, MIN_SUBMATCH_GUESSES_MULTI_CHAR + 1)
+        return (start, k, guesses, 'bruteforce', None)
+    
+    def _patterns_ending_at(self, k):
+        """Yield (start, guesses, pattern, details) for each pattern ending at k"""
+        password, lower = self.password, self.lower
+        index = frequency_index()
+        
+        for start, i in walk_back(index.reversed_words, lower, k):
+            token = password[start:k + 1]
+            rank = index.reversed_ranks[i]
+            yield start, rank * uppercase_variations(token), 'dictionary', {
+                'matched_word': lower[start:k + 1], 'rank': rank,
+                'dictionary': index.names[index.reversed_lists[i]], 'reversed': False, 'l33t': False}
+        
+        for start, i in walk_back(index.words, lower, k):
+            word = index.words[i]
+            if word == word[::-1]:
+                continue
+            rank = index.ranks[i]
+            yield start, rank * uppercase_variations(password[start:k + 1]) * 2, 'dictionary', {
+                'matched_word': word, 'rank': rank,
+                'dictionary': index.names[index.lists[i]], 'reversed': True, 'l33t': False}
+        
+        if self.leet != lower:
+            for start, i in walk_back(index.reversed_words, self.leet, k):
+                token = lower[start:k + 1]
+                if token == self.leet[start:k + 1]:
+                    continue
+                rank = index.reversed_ranks[i]
+                guesses = rank * uppercase_variations(password[start:k + 1]) * l33t_variations(token)
+                yield start, guesses, 'dictionary', {
+                    'matched_word': self.leet[start:k + 1], 'rank': rank,
+                    'dictionary': index.names[index.reversed_lists[i]], 'reversed': False, 'l33t': True}
+        
+        # Keyboard walks: a run of keys that each touch the one before
+        walks = {}
+        for name, graph in keyboard_graphs().items():
+            is_shifted = password[k] in graph.shifted
+            direction = graph.neighbors.get(password[k - 1], {}).get(password[k]) if k else None
+            if direction is None:
+                walk = (k, 0, None, int(is_shifted))
+            else:
+                start, turns, last_direction, shifted = self.walks[k - 1][name]
+                walk = (start, turns + (direction != last_direction), direction, shifted + is_shifted)
+            walks[name] = walk
+            start, turns, _, shifted = walk
+            if k - start >= 2:
+                yield start, spatial_guesses(graph, k - start + 1, turns, shifted), 'spatial', {
+                    'graph': name, 'turns': turns, 'shifted_count': shifted}
+        self.walks.append(walks)
+        
+        # Sequences: characters a constant small step apart
+        if k:
+            delta = ord(password[k]) - ord(password[k - 1])
+            start, last_delta = self.sequences[k - 1]
+            if delta != last_delta:
+                start = k - 1
+        else:
+            start, delta = 0, None
+        self.sequences.append((start, delta))
+        if k - start >= 2 and 1 <= abs(delta) <= 5:
+            yield start, sequence_guesses(password[start:k + 1], delta > 0), 'sequence', {
+                'ascending': delta > 0}
+        
+        # Repeats: runs[period] counts the characters so far that equal the
+        # one period places back; a full copy of the period means a repeat.
+        # A repeat may begin at most MAX_REPEAT_OFFSET characters into the
+        # run, so a long repeat scores a few bases rather than every
+        # rotation of one.
+        previous = self.runs[k - 1] if k else []
+        runs = [0] * (k + 1)
+        repeat = None
+        for period in range(1, k + 1):
+            if password[k] == password[k - period]:
+                runs[period] = (previous[period] if period < k else 0) + 1
+                if repeat is None and runs[period] >= period:
+                    repeat = period
+        self.runs.append(runs)
+        if repeat and runs[repeat] % repeat <= MAX_REPEAT_OFFSET:
+            count = runs[repeat] // repeat + 1
+            start = k + 1 - count * repeat
+            base = password[start:start + repeat]
+            yield start, repeated_base_guesses(base) * count, 'repeat', {
+                'base_token': base, 'repeat_count': count}
+        
+        # Years from 1900 to 2099
+        if k >= 3:
+            token = password[k - 3:k + 1]
+            if token.isdigit() and token[:2] in ('19', '20'):
+                yield k - 3, max(abs(int(token) - date.today().year), MIN_YEAR_SPACE), 'year', None
+    
+    def _describe(self, match):
+        start, end, guesses, pattern, details = match
+        described = {'pattern': pattern, 'token': self.password[start:end + 1],
+                     'i': start, 'j': end, 'guesses': guesses}
+        if details:
+            described.update(details)
+        return described
+
+
+def character_type(char):
+    """Which of CHARACTER_TYPES char belongs to"""
+    if char.isupper():
+        return 'upper'
+    if char.islower():
+        return 'lower'
+    if char.isdigit():
+        return 'digits'
+    if char.isspace():
+        return 'other'
+    return 'special'
+
+
+def strength_of_guesses(guesses):
+    """Score and crack times for a password that takes guesses guesses"""
+    seconds = {name: guesses / rate for name, rate in CRACK_SCENARIOS.items()}
+    return {
+        'guesses': guesses,
+        'guesses_log10': math.log10(guesses),
+        'score': sum(1 for threshold in SCORE_THRESHOLDS if guesses >= threshold),
+        'crack_times_seconds': seconds,
+        'crack_times_display': {name: display_time(s) for name, s in seconds.items()},
+    }
+
+
+def estimate_strength(password):
+    """Guesses, score (0-4), crack times and the patterns found in password"""
+    return StrengthMeter(password).result()
+
+
+def display_time(seconds):
+    """Seconds as a rough human-readable duration"""
+    units = [('second', 1), ('minute', 60), ('hour', 3600), ('day', 86400),
+             ('month', 86400 * 31), ('year', 86400 * 365)]
+    if seconds < 1:
+        return "less than a second"
+    if seconds >= 86400 * 365 * 100:
+        return "centuries"
+    name, size = [unit for unit in units if seconds >= unit[1]][-1]
+    count = round(seconds / size)
+    return f"{count} {name}{'s' if count != 1 else ''}"
+
+
+def warning(sequence, score):
+    """A hint about the longest pattern that made a weak password weak"""
+    if score > 2 or not sequence:
+        return ''
+    match = max(sequence, key=lambda m: len(m['token']))
+    pattern = match['pattern']
+    if pattern == 'dictionary':
+        alone = len(sequence) == 1
+        if match['dictionary'] == 'passwords':
+            if alone and not match['l33t'] and not match['reversed']:
+                if match['rank'] <= 10:
+                    return "This is a top-10 common password"
+                if match['rank'] <= 100:
+                    return "This is a top-100 common password"
+                return "This is a very common password"
+            return "This is similar to a commonly used password"
+        if match['dictionary'] == 'english_words' and alone:
+            return "A word by itself is easy to guess"
+        if match['dictionary'] in ('names', 'surnames'):
+            if alone:
+                return "Names and surnames by themselves are easy to guess"
+            return "Common names and surnames are easy to guess"
+        return ''
+    if pattern == 'spatial':
+        if match['turns'] == 1:
+            return "Straight rows of keys are easy to guess"
+        return "Short keyboard patterns are easy to guess"
+    if pattern == 'repeat':
+        if len(match['base_token']) == 1:
+            return 'Repeats like "aaa" are easy to guess'
+        return 'Repeats like "abcabcabc" are only slightly harder to guess than "abc"'
+    if pattern == 'sequence':
+        return "Sequences like abc or 6543 are easy to guess"
+    if pattern == 'year':
+        return "Recent years are easy to guess"
+    return ''
+
+
+def print_estimate(result):
+    print(f"{result['password']}: score {result['score']}/4, "
+          f"10^{result['guesses_log10']:.1f} guesses")
+    for name, shown in result['crack_times_display'].items():
+        print(f"  {name:20} {shown}")
+    if result['warning']:
+        print(f"  warning: {result['warning']}")
+    for match in result['sequence']:
+        extra = match.get('matched_word') or match.get('graph') or match.get('base_token') or ''
+        print(f"  {match['pattern']:11} {match['token']!r:24} {extra:16} 10^{math.log10(match['guesses']):.1f}")
+
+
+def run_strength_benchmark(n):
+    from password_engine import generate_many
+    
+    start = time.perf_counter()
+    frequency_index()
+    keyboard_graphs()
+    load_time = time.perf_counter() - start
+    
+    samples = {
+        'generated, 12 characters': generate_many(n, 12),
+        'generated, 20 characters': generate_many(n, 20),
+        'common patterns': ["Password1!", "qwerty123", "Aaaaaaaa1!", "correcthorsebatterystaple",
+                            "1qaz2wsx", "abc123abc123", "Summer2024", "p@ssw0rd"] * (n // 8 + 1),
+        'long and repetitive': ['a' * 100, 'qwertyuiop' * 10, '1qaz2wsx' * 12, '1234567890' * 10,
+                                "correct horse battery staple " * 3, generate_many(1, 100)[0]] * (n // 6 + 1),
+    }
+    print(f"Dictionaries and keyboard graphs loaded in {load_time * 1000:.1f} ms")
+    for name, passwords in samples.items():
+        slowest = 0
+        start = time.perf_counter()
+        for password in passwords:
+            began = time.perf_counter()
+            estimate_strength(password)
+            slowest = max(slowest, time.perf_counter() - began)
+        mean = (time.perf_counter() - start) / len(passwords)
+        print(f"  {name:26} {mean * 1000:.3f} ms per password (slowest {slowest * 1000:.3f} ms)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Estimate how hard passwords are to guess")
+    commands = parser.add_subparsers(dest='command', required=True)
+    
+    check_parser = commands.add_parser('check', help="score passwords given as arguments or one per line on stdin")
+    check_parser.add_argument('passwords', nargs='*')
+    
+    benchmark_parser = commands.add_parser('benchmark', help="time the estimator on generated and common passwords")
+    benchmark_parser.add_argument('n', nargs='?', type=int, default=2000)
+    
+    args = parser.parse_args()
+    if args.command == 'benchmark':
+        run_strength_benchmark(args.n)
+        return
+    
+    passwords = args.passwords or (line.rstrip('\n') for line in sys.stdin)
+    for password in passwords:
+        print_estimate(estimate_strength(password))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,435 @@
+import json
+import os
+import queue
+import threading
+
+# Unsynced journal entries that force an fsync straight away
+FSYNC_BATCH = 100
+
+# How often the background thread fsyncs entries written since the last sync
+FSYNC_INTERVAL = 0.5
+
+# The journal is folded into a new snapshot once it holds more entries than
+# this and more entries than there are records
+COMPACT_MIN_ENTRIES = 1000
+
+# How long the write-behind worker waits for more changes before writing a
+# burst of them together
+WRITE_BEHIND_DELAY = 0.05
+
+
+def fsync_directory(path):
+    # Makes a rename durable on POSIX; directories cannot be opened on Windows
+    if not hasattr(os, 'O_DIRECTORY'):
+        return
+    fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def write_snapshot(path, records):
+    """Replace path with a JSON list of records, all or nothing"""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(records, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    fsync_directory(path)
+
+
+def iter_json_array(path, chunk_size=1 << 16):
+    """Yield the items of a file holding one JSON array, reading it in chunks.
+    
+    Only the current chunk and item are held in memory, so the first items
+    are ready before a large file has been read.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, 'r', encoding='utf-8') as f:
+        buffer = ''
+        position = 0
+        eof = False
+        expected = '['
+        while True:
+            # Skip whitespace, reading more when the chunk runs out
+            while True:
+                while position < len(buffer) and buffer[position].isspace():
+                    position += 1
+                if position < len(buffer) or eof:
+                    break
+                buffer = f.read(chunk_size)
+                position = 0
+                eof = not buffer
+            if position >= len(buffer):
+                raise ValueError(f"{path} ends in the middle of the JSON array")
+            
+            char = buffer[position]
+            if expected == '[':
+                if char != '[':
+                    raise ValueError(f"{path} does not hold a JSON array")
+                position += 1
+                expected = 'first item'
+            elif char == ']' and expected in ('first item', 'comma'):
+                return
+            elif expected == 'comma':
+                if char != ',':
+                    raise ValueError(f"Expected ',' between the items of {path}")
+                position += 1
+                expected = 'item'
+            else:
+                while True:
+                    try:
+                        item, end = decoder.raw_decode(buffer, position)
+                        # A number cut off by the end of the chunk may go on
+                        # in the next one
+                        if eof or (end < len(buffer) and buffer[end] in ' \t\r\n,]'):
+                            break
+                    except ValueError:
+                        if eof:
+                            raise
+                    more = f.read(chunk_size)
+                    eof = not more
+                    buffer = buffer[position:] + more
+                    position = 0
+                yield item
+                position = end
+                expected = 'comma'
+
+
+def iter_journal(path):
+    """Yield the entries of a journal file"""
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                # Only the last line can be cut short by a crash
+                continue
+
+
+def truncate_torn_line(path, chunk_size=1 << 16):
+    """Cut off a last line a crash left without its newline.
+    
+    iter_journal skips such a line, but an entry appended after it would
+    be glued onto it and skipped at the next load as well.
+    """
+    with open(path, 'rb+') as f:
+        end = f.seek(0, os.SEEK_END)
+        position = end
+        while position > 0:
+            start = max(0, position - chunk_size)
+            f.seek(start)
+            chunk = f.read(position - start)
+            if position == end and chunk.endswith(b'\n'):
+                return
+            newline = chunk.rfind(b'\n')
+            if newline >= 0:
+                f.truncate(start + newline + 1)
+                return
+            position = start
+        f.truncate(0)
+
+
+class Journal:
+    """Records keyed by id, kept as a JSON snapshot plus an append-only journal.
+    
+    Each change is appended to the journal as one JSON line, so saving costs
+    the same however many records there are. A background thread fsyncs
+    appends in batches and folds a long journal into a new snapshot, written
+    to a temporary file and renamed over the old one. load() replays the
+    snapshot and then the journal, skipping a last line cut off by a crash.
+    """
+    
+    def __init__(self, path):
+        self.path = path
+        self.journal_path = path + '.journal'
+        # Journal being folded into the snapshot by compact()
+        self.old_journal_path = self.journal_path + '.old'
+        self.records = {}
+        # Snapshot entries load() left out for not being records with an id
+        self.skipped = 0
+        self.file = None
+        self.entries = 0
+        self.unsynced = 0
+        self.lock = threading.Lock()
+        self.compact_lock = threading.Lock()
+        self.closed = threading.Event()
+        self.thread = None
+    
+    def load(self):
+        """Recover the records and open the journal for appending"""
+        self.records = {}
+        self.skipped = 0
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    for record in json.load(f):
+                        # One hand-edited entry shouldn't cost the rest
+                        if not isinstance(record, dict) or 'id' not in record:
+                            self.skipped += 1
+                            continue
+                        self.records[record['id']] = record
+            except (ValueError, KeyError, TypeError):
+                # Keep an unreadable snapshot rather than overwrite it at
+                # the next compaction
+                os.replace(self.path, self.path + '.corrupt')
+                print(f"Could not read {self.path}, kept it as {self.path}.corrupt")  # Debug print
+                self.records = {}
+        
+        interrupted = os.path.exists(self.old_journal_path)
+        self.entries = 0
+        for path in (self.old_journal_path, self.journal_path):
+            if os.path.exists(path):
+                self.entries += self._replay(path)
+        
+        if os.path.exists(self.journal_path):
+            truncate_torn_line(self.journal_path)
+        self.file = open(self.journal_path, 'a', encoding='utf-8')
+        if interrupted:
+            # Finish the compaction a crash cut short
+            self.compact()
+        
+        self.closed.clear()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self.records
+    
+    def put(self, record):
+        self.put_many([record])
+    
+    def put_many(self, records):
+        with self.lock:
+            entries = []
+            for record in records:
+                self.records[record['id']] = record
+                entries.append({'op': 'put', 'record': record})
+            self._append(entries)
+    
+    def delete(self, record_id):
+        self.delete_many([record_id])
+    
+    def delete_many(self, record_ids):
+        record_ids = list(record_ids)
+        with self.lock:
+            for record_id in record_ids:
+                self.records.pop(record_id, None)
+            self._append([{'op': 'delete', 'ids': record_ids}])
+    
+    def replace_all(self, records):
+        # Written straight to a new snapshot; the journal so far is obsolete
+        with self.lock:
+            self.records = {record['id']: record for record in records}
+        self.compact()
+    
+    def compact(self):
+        """Write the current records as the snapshot and start an empty journal"""
+        with self.compact_lock:
+            with self.lock:
+                if self.file is None:
+                    return
+                self._sync()
+                # Copied so changes made while the snapshot is written
+                # cannot end up in it half done
+                records = [dict(record) for record in self.records.values()]
+                
+                if os.path.exists(self.old_journal_path):
+                    # Left by an interrupted compaction: write the snapshot
+                    # before dropping either journal
+                    write_snapshot(self.path, records)
+                    self.file.close()
+                    self.file = open(self.journal_path, 'w', encoding='utf-8')
+                    self.entries = 0
+                    os.remove(self.old_journal_path)
+                    return
+                
+                # Appends go to a fresh journal from here on. The old one is
+                # only removed once a snapshot that includes it is on disk;
+                # replaying it again after a crash gives the same records.
+                self.file.close()
+                os.replace(self.journal_path, self.old_journal_path)
+                self.file = open(self.journal_path, 'w', encoding='utf-8')
+                self.entries = 0
+            
+            write_snapshot(self.path, records)
+            os.remove(self.old_journal_path)
+    
+    def sync(self):
+        with self.lock:
+            self._sync()
+    
+    def close(self):
+        """Stop the background thread and fsync everything written"""
+        self.closed.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        with self.lock:
+            if self.file is not None:
+                self._sync()
+                self.file.close()
+                self.file = None
+    
+    def _append(self, entries):
+        if not entries:
+            return
+        self.file.write(''.join(json.dumps(entry) + '\n' for entry in entries))
+        # Flushed to the OS on every change, so only a power cut can lose
+        # the entries written since the last fsync
+        self.file.flush()
+        self.entries += len(entries)
+        self.unsynced += len(entries)
+        if self.unsynced >= FSYNC_BATCH:
+            self._sync()
+    
+    def _sync(self):
+        if self.file is not None and self.unsynced:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.unsynced = 0
+    
+    def _replay(self, path):
+        count = 0
+        for entry in iter_journal(path):
+            if entry['op'] == 'put':
+                self.records[entry['record']['id']] = entry['record']
+            elif entry['op'] == 'delete':
+                for record_id in entry['ids']:
+                    self.records.pop(record_id, None)
+            count += 1
+        return count
+    
+    def _run(self):
+        while not self.closed.wait(FSYNC_INTERVAL):
+            try:
+                with self.lock:
+                    self._sync()
+                    due = self.entries > max(COMPACT_MIN_ENTRIES, len(self.records))
+                if due:
+                    self.compact()
+            except OSError as e:
+                print(f"Failed to save {self.path}: {str(e)}")  # Debug print
+
+
+class WriteBehindQueue:
+    """Writes changes to a storage on a worker thread, so callers return at once.
+    
+    Changes that arrive within WRITE_BEHIND_DELAY of each other are written
+    together, and only the latest change to each record is written.
+    open_writer() is called on the worker to open the storage it writes
+    through, because a SQLite connection belongs to the thread that opened
+    it. The outcome of every write, None or the exception, is put on the
+    written queue for the Tk thread to poll; the worker never calls Tkinter,
+    so flush() can safely be called from the Tk thread.
+    """
+    
+    def __init__(self, open_writer, delay=WRITE_BEHIND_DELAY):
+        self.open_writer = open_writer
+        self.delay = delay
+        # Latest change per key, in the order the keys last changed
+        self.pending = {}
+        self.writing = False
+        self.flushing = 0
+        self.closing = False
+        self.condition = threading.Condition()
+        self.written = queue.Queue()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+    
+    def upsert_many(self, records):
+        # Copied, so later edits to the caller's dicts are not written early
+        self._queue([(('record', r['id']), 'upsert_many', dict(r)) for r in records])
+    
+    def delete_many(self, record_ids):
+        self._queue([(('record', i), 'delete_many', i) for i in record_ids])
+    
+    def replace_all(self, records):
+        # Everything queued before would be overwritten anyway
+        records = [dict(r) for r in records]
+        self._queue([(('replace_all',), 'replace_all', (records,))], replace=True)
+    
+    def call(self, method, *args):
+        """Queue storage.method(*args); a repeat of the same call replaces it"""
+        self._queue([(('call', method, args), method, args)])
+    
+    def idle(self):
+        with self.condition:
+            return not self.pending and not self.writing
+    
+    def flush(self, timeout=None):
+        """Wait until everything queued so far is written; False on timeout"""
+        with self.condition:
+            if not self.thread.is_alive():
+                # Nothing is left to write it after close()
+                return not self.pending and not self.writing
+            self.flushing += 1
+            self.condition.notify_all()
+            try:
+                return self.condition.wait_for(lambda: not self.pending and not self.writing, timeout)
+            finally:
+                self.flushing -= 1
+    
+    def close(self):
+        """Write everything queued and stop the worker"""
+        with self.condition:
+            self.closing = True
+            self.condition.notify_all()
+        self.thread.join()
+    
+    def _queue(self, changes, replace=False):
+        with self.condition:
+            # The worker may already have stopped, and would never write it
+            if self.closing:
+                raise RuntimeError("Changes can't be queued after the write queue is closed")
+            if replace:
+                self.pending.clear()
+            for key, method, value in changes:
+                # Moved to the end, so changes are written in the order
+                # they were last made
+                self.pending.pop(key, None)
+                self.pending[key] = (method, value)
+            self.condition.notify_all()
+    
+    def _write(self, writer, changes):
+        # Runs of upserts or deletes become one upsert_many or delete_many
+        calls = []
+        for method, value in changes:
+            if method not in ('upsert_many', 'delete_many'):
+                calls.append((method, value))
+            elif calls and calls[-1][0] == method:
+                calls[-1][1][0].append(value)
+            else:
+                calls.append((method, ([value],)))
+        for method, args in calls:
+            getattr(writer, method)(*args)
+    
+    def _run(self):
+        writer = None
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.pending or self.closing)
+                # Give the rest of a burst time to arrive, unless someone
+                # is waiting for it
+                self.condition.wait_for(lambda: self.flushing or self.closing, self.delay)
+                if not self.pending:
+                    break
+                changes = list(self.pending.values())
+                self.pending.clear()
+                self.writing = True
+            
+            error = None
+            try:
+                if writer is None:
+                    writer = self.open_writer()
+                self._write(writer, changes)
+            except Exception as e:
+                error = e
+            self.written.put(error)
+            
+            with self.condition:
+                self.writing = False
+                self.condition.notify_all()
+        
+        if writer is not None:
+            writer.close()
@@ -0,0 +1,998 @@
+import argparse
+import csv
+import heapq
+import json
+import os
+import random
+import re
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta
+from itertools import islice
+
+from persistence import WriteBehindQueue, iter_journal, iter_json_array
+
+# Column and collation behind each treeview sort column. Ties are broken by
+# id, which keeps tasks with equal keys in the order they were added.
+TASK_SORT_KEYS = {
+    'status': ('completed', ''),
+    'task': ('text', ' COLLATE NOCASE'),
+    'date': ('date_added', ''),
+    'tags': ('tags', ' COLLATE NOCASE'),
+    'due': ('due', ''),
+}
+
+# Format of date_added and due dates. Dates in this format sort in time
+# order as plain strings.
+DATE_FORMAT = "%Y-%m-%d %H:%M"
+
+# How often a recurring task comes back
+RECURRENCE_RULES = ('daily', 'weekly', 'monthly', 'yearly')
+
+# Tasks written per transaction when importing tasks.json, and read or
+# written at a time by the command line
+MIGRATE_BATCH_SIZE = 5000
+
+# Task ids a TodoStore with queued writes reserves in the database at a
+# time, so adding a task does not wait for a write
+ID_BLOCK_SIZE = 50
+
+# Tasks between progress callbacks when exporting
+EXPORT_PROGRESS_EVERY = 10000
+
+# Search hits returned, best first
+SEARCH_LIMIT = 200
+
+# Only this many of the newest matches of a search are ranked, so a word
+# found in 100k tasks costs no more than a rare one. At least SEARCH_LIMIT.
+# Ranking every match instead, with bm25() in SQLite, takes about a second
+# for a common word in a million tasks, so search() says when it stopped.
+RANK_WINDOW = 500
+
+# Prefix lengths the search index keeps. A typed word up to the longest of
+# them is read from its own index; a longer one merges every word it starts.
+SEARCH_PREFIXES = '1 2 3 4 5 6'
+
+# Term frequency saturation and length normalization of the relevance score,
+# the usual BM25 values
+RELEVANCE_K1 = 1.2
+RELEVANCE_B = 0.75
+
+# Tasks in the database run_search_benchmark builds, and its queries
+BENCHMARK_TASKS = 1000000
+BENCHMARK_QUERIES = ['invoice', 'pay rent', 'work', 'p', 'groc', 'invoice client', 'meeting boss review']
+
+
+def normalize_tags(text):
+    """Comma-separated tags without blanks or repeats, in the order given"""
+    tags = []
+    for tag in (text or '').split(','):
+        tag = tag.strip()
+        if tag and tag.casefold() not in (t.casefold() for t in tags):
+            tags.append(tag)
+    return ', '.join(tags)
+
+
+def parse_due(text):
+    """Due date from "YYYY-MM-DD HH:MM" or "YYYY-MM-DD" (end of that day).
+    
+    Returns '' for blank text and raises ValueError for anything else.
+    """
+    text = (text or '').strip()
+    if not text:
+        return ''
+    try:
+        return datetime.strptime(text, DATE_FORMAT).strftime(DATE_FORMAT)
+    except ValueError:
+        return datetime.strptime(text, "%Y-%m-%d").strftime("%Y-%m-%d 23:59")
+
+
+def add_months(when, months):
+    # The 31st becomes the last day of shorter months
+    month = when.month - 1 + months
+    year, month = when.year + month // 12, month % 12 + 1
+    for day in range(when.day, 27, -1):
+        try:
+            return when.replace(year=year, month=month, day=day)
+        except ValueError:
+            continue
+    return when.replace(year=year, month=month)
+
+
+def recurrence_due(due, rule, count):
+    """The due date count repeats of rule after due"""
+    if rule == 'daily':
+        return due + timedelta(days=count)
+    if rule == 'weekly':
+        return due + timedelta(weeks=count)
+    if rule == 'monthly':
+        return add_months(due, count)
+    if rule == 'yearly':
+        return add_months(due, 12 * count)
+    raise ValueError(f"Unknown recurrence: {rule}")
+
+
+def next_occurrence(task, now=None):
+    """The task that follows a recurring task once it is completed, or None.
+    
+    The due date moves on by the task's rule until it is in the future, so
+    a daily task left alone for a week comes back once, not seven times.
+    The new task has no id yet.
+    """
+    if not task.get('recurrence') or not task.get('due'):
+        return None
+    now = now or datetime.now()
+    due = datetime.fromisoformat(task['due'])
+    count = 1
+    while recurrence_due(due, task['recurrence'], count) <= now:
+        count += 1
+    return dict(task, completed=False, date_added=now.strftime(DATE_FORMAT),
+                due=recurrence_due(due, task['recurrence'], count).strftime(DATE_FORMAT))
+
+
+def reminder_time(task):
+    """When to remind about a task, as a DATE_FORMAT string, or None"""
+    if not task.get('due') or task.get('remind_minutes') is None:
+        return None
+    # fromisoformat and isoformat read and write DATE_FORMAT many times
+    # faster than strptime and strftime, which adds up over 100k tasks
+    due = datetime.fromisoformat(task['due'])
+    return (due - timedelta(minutes=task['remind_minutes'])).isoformat(' ', 'minutes')
+
+
+def order_by(sort_column, reverse=False):
+    direction = "DESC" if reverse else "ASC"
+    if sort_column is None:
+        return f"id {direction}"
+    column, collate = TASK_SORT_KEYS[sort_column]
+    return f"{column}{collate} {direction}, id {direction}"
+
+
+def relevance(hits, prefixes):
+    """BM25-style scores for tasks that matched every one of prefixes.
+    
+    Each prefix scores the words of a task that start with it, so repeats
+    add less and less and long tasks count for less. bm25() in SQLite also
+    weighs each word by how rare it is, which means counting all its
+    matches; here every word weighs the same, so only the hits are read.
+    """
+    # Words separated by single spaces, with one in front, so ' ' + prefix
+    # counts the words starting with prefix
+    texts = [' ' + ' '.join(re.findall(r'\w+', f"{task['text']} {task['tags']}".lower())) for task in hits]
+    lengths = [text.count(' ') for text in texts]
+    average = sum(lengths) / max(len(lengths), 1) or 1
+    prefixes = [' ' + prefix for prefix in prefixes]
+    scores = []
+    for text, length in zip(texts, lengths):
+        norm = RELEVANCE_K1 * (1 - RELEVANCE_B + RELEVANCE_B * length / average)
+        score = 0.0
+        for prefix in prefixes:
+            count = text.count(prefix)
+            score += count * (RELEVANCE_K1 + 1) / (count + norm)
+        scores.append(score)
+    return scores
+
+
+def batched(records, size):
+    """Yield lists of up to size records"""
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class DeadlineQueue:
+    """Due dates and reminders of pending tasks in a min-heap.
+    
+    Only the earliest deadline is ever looked at, so a timer for it is all
+    the scheduling needed however many tasks have one. When a task changes,
+    new entries are pushed and the old ones are left in the heap; they are
+    dropped when they reach the top and no longer match the task.
+    """
+    
+    def __init__(self):
+        self.heap = []
+        # (due, reminder time) of every pending task that has a due date
+        self.current = {}
+    
+    def __len__(self):
+        return len(self.current)
+    
+    def load(self, tasks, now, reminded_until=''):
+        """Start over with tasks. Due dates already passed are left out, and
+        so are reminders at or before reminded_until."""
+        self.heap = []
+        self.current = {}
+        for task in tasks:
+            self.heap += self._entries(task, now, reminded_until)
+        heapq.heapify(self.heap)
+    
+    def update(self, task, now):
+        # Only deadlines still ahead are pushed, so a change that leaves
+        # the deadlines alone does not fire them again
+        old = self.current.pop(task['id'], None)
+        for entry in self._entries(task, now, now, old):
+            heapq.heappush(self.heap, entry)
+    
+    def remove(self, task_id):
+        self.current.pop(task_id, None)
+    
+    def next_deadline(self):
+        """The earliest deadline as a DATE_FORMAT string, or None"""
+        while self.heap and not self._is_current(self.heap[0]):
+            heapq.heappop(self.heap)
+        return self.heap[0][0] if self.heap else None
+    
+    def pop_due(self, now):
+        """Remove the deadlines up to now and return their (kind, task_id).
+        
+        kind is 'remind' or 'due'.
+        """
+        fired = []
+        while self.heap and self.heap[0][0] <= now:
+            entry = heapq.heappop(self.heap)
+            if self._is_current(entry) and (entry[1], entry[2]) not in fired:
+                fired.append((entry[1], entry[2]))
+        return fired
+    
+    def _entries(self, task, now, reminded_until, old=None):
+        # Records the task's deadlines and returns the heap entries to add
+        if task['completed'] or not task.get('due'):
+            return []
+        deadlines = (task['due'], reminder_time(task))
+        self.current[task['id']] = deadlines
+        if deadlines == old:
+            return []
+        entries = []
+        if deadlines[0] > now:
+            entries.append((deadlines[0], 'due', task['id']))
+        if deadlines[1] is not None and deadlines[1] > reminded_until:
+            entries.append((deadlines[1], 'remind', task['id']))
+        return entries
+    
+    def _is_current(self, entry):
+        when, kind, task_id = entry
+        deadlines = self.current.get(task_id)
+        return deadlines is not None and deadlines[0 if kind == 'due' else 1] == when
+
+
+class SQLiteTaskStorage:
+    """Keeps tasks in a SQLite database with one row per task"""
+    
+    COLUMNS = ('id', 'text', 'completed', 'date_added', 'tags', 'due', 'remind_minutes', 'recurrence')
+    
+    def __init__(self, path='tasks.db'):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        with self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS tasks (
+                    id INTEGER PRIMARY KEY,
+                    text TEXT NOT NULL,
+                    completed INTEGER NOT NULL DEFAULT 0,
+                    date_added TEXT,
+                    tags TEXT NOT NULL DEFAULT ''
+                )""")
+            # Databases created before tasks had tags or due dates. A due
+            # date of '' means none; remind_minutes is how long before the
+            # due date to remind, NULL for no reminder.
+            columns = {row[1] for row in self.conn.execute("PRAGMA table_info(tasks)")}
+            for column, definition in (('tags', "TEXT NOT NULL DEFAULT ''"), ('due', "TEXT NOT NULL DEFAULT ''"),
+                                       ('remind_minutes', "INTEGER"),
+                                       ('recurrence', "TEXT NOT NULL DEFAULT ''")):
+                if column not in columns:
+                    self.conn.execute(f"ALTER TABLE tasks ADD COLUMN {column} {definition}")
+            # The filters read tasks of one status in id order; the others
+            # let each page of a sorted list start with an index seek
+            self.conn.execute("CREATE INDEX IF NOT EXISTS tasks_completed ON tasks (completed, id)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS tasks_date_added ON tasks (date_added)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS tasks_completed_date ON tasks (completed, date_added)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS tasks_text ON tasks (text COLLATE NOCASE)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS tasks_completed_text ON tasks (completed, text COLLATE NOCASE)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS tasks_tags ON tasks (tags COLLATE NOCASE)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS tasks_completed_tags ON tasks (completed, tags COLLATE NOCASE)")
+            # The second one also finds the pending tasks with a due date
+            self.conn.execute("CREATE INDEX IF NOT EXISTS tasks_due ON tasks (due)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS tasks_completed_due ON tasks (completed, due)")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER)")
+            
+            # Running totals per status for the status bar, kept by triggers
+            # so they never need a COUNT over the whole table
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS task_counts (
+                    completed INTEGER PRIMARY KEY,
+                    total INTEGER NOT NULL
+                )""")
+            self.conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS tasks_count_insert AFTER INSERT ON tasks BEGIN
+                    INSERT INTO task_counts (completed, total) VALUES (NEW.completed, 1)
+                    ON CONFLICT (completed) DO UPDATE SET total = total + 1;
+                END""")
+            self.conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS tasks_count_delete AFTER DELETE ON tasks BEGIN
+                    UPDATE task_counts SET total = total - 1 WHERE completed = OLD.completed;
+                END""")
+            self.conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS tasks_count_update AFTER UPDATE OF completed ON tasks
+                WHEN OLD.completed != NEW.completed BEGIN
+                    UPDATE task_counts SET total = total - 1 WHERE completed = OLD.completed;
+                    INSERT INTO task_counts (completed, total) VALUES (NEW.completed, 1)
+                    ON CONFLICT (completed) DO UPDATE SET total = total + 1;
+                END""")
+        
+        self.has_fts = self._create_search_index()
+    
+    def _create_search_index(self):
+        """Full-text index over task text and tags, kept in step by triggers.
+        
+        Returns False if this SQLite was built without FTS5; search then
+        falls back to LIKE.
+        """
+        row = self.conn.execute("SELECT sql FROM sqlite_master WHERE name = 'tasks_fts'").fetchone()
+        exists = row is not None and f"prefix='{SEARCH_PREFIXES}'" in row[0]
+        try:
+            with self.conn:
+                if row is not None and not exists:
+                    # Built with other prefix lengths; the triggers stay and
+                    # write to the new table
+                    self.conn.execute("DROP TABLE tasks_fts")
+                # External content: the index stores only the tokens and
+                # reads text back from the tasks table. Prefix indexes make
+                # the short, half-typed words of a search as fast as whole ones.
+                self.conn.execute(f"""
+                    CREATE VIRTUAL TABLE IF NOT EXISTS tasks_fts USING fts5(
+                        text, tags, content='tasks', content_rowid='id', prefix='{SEARCH_PREFIXES}'
+                    )""")
+                self.conn.execute("""
+                    CREATE TRIGGER IF NOT EXISTS tasks_fts_insert AFTER INSERT ON tasks BEGIN
+                        INSERT INTO tasks_fts (rowid, text, tags) VALUES (NEW.id, NEW.text, NEW.tags);
+                    END""")
+                self.conn.execute("""
+                    CREATE TRIGGER IF NOT EXISTS tasks_fts_delete AFTER DELETE ON tasks BEGIN
+                        INSERT INTO tasks_fts (tasks_fts, rowid, text, tags)
+                        VALUES ('delete', OLD.id, OLD.text, OLD.tags);
+                    END""")
+                self.conn.execute("""
+                    CREATE TRIGGER IF NOT EXISTS tasks_fts_update AFTER UPDATE OF text, tags ON tasks BEGIN
+                        INSERT INTO tasks_fts (tasks_fts, rowid, text, tags)
+                        VALUES ('delete', OLD.id, OLD.text, OLD.tags);
+                        INSERT INTO tasks_fts (rowid, text, tags) VALUES (NEW.id, NEW.text, NEW.tags);
+                    END""")
+                if not exists:
+                    # Index the tasks saved before the index existed
+                    self.conn.execute("INSERT INTO tasks_fts (tasks_fts) VALUES ('rebuild')")
+        except sqlite3.OperationalError:
+            return False
+        return True
+    
+    def count(self, completed=None):
+        if completed is None:
+            row = self.conn.execute("SELECT SUM(total) FROM task_counts").fetchone()
+        else:
+            row = self.conn.execute("SELECT total FROM task_counts WHERE completed = ?",
+                                    (int(completed),)).fetchone()
+        return (row[0] or 0) if row else 0
+    
+    def query(self, completed=None, sort_column=None, reverse=False, limit=None, after=None):
+        """Tasks with the given status (all if None), sorted in SQL.
+        
+        Pages are read with limit and after, the last task of the page
+        before. A page starts where the previous one ended instead of
+        skipping an OFFSET, so page 1000 costs the same as page 1.
+        """
+        conditions = []
+        params = []
+        if completed is not None:
+            conditions.append("completed = ?")
+            params.append(int(completed))
+        if after is not None:
+            greater, at_least = ('<', '<=') if reverse else ('>', '>=')
+            if sort_column is None:
+                conditions.append(f"id {greater} ?")
+                params.append(after['id'])
+            else:
+                column, collate = TASK_SORT_KEYS[sort_column]
+                value = int(after[column]) if column == 'completed' else after[column]
+                # Written out so SQLite can seek the column's index
+                conditions.append(f"{column} {at_least} ?{collate} AND ({column} {greater} ?{collate} OR id {greater} ?)")
+                params += [value, value, after['id']]
+        
+        sql = f"SELECT {', '.join(self.COLUMNS)} FROM tasks"
+        if conditions:
+            sql += f" WHERE {' AND '.join(conditions)}"
+        sql += f" ORDER BY {order_by(sort_column, reverse)}"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return [self._task(row) for row in self.conn.execute(sql, params)]
+    
+    def search(self, text, completed=None, sort_column=None, reverse=False, limit=SEARCH_LIMIT):
+        """Up to limit tasks matching every word of text, best match first.
+        
+        Each word also matches longer words starting with it. The newest
+        RANK_WINDOW hits with the wanted status are ranked by relevance(),
+        then sorted by sort_column if one is given. Returns (tasks, limited),
+        where limited says older matches were left out of the ranking.
+        """
+        words = re.findall(r'\w+', text)
+        if not words:
+            return [], False
+        
+        columns = ', '.join(f"t.{c}" for c in self.COLUMNS)
+        status = "" if completed is None else "AND t.completed = ?"
+        status_params = [] if completed is None else [int(completed)]
+        if self.has_fts:
+            # Quoted so words like AND or NOT are not read as operators
+            match = ' '.join(f'"{word}"*' for word in words)
+            # Newest first, so the index stops reading once the window is
+            # full. CROSS JOIN keeps the index as the outer loop.
+            window = (f"SELECT {columns} FROM tasks_fts CROSS JOIN tasks t ON t.id = tasks_fts.rowid "
+                      f"WHERE tasks_fts MATCH ? {status} ORDER BY tasks_fts.rowid DESC LIMIT ?")
+            window_size = max(RANK_WINDOW, limit)
+            hits = [self._task(row) for row in self.conn.execute(window, [match] + status_params + [window_size])]
+            limited = len(hits) == window_size
+            scores = relevance(hits, [word.lower() for word in words])
+            # sorted is stable, so equal scores stay newest first
+            hits = [task for _, task in sorted(zip(scores, hits), key=lambda pair: -pair[0])][:limit]
+            if not sort_column or not hits:
+                return hits, limited
+            cursor = self.conn.execute(
+                f"SELECT {', '.join(self.COLUMNS)} FROM tasks WHERE id IN ({', '.join('?' * len(hits))}) "
+                f"ORDER BY {order_by(sort_column, reverse)}", [task['id'] for task in hits])
+            return [self._task(row) for row in cursor], limited
+        else:
+            # No ranking without FTS5: newest matching tasks first
+            conditions = ' AND '.join(r"(t.text LIKE ? ESCAPE '\' OR t.tags LIKE ? ESCAPE '\')" for _ in words)
+            ranked = (f"SELECT {columns}, -t.id AS score FROM tasks t "
+                      f"WHERE {conditions} {status} ORDER BY t.id DESC LIMIT ?")
+            params = []
+            for word in words:
+                pattern = '%' + word.replace('_', '\\_') + '%'
+                params += [pattern, pattern]
+            params += status_params + [limit]
+        
+        order = order_by(sort_column, reverse) if sort_column else "score"
+        cursor = self.conn.execute(
+            f"SELECT {', '.join(self.COLUMNS)} FROM ({ranked}) ORDER BY {order}", params)
+        return [self._task(row) for row in cursor], False
+    
+    def get(self, task_id):
+        row = self.conn.execute(f"SELECT {', '.join(self.COLUMNS)} FROM tasks WHERE id = ?",
+                                (task_id,)).fetchone()
+        return self._task(row) if row else None
+    
+    def get_range(self, first, last):
+        """Tasks with ids from first to last, in id order"""
+        cursor = self.conn.execute(f"SELECT {', '.join(self.COLUMNS)} FROM tasks WHERE id BETWEEN ? AND ? "
+                                   f"ORDER BY id", (first, last))
+        return [self._task(row) for row in cursor]
+    
+    def upsert(self, task):
+        self.upsert_many([task])
+    
+    def upsert_many(self, tasks):
+        with self.conn:
+            self._upsert_many(tasks)
+    
+    def delete_many(self, task_ids):
+        with self.conn:
+            self.conn.executemany("DELETE FROM tasks WHERE id = ?", [(i,) for i in task_ids])
+    
+    def set_completed(self, task_ids, completed):
+        """Mark many tasks completed or pending in one transaction"""
+        with self.conn:
+            self.conn.executemany("UPDATE tasks SET completed = ? WHERE id = ?",
+                                  [(int(completed), i) for i in task_ids])
+    
+    def set_tags(self, task_ids, tags):
+        with self.conn:
+            self.conn.executemany("UPDATE tasks SET tags = ? WHERE id = ?", [(tags, i) for i in task_ids])
+    
+    def delete_completed(self):
+        with self.conn:
+            return self.conn.execute("DELETE FROM tasks WHERE completed = 1").rowcount
+    
+    def next_id(self):
+        # The highest id ever handed out is kept in meta, so ids of deleted
+        # tasks are never reused
+        stored = self.conn.execute("SELECT value FROM meta WHERE key = 'next_id'").fetchone()
+        highest = self.conn.execute("SELECT MAX(id) FROM tasks").fetchone()[0]
+        return max(stored[0] if stored else 1, (highest or 0) + 1)
+    
+    def allocate_ids(self, count=1):
+        """Reserve count consecutive ids and return the first one.
+        
+        Reserved ids are never handed out again, even if the tasks are
+        never saved.
+        """
+        with self.conn:
+            first = self.next_id()
+            self._bump_next_id(first + count)
+        return first
+    
+    def pending_with_due_dates(self):
+        """Pending tasks that have a due date, for a DeadlineQueue"""
+        cursor = self.conn.execute(
+            f"SELECT {', '.join(self.COLUMNS)} FROM tasks WHERE completed = 0 AND due > ''")
+        return [self._task(row) for row in cursor]
+    
+    def reminded_until(self):
+        """Reminders at or before this time have been shown"""
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'reminded_until'").fetchone()
+        return row[0] if row else ''
+    
+    def set_reminded_until(self, when):
+        with self.conn:
+            self.conn.execute("INSERT INTO meta (key, value) VALUES ('reminded_until', ?) "
+                              "ON CONFLICT (key) DO UPDATE SET value = MAX(value, excluded.value)", (when,))
+    
+    def is_empty(self):
+        return self.conn.execute("SELECT 1 FROM tasks LIMIT 1").fetchone() is None
+    
+    def close(self):
+        self.conn.close()
+    
+    def needs_migration(self, json_path='tasks.json'):
+        """Whether tasks.json still has to be imported, or finishing after a crash"""
+        journal_path = json_path + '.journal'
+        if not any(os.path.exists(p) for p in (json_path, journal_path, journal_path + '.old')):
+            return False
+        started = self.conn.execute("SELECT 1 FROM meta WHERE key = 'migrating'").fetchone()
+        return started is not None or self.is_empty()
+    
+    def migrate_from_json(self, json_path='tasks.json', progress=None):
+        """Import an old tasks.json (and its journal) and keep them as .migrated backups.
+        
+        The file is parsed and written in batches of MIGRATE_BATCH_SIZE, so
+        the tasks imported so far can be read while the rest is on its way.
+        progress is called with the number of tasks imported after each
+        batch. Returns (imported, skipped). Rows that can't be stored are
+        skipped rather than stopping the import, and stay in the backup.
+        """
+        if not self.needs_migration(json_path):
+            return 0, 0
+        journal_paths = [p for p in (json_path + '.journal.old', json_path + '.journal') if os.path.exists(p)]
+        
+        # Marks the import as unfinished until the last step, so it is
+        # picked up again after a crash
+        with self.conn:
+            self.conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('migrating', 1)")
+        
+        # Old versions numbered tasks len(tasks) + 1, which repeats ids after
+        # a delete. Repeats are kept aside and given new ids at the end.
+        count = skipped = 0
+        seen = set()
+        repeats = []
+        if os.path.exists(json_path):
+            for batch in batched(iter_json_array(json_path), MIGRATE_BATCH_SIZE):
+                unique = []
+                for task in batch:
+                    if not self._is_storable(task):
+                        skipped += 1
+                    elif task['id'] in seen:
+                        repeats.append(task)
+                    else:
+                        seen.add(task['id'])
+                        unique.append(task)
+                with self.conn:
+                    self._upsert_many(unique)
+                count += len(unique)
+                if progress:
+                    progress(count)
+        
+        # Repeats, the journal and the end of the import go in together
+        with self.conn:
+            first = self.next_id()
+            for i, task in enumerate(repeats):
+                task['id'] = first + i
+            self._upsert_many(repeats)
+            for path in journal_paths:
+                for entry in iter_journal(path):
+                    if entry.get('op') == 'put':
+                        if self._is_storable(entry.get('record')):
+                            self._upsert_many([entry['record']])
+                        else:
+                            skipped += 1
+                    elif entry['op'] == 'delete':
+                        self.conn.executemany("DELETE FROM tasks WHERE id = ?", [(i,) for i in entry['ids']])
+            self.conn.execute("DELETE FROM meta WHERE key = 'migrating'")
+        count = self.count()
+        
+        for path in [json_path] + journal_paths:
+            if os.path.exists(path):
+                os.replace(path, path + '.migrated')
+        if progress:
+            progress(count)
+        return count, skipped
+    
+    def _is_storable(self, task):
+        # An integer id and text, and text, nothing or a plain value in
+        # the other columns
+        if not isinstance(task, dict) or type(task.get('id')) is not int or not isinstance(task.get('text'), str):
+            return False
+        if any(not isinstance(task.get(c) or '', str) for c in ('date_added', 'tags', 'due', 'recurrence')):
+            return False
+        return task.get('remind_minutes') is None or type(task['remind_minutes']) is int
+    
+    def _upsert_many(self, tasks):
+        tasks = list(tasks)
+        if not tasks:
+            return
+        self.conn.executemany(
+            "INSERT INTO tasks (id, text, completed, date_added, tags, due, remind_minutes, recurrence) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (id) DO UPDATE SET text = excluded.text, completed = excluded.completed, "
+            "date_added = excluded.date_added, tags = excluded.tags, due = excluded.due, "
+            "remind_minutes = excluded.remind_minutes, recurrence = excluded.recurrence",
+            [(t['id'], t['text'], int(bool(t.get('completed'))), t.get('date_added', ''), t.get('tags', ''), t.get('due', ''),
+              t.get('remind_minutes'), t.get('recurrence', '')) for t in tasks])
+        self._bump_next_id(max(t['id'] for t in tasks) + 1)
+    
+    def _bump_next_id(self, next_id):
+        self.conn.execute(
+            "INSERT INTO meta (key, value) VALUES ('next_id', ?) "
+            "ON CONFLICT (key) DO UPDATE SET value = MAX(value, excluded.value)",
+            (next_id,))
+    
+    def _task(self, row):
+        task = dict(zip(self.COLUMNS, row))
+        task['completed'] = bool(task['completed'])
+        return task
+
+
+def parse_id_ranges(text):
+    """(first, last) pairs from ids and ranges like "3", "10-20" or "1-5,9" """
+    ranges = []
+    for part in text.split(','):
+        first, dash, last = part.strip().partition('-')
+        if not first.isdigit() or (dash and not last.isdigit()):
+            raise ValueError(f"Not a task id or id range: {part}")
+        ranges.append((int(first), int(last) if dash else int(first)))
+    return ranges
+
+
+def write_tasks_file(f, tasks, file_format='json', progress=None):
+    """Write tasks to an open file as a JSON array or CSV and return the count.
+    
+    The JSON has the same shape as the old tasks.json, so it can be
+    migrated back in.
+    """
+    count = 0
+    if file_format == 'csv':
+        writer = csv.writer(f)
+        writer.writerow(SQLiteTaskStorage.COLUMNS)
+        for task in tasks:
+            writer.writerow(['' if task[c] is None else task[c] for c in SQLiteTaskStorage.COLUMNS])
+            count += 1
+            if progress and count % EXPORT_PROGRESS_EVERY == 0:
+                progress(count)
+        return count
+    
+    f.write('[')
+    for task in tasks:
+        f.write(('\n' if count == 0 else ',\n') + json.dumps(task))
+        count += 1
+        if progress and count % EXPORT_PROGRESS_EVERY == 0:
+            progress(count)
+    f.write('\n]\n')
+    return count
+
+
+class TodoStore:
+    """Tasks with their ids, recurrence and deadlines, without any Tkinter.
+    
+    The GUI and the command line both work through this. Reads go straight
+    to the database. Changes are written before a call returns or, with
+    write_behind set, queued for a WriteBehindQueue and written on its
+    worker thread while the call returns at once.
+    """
+    
+    def __init__(self, path='tasks.db', write_behind=False):
+        self.path = path
+        self.storage = SQLiteTaskStorage(path)
+        if write_behind and path != ':memory:':
+            # The writer thread saves through its own connection
+            self.writes = WriteBehindQueue(lambda: SQLiteTaskStorage(path))
+        else:
+            # Another connection to :memory: would be a different database,
+            # and sharing this one would mix the writer's transactions with
+            # ours, so an in-memory store is written directly
+            self.writes = None
+        
+        # Ids reserved in the database but not handed out yet
+        self.next_task_id = 0
+        self.id_limit = 0
+        
+        # Due dates and reminders of pending tasks, once load_deadlines()
+        # has been called
+        self.deadlines = DeadlineQueue()
+    
+    def count(self, completed=None):
+        return self.storage.count(completed)
+    
+    def query(self, completed=None, sort_column=None, reverse=False, limit=None, after=None):
+        return self.storage.query(completed, sort_column, reverse, limit, after)
+    
+    def iter_tasks(self, completed=None, sort_column=None, reverse=False):
+        """Yield every task with the given status, read a page at a time"""
+        after = None
+        while True:
+            page = self.storage.query(completed, sort_column, reverse, limit=MIGRATE_BATCH_SIZE, after=after)
+            yield from page
+            if len(page) < MIGRATE_BATCH_SIZE:
+                return
+            after = page[-1]
+    
+    def search(self, text, completed=None, sort_column=None, reverse=False, limit=SEARCH_LIMIT):
+        return self.storage.search(text, completed, sort_column, reverse, limit)
+    
+    def get(self, task_id):
+        return self.storage.get(task_id)
+    
+    def get_range(self, first, last):
+        return self.storage.get_range(first, last)
+    
+    def add(self, text, **fields):
+        return self.add_many([dict(fields, text=text)])[0]
+    
+    def add_many(self, records):
+        """Add tasks from dicts with at least a text and return them.
+        
+        A blank text raises ValueError and nothing is added.
+        """
+        now = datetime.now().strftime(DATE_FORMAT)
+        tasks = []
+        for record in records:
+            text = (record.get('text') or '').strip()
+            if not text:
+                raise ValueError("Please enter a task!")
+            tasks.append({
+                'text': text,
+                'completed': bool(record.get('completed')),
+                'date_added': record.get('date_added') or now,
+                'tags': normalize_tags(record.get('tags')),
+                'due': record.get('due') or '',
+                'remind_minutes': record.get('remind_minutes'),
+                'recurrence': record.get('recurrence') or ''
+            })
+        self._give_ids(tasks)
+        self._save(tasks)
+        return tasks
+    
+    def update_many(self, tasks, **fields):
+        """Save tasks with fields changed and return them"""
+        if 'tags' in fields:
+            fields['tags'] = normalize_tags(fields['tags'])
+        tasks = [dict(task, **fields) for task in tasks]
+        self._save(tasks)
+        return tasks
+    
+    def set_completed(self, tasks, completed=True):
+        """Mark tasks completed or pending and return every task saved.
+        
+        Completing a recurring task adds its next occurrence, which
+        carries the series on; the completed task stops repeating.
+        """
+        tasks = [dict(task, completed=completed) for task in tasks if task['completed'] != completed]
+        if completed:
+            following = []
+            for task in tasks:
+                occurrence = next_occurrence(task)
+                if occurrence is not None:
+                    task['recurrence'] = ''
+                    following.append(occurrence)
+            self._give_ids(following)
+            tasks += following
+        self._save(tasks)
+        return tasks
+    
+    def delete_many(self, task_ids):
+        task_ids = list(task_ids)
+        self._write('delete_many', task_ids)
+        for task_id in task_ids:
+            self.deadlines.remove(task_id)
+    
+    def delete_completed(self):
+        # Completed tasks have no deadlines to drop
+        self._write('delete_completed')
+    
+    def load_deadlines(self):
+        """Fill the deadline queue from the database.
+        
+        Reminders missed while nothing was running are kept, so they come
+        up straight away.
+        """
+        self.deadlines.load(self.storage.pending_with_due_dates(), datetime.now().strftime(DATE_FORMAT),
+                            self.storage.reminded_until())
+    
+    def next_deadline(self):
+        return self.deadlines.next_deadline()
+    
+    def pop_deadlines(self, now):
+        """The (kind, task_id) deadlines up to now; see DeadlineQueue.pop_due.
+        
+        Reminders returned here are recorded as shown.
+        """
+        fired = self.deadlines.pop_due(now)
+        if any(kind == 'remind' for kind, task_id in fired):
+            self._write('set_reminded_until', now)
+        return fired
+    
+    def needs_migration(self, json_path='tasks.json'):
+        return self.storage.needs_migration(json_path)
+    
+    def migrate_from_json(self, json_path='tasks.json', progress=None):
+        return self.storage.migrate_from_json(json_path, progress)
+    
+    def export_file(self, path, progress=None):
+        """Write every task to a .csv file, or a JSON file otherwise, and return the count"""
+        file_format = 'csv' if path.lower().endswith('.csv') else 'json'
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            return write_tasks_file(f, self.iter_tasks(), file_format, progress)
+    
+    def flush(self):
+        """Wait until every queued change is written"""
+        if self.writes is not None:
+            self.writes.flush()
+    
+    def close(self):
+        if self.writes is not None:
+            self.writes.close()
+        self.storage.close()
+    
+    def _give_ids(self, tasks):
+        # Queued writes reserve ids ID_BLOCK_SIZE at a time, so adding a
+        # task from the Tk thread rarely waits for the database
+        count = len(tasks)
+        if self.next_task_id + count > self.id_limit:
+            block = max(count, ID_BLOCK_SIZE) if self.writes is not None else count
+            self.next_task_id = self.storage.allocate_ids(block)
+            self.id_limit = self.next_task_id + block
+        for task in tasks:
+            task['id'] = self.next_task_id
+            self.next_task_id += 1
+    
+    def _save(self, tasks):
+        if not tasks:
+            return
+        self._write('upsert_many', tasks)
+        now = datetime.now().strftime(DATE_FORMAT)
+        for task in tasks:
+            self.deadlines.update(task, now)
+    
+    def _write(self, method, *args):
+        if self.writes is None:
+            getattr(self.storage, method)(*args)
+        elif method in ('upsert_many', 'delete_many'):
+            getattr(self.writes, method)(*args)
+        else:
+            self.writes.call(method, *args)
+
+
+def run_search_benchmark(path, size=BENCHMARK_TASKS):
+    """Time searches on a database of generated tasks, building it first if needed"""
+    store = TodoStore(path)
+    try:
+        if store.count() < size:
+            words = ("pay rent bills call mom buy milk eggs bread fix bike car report email boss team meeting "
+                     "review code plan trip book flight hotel clean kitchen garage laundry write essay read "
+                     "study exam gym run walk dog water plants order parts update resume apply job schedule "
+                     "dentist doctor pick kids school groceries cook dinner prepare slides send invoice client "
+                     "project deadline budget taxes file").split()
+            tags = ['', 'work', 'home', 'work, urgent', 'errand']
+            rng = random.Random(1)
+            records = ({'text': ' '.join(rng.choices(words, k=rng.randint(3, 7))), 'tags': rng.choice(tags),
+                        'completed': rng.random() < 0.5} for _ in range(size - store.count()))
+            for batch in batched(records, MIGRATE_BATCH_SIZE * 10):
+                store.add_many(batch)
+                print(f"\r{store.count()} tasks", end='', file=sys.stderr)
+            print(file=sys.stderr)
+        
+        print(f"Search over {store.count()} tasks (median and slowest of 5 runs):")
+        for query in BENCHMARK_QUERIES:
+            for status, completed in (('all', None), ('completed', True), ('pending', False)):
+                times = []
+                for _ in range(6):
+                    start = time.perf_counter()
+                    found, _ = store.search(query, completed)
+                    times.append(time.perf_counter() - start)
+                # The first run warms the page cache
+                times = sorted(times[1:])
+                print(f"  {query!r:22} {status:9} {len(found):4} hits "
+                      f"{times[2] * 1000:6.1f} ms {times[-1] * 1000:6.1f} ms")
+    finally:
+        store.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage tasks without the GUI")
+    parser.add_argument('--db', help="SQLite database to use (default: tasks.db)")
+    commands = parser.add_subparsers(dest='command', required=True)
+    
+    add_parser = commands.add_parser('add', help="add one task per line of standard input")
+    add_parser.add_argument('--tags', default='', help="comma-separated tags for every task")
+    add_parser.add_argument('--due', default='', help="due date, YYYY-MM-DD or YYYY-MM-DD HH:MM")
+    add_parser.add_argument('--repeat', choices=RECURRENCE_RULES, help="make the tasks recurring (needs --due)")
+    
+    list_parser = commands.add_parser('list', help="print tasks, one per line")
+    list_parser.add_argument('--status', choices=('all', 'pending', 'completed'), default='all')
+    list_parser.add_argument('--search', help="only tasks matching these words, best match first")
+    list_parser.add_argument('--sort', choices=sorted(TASK_SORT_KEYS))
+    list_parser.add_argument('--reverse', action='store_true')
+    list_parser.add_argument('--limit', type=int)
+    
+    complete_parser = commands.add_parser('complete', help="mark tasks complete by id, e.g. 7 10-20 3,5")
+    complete_parser.add_argument('ids', nargs='+')
+    complete_parser.add_argument('--undo', action='store_true', help="mark them pending again")
+    
+    export_parser = commands.add_parser('export', help="write every task to a JSON or CSV file")
+    export_parser.add_argument('path')
+    
+    benchmark_parser = commands.add_parser('benchmark', help="time searches on a large generated database")
+    benchmark_parser.add_argument('path', nargs='?', default='search_benchmark.db')
+    benchmark_parser.add_argument('--tasks', type=int, default=BENCHMARK_TASKS)
+    
+    args = parser.parse_args()
+    if args.command == 'benchmark':
+        run_search_benchmark(args.path, args.tasks)
+        return
+    
+    try:
+        due = parse_due(getattr(args, 'due', ''))
+        ranges = [r for ids in getattr(args, 'ids', []) for r in parse_id_ranges(ids)]
+    except ValueError as e:
+        parser.error(str(e))
+    if getattr(args, 'repeat', None) and not due:
+        parser.error("--repeat needs a due date")
+    
+    store = TodoStore(args.db or 'tasks.db')
+    try:
+        progress = lambda count: print(f"\r{count} tasks", end='', file=sys.stderr)
+        if not args.db and store.needs_migration('tasks.json'):
+            count, skipped = store.migrate_from_json('tasks.json', progress)
+            print(f"\rMigrated {count} tasks from tasks.json, skipped {skipped}", file=sys.stderr)
+        
+        if args.command == 'add':
+            lines = (line.strip() for line in sys.stdin)
+            records = ({'text': line, 'tags': args.tags, 'due': due, 'recurrence': args.repeat}
+                       for line in lines if line)
+            added = 0
+            for batch in batched(records, MIGRATE_BATCH_SIZE):
+                added += len(store.add_many(batch))
+                progress(added)
+            print(f"\rAdded {added} tasks", file=sys.stderr)
+        elif args.command == 'list':
+            completed = {'completed': True, 'pending': False}.get(args.status)
+            if args.search:
+                tasks, limited = store.search(args.search, completed, args.sort, args.reverse,
+                                              limit=args.limit or SEARCH_LIMIT)
+                if limited:
+                    print(f"Results limited to the newest {RANK_WINDOW} matches", file=sys.stderr)
+            else:
+                tasks = islice(store.iter_tasks(completed, args.sort, args.reverse), args.limit)
+            for task in tasks:
+                status = "x" if task['completed'] else " "
+                sys.stdout.write(f"{task['id']}\t[{status}]\t{task['due']}\t{task['tags']}\t{task['text']}\n")
+        elif args.command == 'complete':
+            changed = 0
+            for first, last in ranges:
+                for start in range(first, last + 1, MIGRATE_BATCH_SIZE):
+                    tasks = store.get_range(start, min(last, start + MIGRATE_BATCH_SIZE - 1))
+                    changed += sum(1 for task in store.set_completed(tasks, not args.undo)
+                                   if task['completed'] != args.undo)
+            print(f"Marked {changed} tasks {'pending' if args.undo else 'complete'}", file=sys.stderr)
+        elif args.command == 'export':
+            count = store.export_file(args.path, progress)
+            print(f"\rExported {count} tasks", file=sys.stderr)
+    finally:
+        store.close()
+
+if __name__ == "__main__":
+    main()